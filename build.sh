@@ -5,4 +5,7 @@ set -o errexit
 pip install -r requirements.txt
 
 python manage.py collectstatic --no-input
-python manage.py migrate
\ No newline at end of file
+python manage.py migrate
+python manage.py reindexar_busqueda
+python manage.py reconstruir_rollups
+python manage.py refrescar_segmentos --completo
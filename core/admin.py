@@ -1,7 +1,7 @@
 # core/admin.py (Código limpio y único)
 
 from django.contrib import admin
-from .models import Producto, Variante
+from .models import Producto, Variante, Tarea
 
 # 1. Definir cómo se ve el CRUD de las Variantes dentro del Producto
 class VarianteInline(admin.TabularInline):
@@ -25,6 +25,14 @@ class ProductoAdmin(admin.ModelAdmin):
     # Campos de búsqueda rápida
     search_fields = ('nombre', 'descripcion')
 
+# 3. Cola de tareas en segundo plano (boletas, correos)
+@admin.register(Tarea)
+class TareaAdmin(admin.ModelAdmin):
+    list_display = ('id', 'tipo', 'estado', 'intentos', 'ejecutar_despues', 'fecha_creacion')
+    list_filter = ('estado', 'tipo')
+    search_fields = ('clave',)
+    readonly_fields = ('ultimo_error',)
+
 # Opcional: Si quieres registrar Variante para un CRUD separado, descomentarías:
 # @admin.register(Variante) 
 # class VarianteAdmin(admin.ModelAdmin):
@@ -0,0 +1,57 @@
+# core/api/pagination.py
+
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from core.paginacion import paginar_keyset
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginación por cursor sobre (fecha_creacion, id) para la API.
+    ?cursor=<opaco>&page_size=N  (máx. max_page_size)
+    Con ?modo=numerada se usa la paginación clásica por número de página.
+    """
+    page_size = 50
+    max_page_size = 200
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        if request.query_params.get('modo') == 'numerada':
+            self.numerada = NumeradaPagination()
+            return self.numerada.paginate_queryset(queryset, request, view)
+        self.numerada = None
+
+        self.pagina = paginar_keyset(queryset, request.query_params.get('cursor'), self.get_page_size(request))
+        return list(self.pagina)
+
+    def get_page_size(self, request):
+        try:
+            return min(max(int(request.query_params.get('page_size', self.page_size)), 1), self.max_page_size)
+        except ValueError:
+            return self.page_size
+
+    def _link(self, cursor):
+        if not cursor:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, 'cursor', cursor)
+
+    def get_paginated_response(self, data):
+        if self.numerada:
+            return self.numerada.get_paginated_response(data)
+        return Response({
+            'next': self._link(self.pagina.cursor_siguiente),
+            'previous': self._link(self.pagina.cursor_anterior),
+            'results': data,
+        })
+
+    def get_schema_operation_parameters(self, view):
+        return []
+
+
+class NumeradaPagination(PageNumberPagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
@@ -1,7 +1,7 @@
 # core/api/urls.py
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import ProductoViewSet, DashboardKPIView # <--- Importante importar ambas
+from .views import ProductoViewSet, DashboardKPIView, CacheCatalogoView, SegmentoMiembrosView, ExportacionView, TransicionOrdenesView, CorreoEstadisticasView, InferenciaEstadisticasView # <--- Importante importar todas
 
 router = DefaultRouter()
 router.register(r'productos', ProductoViewSet)
@@ -10,4 +10,10 @@ urlpatterns = [
     path('', include(router.urls)),
     # Esta es la ruta que busca tu HTML para llenar los gráficos
     path('dashboard-kpi/', DashboardKPIView.as_view(), name='dashboard_kpi'),
+    path('cache-catalogo/', CacheCatalogoView.as_view(), name='cache_catalogo'),
+    path('segmentos/<str:segmento>/miembros/', SegmentoMiembrosView.as_view(), name='segmento_miembros'),
+    path('exportar/<str:dataset>/', ExportacionView.as_view(), name='exportar'),
+    path('ordenes/transiciones/', TransicionOrdenesView.as_view(), name='transiciones_ordenes'),
+    path('correo/estadisticas/', CorreoEstadisticasView.as_view(), name='correo_estadisticas'),
+    path('inferencia/estadisticas/', InferenciaEstadisticasView.as_view(), name='inferencia_estadisticas'),
 ]
\ No newline at end of file
@@ -1,18 +1,26 @@
 # core/api/views.py
 
+from datetime import date
+
+from django.http import Http404
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import viewsets
 from rest_framework.permissions import IsAdminUser
-from django.db.models import Sum, Count
-from core.models import Orden, Producto, Variante, ItemOrden, RegistroTryOn 
+from core.models import Producto
+from core import cache_catalogo, correo, exportaciones, inferencia, segmentacion, transiciones
+from core.rollups import resumen_ventas, ranking_productos
+from core.conversion import conversion_tryon
+from core.inventario import alertas_stock, resumen_alerta
 from .serializers import ProductoSerializer
+from .pagination import KeysetPagination
 
 # 1. CRUD DE PRODUCTOS (API para la tabla de inventario)
 class ProductoViewSet(viewsets.ModelViewSet):
-    queryset = Producto.objects.all().order_by('-fecha_creacion')
+    queryset = Producto.objects.prefetch_related('variantes').order_by('-fecha_creacion', '-id')
     serializer_class = ProductoSerializer
     permission_classes = [IsAdminUser]
+    pagination_class = KeysetPagination  # ?cursor=... (o ?modo=numerada&page=N)
 
 # 2. DASHBOARD DE KPIs (Inteligencia de Negocios Real)
 class DashboardKPIView(APIView):
@@ -20,59 +28,113 @@ class DashboardKPIView(APIView):
 
     def get(self, request):
         # A. Ventas Totales (Dinero real confirmado)
-        # Sumamos órdenes que NO estén pendientes ni canceladas
-        total_ventas = Orden.objects.exclude(
-            estado__in=['PENDIENTE', 'CANCELADO']
-        ).aggregate(total=Sum('total_final'))['total'] or 0
-        
+        # Sumamos órdenes que NO estén pendientes ni canceladas (desde los rollups diarios)
+        total_ventas = resumen_ventas(excluir=['PENDIENTE', 'CANCELADO'])['monto']
+
         # B. Total Pedidos
-        total_ordenes = Orden.objects.count()
+        total_ordenes = resumen_ventas()['ordenes']
         
         # C. Stock Crítico (Productos con alguna variante bajo 5 unidades)
         productos_bajo_stock = Producto.objects.filter(variantes__stock__lte=5).distinct().count()
 
         # D. Top 5 Productos Vendidos (Para el Gráfico de Barras)
-        top_productos = ItemOrden.objects.values('nombre_producto').annotate(
-            total_vendido=Sum('cantidad')
-        ).order_by('-total_vendido')[:5]
+        top_productos = ranking_productos(limite=5)
 
         # E. ANÁLISIS REAL DE TRY-ON vs VENTAS (Para la Tabla de Interés)
-        # 1. Obtenemos los 5 productos más probados
-        top_tryon_query = RegistroTryOn.objects.values('producto__nombre').annotate(
-            veces_probado=Count('id')
-        ).order_by('-veces_probado')[:5]
+        # Pruebas, ventas reales y tasa de conversión en una sola consulta (core/conversion.py).
+        # ?top_tryon=N muestra hasta 50 productos con el mismo costo.
+        try:
+            top = min(max(int(request.query_params.get('top_tryon', 5)), 1), 50)
+        except ValueError:
+            top = 5
+        lista_tryon_real = conversion_tryon(limite=top)
+
+        # F. Alertas de quiebre por velocidad de venta (core/inventario.py)
+        alertas = [resumen_alerta(v) for v in alertas_stock(limite=10)]
 
-        lista_tryon_real = []
-        
-        for item in top_tryon_query:
-            nombre_prod = item['producto__nombre']
-            pruebas = item['veces_probado']
-            
-            # 2. Consultamos las VENTAS REALES de ese producto específico
-            # Filtramos solo ventas concretadas (Confirmado, Despacho, Entregado, etc.)
-            ventas_reales = ItemOrden.objects.filter(
-                nombre_producto=nombre_prod,
-                orden__estado__in=['CONFIRMADO', 'PICKING', 'EMBALAJE', 'DESPACHO', 'ENTREGADO']
-            ).aggregate(total=Sum('cantidad'))['total'] or 0
-            
-            # 3. Calculamos Tasa de Conversión Real (%)
-            # (Ventas / Pruebas) * 100
-            tasa = (ventas_reales / pruebas * 100) if pruebas > 0 else 0
-            
-            # Agregamos el diccionario con los datos calculados a la lista
-            lista_tryon_real.append({
-                'producto__nombre': nombre_prod,
-                'veces_probado': pruebas,
-                'ventas_reales': ventas_reales, 
-                'tasa_conversion': round(tasa, 1)
-            })
-        
         # Preparamos el JSON final para el Frontend
         data = {
             "total_ventas": total_ventas,
             "total_ordenes": total_ordenes,
             "bajo_stock": productos_bajo_stock,
+            "alertas_stock": alertas,
             "top_productos": list(top_productos), 
             "top_tryon": lista_tryon_real # Enviamos la lista procesada con la conversión
         }
         return Response(data)
+
+
+# 3. ESTADO DE LA CACHÉ DEL CATÁLOGO (hits / misses / versión)
+class CacheCatalogoView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(cache_catalogo.estadisticas())
+
+
+# 4. MIEMBROS DE UN SEGMENTO DE CLIENTES (CSV en streaming desde el snapshot)
+class SegmentoMiembrosView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, segmento):
+        if segmento not in segmentacion.SEGMENTOS:
+            raise Http404('Segmento desconocido')
+        return exportaciones.exportar('clientes', estado=segmento)
+
+
+# 5. EXPORTACIONES PARA BI (ordenes / items / tryon / clientes, CSV o Parquet en streaming)
+class ExportacionView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, dataset):
+        params = request.query_params
+        try:
+            filtros = {
+                'desde': date.fromisoformat(params['desde']) if params.get('desde') else None,
+                'hasta': date.fromisoformat(params['hasta']) if params.get('hasta') else None,
+                'estado': params.get('estado') or None,
+                'marca': params.get('marca') or None,
+            }
+            return exportaciones.exportar(dataset, params.get('formato', 'csv'), **filtros)
+        except ValueError:
+            return Response({'error': 'Las fechas deben tener formato AAAA-MM-DD'}, status=400)
+        except exportaciones.ExportacionInvalida as e:
+            return Response({'error': str(e)}, status=400)
+
+
+# 6. CAMBIO DE ESTADO MASIVO (ids y/o CSV numero_orden,tracking en una transacción)
+class TransicionOrdenesView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def post(self, request):
+        datos = request.data
+        try:
+            tracking = transiciones.leer_csv_tracking(datos.get('csv') or '')
+            tracking.update({str(n).upper(): str(t) for n, t in (datos.get('tracking') or {}).items()})
+            resultado = transiciones.cambiar_estados(
+                datos.get('estado', ''), ids=datos.get('ordenes') or [], tracking_por_numero=tracking,
+            )
+        except (TypeError, ValueError, AttributeError):
+            return Response({'error': 'Formato inválido: ordenes es una lista de ids y tracking un objeto'}, status=400)
+        except transiciones.CambioMasivoInvalido as e:
+            return Response({'error': str(e)}, status=400)
+        return Response({
+            'actualizadas': resultado.actualizadas,
+            'rechazadas': [{'orden': ref, 'motivo': motivo} for ref, motivo in resultado.rechazadas],
+        })
+
+
+# 7. MÉTRICAS DE ENVÍO DE CORREO (enviados / fallidos / latencia / conexiones)
+class CorreoEstadisticasView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(correo.estadisticas())
+
+
+# 8. MÉTRICAS DEL GATEWAY DE INFERENCIA (fila, cupos, circuito, latencia del modelo)
+class InferenciaEstadisticasView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(inferencia.estadisticas())
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from . import signals  # noqa: F401  Registra los receptores de señales
+        from . import notificaciones, tryon  # noqa: F401  Registra los handlers de la cola de tareas
@@ -0,0 +1,126 @@
+# core/boletas.py
+
+"""
+Almacén de boletas PDF direccionado por contenido.
+
+Cada boleta se guarda como `<orden_id>/<huella>.pdf`, donde la huella es un
+SHA-256 de todo lo que se imprime en ella (datos de la orden, estado, ítems)
+más la versión de la plantilla. Si la orden cambia, cambia la huella y la
+próxima descarga genera un archivo nuevo y borra los anteriores: no hace
+falta invalidar nada a mano.
+
+El render con xhtml2pdf ocurre una sola vez por versión de la orden; las
+descargas repetidas son lecturas de archivo (con ETag/Last-Modified, un
+navegador que ya la tiene recibe 304 sin leer el archivo).
+
+Por defecto se guarda en disco en settings.BOLETAS_ROOT (fuera de MEDIA, las
+boletas son privadas). Con settings.BOLETAS_STORAGE = '<alias>' se usa ese
+backend de settings.STORAGES (por ejemplo S3 para compartir entre instancias).
+"""
+
+import hashlib
+import json
+import logging
+from functools import lru_cache
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, storages
+from django.template.loader import get_template
+from xhtml2pdf import pisa
+
+logger = logging.getLogger(__name__)
+
+PLANTILLA = 'core/invoice.html'
+
+
+@lru_cache(maxsize=1)
+def almacen():
+    alias = getattr(settings, 'BOLETAS_STORAGE', None)
+    if alias:
+        return storages[alias]
+    return FileSystemStorage(location=settings.BOLETAS_ROOT)
+
+
+@lru_cache(maxsize=1)
+def version_plantilla():
+    """Hash del fuente de la plantilla: editar invoice.html invalida todas las boletas."""
+    fuente = get_template(PLANTILLA).template.source
+    return hashlib.sha256(fuente.encode()).hexdigest()[:12]
+
+
+def huella(orden):
+    """SHA-256 de lo que se imprime en la boleta (usa orden.items_orden.all())."""
+    usuario = orden.usuario
+    datos = {
+        'plantilla': version_plantilla(),
+        'id': orden.id,
+        'numero': orden.numero_orden,
+        'estado': orden.estado,
+        'fecha': orden.fecha_creacion.isoformat(),
+        'cliente': [usuario.first_name, usuario.last_name] if usuario else None,
+        'email': orden.email,
+        'direccion': orden.direccion_envio,
+        'totales': [str(orden.subtotal), str(orden.costo_envio), str(orden.total_final)],
+        'items': [
+            [i.id, i.nombre_producto, i.talla_color, i.cantidad, str(i.precio_unitario)]
+            for i in orden.items_orden.all()
+        ],
+    }
+    return hashlib.sha256(json.dumps(datos, sort_keys=True).encode()).hexdigest()
+
+
+def nombre_archivo(orden, hash_contenido):
+    return f'{orden.id}/{hash_contenido}.pdf'
+
+
+def renderizar_pdf(orden):
+    html = get_template(PLANTILLA).render({'orden': orden})
+    pdf = BytesIO()
+    resultado = pisa.CreatePDF(html, dest=pdf)
+    if resultado.err:
+        raise RuntimeError(f"xhtml2pdf no pudo generar la boleta de la orden {orden.numero_orden}")
+    return pdf.getvalue()
+
+
+def obtener_boleta(orden):
+    """
+    Devuelve (nombre, huella) de la boleta vigente de `orden` en almacen(),
+    generándola si todavía no existe. Conviene pasar la orden con
+    select_related('usuario') y prefetch_related('items_orden').
+    """
+    storage = almacen()
+    hash_contenido = huella(orden)
+    nombre = nombre_archivo(orden, hash_contenido)
+    if storage.exists(nombre):
+        return nombre, hash_contenido
+
+    guardado = storage.save(nombre, ContentFile(renderizar_pdf(orden)))
+    if guardado != nombre:
+        # Otro proceso la generó al mismo tiempo: el contenido es idéntico, nos quedamos con la suya
+        storage.delete(guardado)
+    _purgar_versiones(storage, orden, nombre)
+    return nombre, hash_contenido
+
+
+def contenido_boleta(orden):
+    """Bytes del PDF vigente (para adjuntarlo en correos)."""
+    nombre, _ = obtener_boleta(orden)
+    with almacen().open(nombre, 'rb') as f:
+        return f.read()
+
+
+def _purgar_versiones(storage, orden, vigente):
+    """Borra las boletas de versiones anteriores de la orden."""
+    try:
+        _, archivos = storage.listdir(str(orden.id))
+    except (NotImplementedError, FileNotFoundError):
+        return
+    for archivo in archivos:
+        nombre = f'{orden.id}/{archivo}'
+        if nombre != vigente:
+            try:
+                storage.delete(nombre)
+            except OSError:
+                logger.warning("No se pudo borrar la boleta obsoleta %s", nombre)
@@ -0,0 +1,354 @@
+# core/busqueda.py
+
+"""
+Motor de búsqueda del catálogo.
+
+Cada Producto tiene un DocumentoBusqueda con sus textos ya normalizados
+(minúsculas, sin tildes, plurales simples recortados). Sobre esa tabla se
+monta el índice invertido según el motor de base de datos:
+
+- MySQL: índice FULLTEXT + MATCH ... AGAINST en modo booleano.
+- SQLite: tabla virtual FTS5 (útil para desarrollo y pruebas).
+- Documentos: LIKE por prefijo sobre DocumentoBusqueda (respaldo para
+  cualquier otro motor; compartido por todos los workers).
+- Memoria: índice invertido en el proceso. Solo con DEBUG: cada worker tiene
+  su copia y no ve los cambios hechos en los demás.
+
+El índice se actualiza de forma incremental con las señales de Producto
+(admin, API y vistas pasan todas por Producto.save()). Una búsqueda devuelve
+TODAS las coincidencias, rankeadas; el orden por relevancia de una página se
+arma en Python con ordenar_por_relevancia().
+"""
+
+import bisect
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.db.models import Q
+
+# Peso de cada campo dentro del documento (se repiten los tokens)
+PESO_NOMBRE = 3
+PESO_MARCA = 2
+PESO_CATEGORIA = 2
+PESO_DESCRIPCION = 1
+
+TABLA_FTS = 'core_documentobusqueda_fts'
+
+STOPWORDS = {
+    'a', 'al', 'con', 'de', 'del', 'el', 'en', 'la', 'las', 'lo', 'los',
+    'para', 'por', 'sin', 'un', 'una', 'unos', 'unas', 'y', 'o', 'e',
+}
+
+_RE_TOKEN = re.compile(r'[a-z0-9]+')
+
+
+# ==========================================
+# --- 1. NORMALIZACIÓN DE TEXTO ---
+# ==========================================
+
+def _sin_tildes(texto):
+    """'Camisón' -> 'camison' (la ñ también se pliega a n)."""
+    texto = unicodedata.normalize('NFKD', texto.lower())
+    return ''.join(c for c in texto if not unicodedata.combining(c))
+
+
+def _raiz(token):
+    """Recorta plurales simples del español: camisones -> camison, poleras -> polera."""
+    if len(token) > 4 and token.endswith('es') and token[-3] not in 'aeiou':
+        return token[:-2]
+    if len(token) > 3 and token.endswith('s'):
+        return token[:-1]
+    return token
+
+
+def tokenizar(texto):
+    """Devuelve la lista de tokens normalizados de un texto."""
+    if not texto:
+        return []
+    tokens = _RE_TOKEN.findall(_sin_tildes(str(texto)))
+    return [_raiz(t) for t in tokens if t not in STOPWORDS]
+
+
+def construir_documento(producto):
+    """Texto normalizado que se indexa para un producto (con pesos por campo)."""
+    partes = []
+    partes += tokenizar(producto.nombre) * PESO_NOMBRE
+    partes += tokenizar(producto.get_marca_display()) * PESO_MARCA
+    partes += tokenizar(producto.get_categoria_display()) * PESO_CATEGORIA
+    partes += tokenizar(producto.descripcion) * PESO_DESCRIPCION
+    return ' '.join(partes)
+
+
+# ==========================================
+# --- 2. BACKENDS ---
+# ==========================================
+
+class BackendMySQL:
+    """FULLTEXT sobre core_documentobusqueda.contenido (creado en la migración 0009)."""
+
+    def indexar(self, producto_id, contenido):
+        pass  # InnoDB mantiene el índice FULLTEXT solo
+
+    def eliminar(self, producto_id):
+        pass
+
+    def buscar(self, tokens, limite=None):
+        consulta = ' '.join(f'+{t}*' for t in tokens)
+        sql = (
+            "SELECT producto_id FROM core_documentobusqueda "
+            "WHERE MATCH(contenido) AGAINST (%s IN BOOLEAN MODE) "
+            "ORDER BY MATCH(contenido) AGAINST (%s IN BOOLEAN MODE) DESC, producto_id DESC"
+        )
+        params = [consulta, consulta]
+        if limite is not None:
+            sql += " LIMIT %s"
+            params.append(limite)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [fila[0] for fila in cursor.fetchall()]
+
+
+class BackendFTS5:
+    """Tabla virtual FTS5 con rowid = producto_id, rankeada con bm25."""
+
+    def indexar(self, producto_id, contenido):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {TABLA_FTS} WHERE rowid = %s", [producto_id])
+            cursor.execute(f"INSERT INTO {TABLA_FTS} (rowid, contenido) VALUES (%s, %s)", [producto_id, contenido])
+
+    def eliminar(self, producto_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {TABLA_FTS} WHERE rowid = %s", [producto_id])
+
+    def buscar(self, tokens, limite=None):
+        consulta = ' '.join(f'{t}*' for t in tokens)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {TABLA_FTS} WHERE {TABLA_FTS} MATCH %s "
+                f"ORDER BY bm25({TABLA_FTS}), rowid DESC LIMIT %s",
+                [consulta, -1 if limite is None else limite]
+            )
+            return [fila[0] for fila in cursor.fetchall()]
+
+
+class BackendDocumentos:
+    """
+    LIKE por prefijo de palabra sobre DocumentoBusqueda.contenido, rankeado en
+    Python por frecuencia. Sin índice especial, pero lee la misma tabla en
+    todos los procesos: ningún worker queda con resultados viejos.
+    """
+
+    def indexar(self, producto_id, contenido):
+        pass  # indexar_producto() ya guardó el DocumentoBusqueda
+
+    def eliminar(self, producto_id):
+        pass  # El documento se borra en cascada con el producto
+
+    def buscar(self, tokens, limite=None):
+        from .models import DocumentoBusqueda
+        filtro = Q()
+        for t in tokens:
+            filtro &= Q(contenido__startswith=t) | Q(contenido__contains=f' {t}')
+        puntajes = {}
+        for producto_id, contenido in DocumentoBusqueda.objects.filter(filtro).values_list('producto_id', 'contenido').iterator():
+            palabras = contenido.split()
+            # El LIKE también acepta un prefijo en medio de una palabra ('a-polera'): se confirma aquí
+            frecuencias = [sum(1 for p in palabras if p.startswith(t)) for t in tokens]
+            if all(frecuencias):
+                puntajes[producto_id] = sum(frecuencias)
+        ranking = sorted(puntajes.items(), key=lambda par: (-par[1], -par[0]))
+        return [pid for pid, _ in ranking[:limite]]
+
+
+class BackendMemoria:
+    """
+    Índice invertido en memoria: token -> {producto_id: frecuencia}.
+    Se carga una vez desde DocumentoBusqueda y luego se actualiza con las señales
+    de ESTE proceso, así que con varios workers cada uno se queda con su copia:
+    solo se permite con DEBUG (servidor de desarrollo).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings = None
+        self._terminos = []  # Lista ordenada para búsqueda por prefijo
+        self._docs = {}
+
+    def _cargar(self):
+        from .models import DocumentoBusqueda
+        self._postings = defaultdict(dict)
+        self._docs = {}
+        for producto_id, contenido in DocumentoBusqueda.objects.values_list('producto_id', 'contenido').iterator():
+            self._agregar(producto_id, contenido)
+        self._terminos = sorted(self._postings)
+
+    def _agregar(self, producto_id, contenido):
+        tokens = contenido.split()
+        self._docs[producto_id] = tokens
+        for t in tokens:
+            self._postings[t][producto_id] = self._postings[t].get(producto_id, 0) + 1
+
+    def _quitar(self, producto_id):
+        for t in self._docs.pop(producto_id, []):
+            self._postings.get(t, {}).pop(producto_id, None)
+
+    def indexar(self, producto_id, contenido):
+        with self._lock:
+            if self._postings is None:
+                return  # Se cargará completo en la primera búsqueda
+            self._quitar(producto_id)
+            nuevos = {t for t in contenido.split() if t not in self._postings}
+            self._agregar(producto_id, contenido)
+            for t in nuevos:
+                bisect.insort(self._terminos, t)
+
+    def eliminar(self, producto_id):
+        with self._lock:
+            if self._postings is not None:
+                self._quitar(producto_id)
+
+    def descartar(self):
+        """Olvida el índice: se recarga completo en la próxima búsqueda."""
+        with self._lock:
+            self._postings = None
+
+    def _coincidencias(self, prefijo):
+        """Suma de frecuencias por producto para todos los términos con ese prefijo."""
+        puntajes = defaultdict(int)
+        i = bisect.bisect_left(self._terminos, prefijo)
+        while i < len(self._terminos) and self._terminos[i].startswith(prefijo):
+            for producto_id, frec in self._postings[self._terminos[i]].items():
+                puntajes[producto_id] += frec
+            i += 1
+        return puntajes
+
+    def buscar(self, tokens, limite=None):
+        with self._lock:
+            if self._postings is None:
+                self._cargar()
+            total = None
+            for t in tokens:
+                parcial = self._coincidencias(t)
+                if total is None:
+                    total = parcial
+                else:
+                    total = {pid: total[pid] + p for pid, p in parcial.items() if pid in total}
+                if not total:
+                    return []
+        ranking = sorted(total.items(), key=lambda par: (-par[1], -par[0]))
+        return [pid for pid, _ in ranking[:limite]]
+
+
+_backend = None
+
+
+def _fts5_disponible():
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE name = %s", [TABLA_FTS])
+            return cursor.fetchone() is not None
+    except Exception:
+        return False
+
+
+def obtener_backend():
+    """Elige el backend según settings.BUSQUEDA_BACKEND ('auto', 'mysql', 'fts5', 'documentos', 'memoria')."""
+    global _backend
+    if _backend is None:
+        nombre = getattr(settings, 'BUSQUEDA_BACKEND', 'auto')
+        if nombre == 'auto':
+            if connection.vendor == 'mysql':
+                nombre = 'mysql'
+            elif connection.vendor == 'sqlite' and _fts5_disponible():
+                nombre = 'fts5'
+            else:
+                nombre = 'documentos'
+        if nombre == 'memoria' and not settings.DEBUG:
+            raise ImproperlyConfigured(
+                "BUSQUEDA_BACKEND='memoria' solo sirve con DEBUG: cada worker tendría su propio índice. "
+                "Use 'documentos' (o 'auto')."
+            )
+        backends = {'mysql': BackendMySQL, 'fts5': BackendFTS5, 'documentos': BackendDocumentos, 'memoria': BackendMemoria}
+        _backend = backends[nombre]()
+    return _backend
+
+
+# ==========================================
+# --- 3. API PÚBLICA ---
+# ==========================================
+
+def indexar_producto(producto):
+    """Crea o actualiza el documento de un producto (llamado desde las señales)."""
+    from .models import DocumentoBusqueda
+    contenido = construir_documento(producto)
+    DocumentoBusqueda.objects.update_or_create(producto_id=producto.pk, defaults={'contenido': contenido})
+    obtener_backend().indexar(producto.pk, contenido)
+
+
+def desindexar_producto(producto_id):
+    obtener_backend().eliminar(producto_id)
+
+
+def reindexar_todo(lote=500):
+    """Reconstruye el índice completo. Devuelve la cantidad de productos indexados."""
+    from .models import Producto, DocumentoBusqueda
+    DocumentoBusqueda.objects.all().delete()
+    backend = obtener_backend()
+    if isinstance(backend, BackendFTS5):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {TABLA_FTS}")
+
+    total = 0
+    buffer = []
+    for producto in Producto.objects.order_by('id').iterator(chunk_size=lote):
+        buffer.append(DocumentoBusqueda(producto_id=producto.pk, contenido=construir_documento(producto)))
+        if len(buffer) >= lote:
+            total += _volcar(buffer, backend)
+            buffer = []
+    total += _volcar(buffer, backend)
+
+    if isinstance(backend, BackendMemoria):
+        backend.descartar()
+    return total
+
+
+def _volcar(documentos, backend):
+    from .models import DocumentoBusqueda
+    DocumentoBusqueda.objects.bulk_create(documentos)
+    if isinstance(backend, BackendFTS5):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {TABLA_FTS} (rowid, contenido) VALUES (%s, %s)",
+                [(d.producto_id, d.contenido) for d in documentos]
+            )
+    return len(documentos)
+
+
+def buscar(texto, limite=None):
+    """IDs de productos que coinciden con todos los términos (por prefijo), del más al menos relevante."""
+    tokens = list(dict.fromkeys(tokenizar(texto)))
+    if not tokens:
+        return []
+    return obtener_backend().buscar(tokens, limite)
+
+
+def filtrar_queryset(queryset, texto, ids=None):
+    """
+    Reemplazo de Q(nombre__icontains) | Q(descripcion__icontains): filtra el
+    queryset por los resultados del índice (sin reordenarlo, ver
+    ordenar_por_relevancia). Se pueden pasar los `ids` de una búsqueda ya hecha.
+    """
+    if ids is None:
+        ids = buscar(texto)
+    return queryset.filter(id__in=ids)
+
+
+def ordenar_por_relevancia(ids, validos):
+    """Los `ids` del ranking que están en `validos`, en el orden del ranking."""
+    validos = set(validos)
+    return [pid for pid in ids if pid in validos]
@@ -0,0 +1,82 @@
+# core/cache_catalogo.py
+
+"""
+Caché de la grilla renderizada del catálogo.
+
+La clave combina los parámetros GET (filtros + página/cursor), si el usuario
+es staff y la versión del catálogo (core.catalogo.version_catalogo), que sube
+con cada save/delete de Producto o Variante. Lo que depende del usuario
+(navbar, carrito, mensajes) queda en base.html, fuera del fragmento.
+
+El token CSRF de los formularios "agregar al carrito" se guarda como una
+marca y se reemplaza por el token real de cada request al servir el fragmento.
+
+Funciona con cualquier backend de caché de Django. Con LocMemCache cada
+worker tiene su propia versión, por eso los fragmentos además expiran a los
+TIEMPO_CACHE segundos; con un backend compartido (Redis/Memcached) la
+invalidación es inmediata para todos los workers.
+"""
+
+import hashlib
+
+from django.core.cache import cache
+from django.middleware.csrf import get_token
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .catalogo import version_catalogo
+
+TIEMPO_CACHE = 60 * 5
+
+MARCA_CSRF = '__CSRF_CATALOGO__'
+
+CLAVE_HITS = 'catalogo:fragmento:hits'
+CLAVE_MISSES = 'catalogo:fragmento:misses'
+
+
+def _clave(request, es_staff):
+    params = sorted((k, v) for k in request.GET for v in request.GET.getlist(k))
+    firma = hashlib.md5(repr((params, es_staff)).encode()).hexdigest()
+    return f"catalogo:fragmento:{version_catalogo()}:{firma}"
+
+
+def _contar(clave):
+    try:
+        cache.incr(clave)
+    except ValueError:
+        cache.add(clave, 0, None)
+        cache.incr(clave)
+
+
+def fragmento(request, plantilla, construir_contexto):
+    """
+    Devuelve el HTML de `plantilla` desde la caché o lo renderiza con el
+    contexto que entrega construir_contexto() (solo se llama en un miss).
+    """
+    es_staff = request.user.is_authenticated and request.user.is_staff
+    clave = _clave(request, es_staff)
+
+    html = cache.get(clave)
+    if html is None:
+        _contar(CLAVE_MISSES)
+        contexto = construir_contexto()
+        contexto.update({'es_staff': es_staff, 'csrf_token': MARCA_CSRF})
+        html = render_to_string(plantilla, contexto)
+        cache.set(clave, html, TIEMPO_CACHE)
+    else:
+        _contar(CLAVE_HITS)
+
+    return mark_safe(html.replace(MARCA_CSRF, get_token(request)))
+
+
+def estadisticas():
+    """Contadores de hits/misses (compartidos si el backend es compartido)."""
+    hits = cache.get(CLAVE_HITS, 0)
+    misses = cache.get(CLAVE_MISSES, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / total, 3) if total else None,
+        'version_catalogo': version_catalogo(),
+    }
@@ -0,0 +1,170 @@
+# core/cache_tryon.py
+
+"""
+Caché de resultados del probador virtual.
+
+IDM-VTON corre con seed fija: la misma foto con la misma prenda, categoría y
+versión del modelo da la misma imagen. La clave es un SHA-256 de esos cuatro
+datos y cada clave tiene una fila ResultadoTryOn:
+
+- LISTO: la imagen ya está en el almacén (las URLs de Replicate expiran, por
+  eso se descarga y se guarda). Un acierto no llama al modelo.
+- PENDIENTE: alguien la está generando. Las pruebas idénticas que llegan
+  mientras tanto se suman a ese trabajo en vez de lanzar otra ejecución.
+  Si la generación falla la fila se borra; si quedó colgada más de
+  pendiente_maximo() (más que lo que puede durar un trabajo vivo: espera en
+  la fila + predicción + descarga), la toma el siguiente.
+
+Expiración: TTL de settings.TRYON_CACHE_DIAS desde el último uso y tope de
+settings.TRYON_CACHE_MAX resultados (se borran los menos usados
+recientemente). purgar() corre al guardar cada resultado nuevo y con
+python manage.py purgar_cache_tryon.
+
+Almacén: disco en settings.TRYON_RESULTADOS_ROOT o el alias de
+settings.TRYON_RESULTADOS_STORAGE (igual que core/boletas.py).
+"""
+
+import base64
+import hashlib
+import logging
+import mimetypes
+from datetime import timedelta
+from functools import lru_cache
+
+import requests
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, storages
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import ResultadoTryOn
+
+TIEMPO_DESCARGA = 60  # segundos
+MARGEN_PENDIENTE = timedelta(minutes=5)
+
+# Resultado de reservar()
+ACIERTO = 'acierto'
+EN_CURSO = 'en_curso'
+LIDER = 'lider'
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=1)
+def almacen():
+    alias = getattr(settings, 'TRYON_RESULTADOS_STORAGE', None)
+    if alias:
+        return storages[alias]
+    return FileSystemStorage(location=settings.TRYON_RESULTADOS_ROOT)
+
+
+def clave_resultado(imagen_usuario, imagen_prenda, categoria, modelo):
+    h = hashlib.sha256()
+    for parte in (modelo, categoria, imagen_prenda):
+        h.update(parte.encode())
+        h.update(b'\0')
+    h.update(hashlib.sha256(imagen_usuario.encode()).digest())
+    return h.hexdigest()
+
+
+def url_resultado(clave):
+    return reverse('resultado_tryon', args=[clave])
+
+
+def pendiente_maximo():
+    """Una reserva PENDIENTE más antigua que esto ya no tiene un trabajo vivo detrás."""
+    from .tryon import TIEMPO_MAXIMO
+    vida_trabajo = settings.INFERENCIA_ESPERA_MAXIMA + TIEMPO_MAXIMO + TIEMPO_DESCARGA
+    return timedelta(seconds=vida_trabajo) + MARGEN_PENDIENTE
+
+
+def _vigente(resultado, ahora):
+    return resultado.ultimo_uso >= ahora - timedelta(days=settings.TRYON_CACHE_DIAS)
+
+
+def reservar(clave):
+    """
+    Debe llamarse dentro de transaction.atomic(): deja la fila bloqueada hasta
+    que el trabajo que la usa quede guardado. Devuelve ACIERTO, EN_CURSO o LIDER.
+    """
+    ahora = timezone.now()
+    try:
+        with transaction.atomic():
+            ResultadoTryOn.objects.create(clave=clave, ultimo_uso=ahora)
+        return LIDER
+    except IntegrityError:
+        pass
+
+    resultado = ResultadoTryOn.objects.select_for_update().get(clave=clave)
+    if resultado.estado == 'LISTO' and _vigente(resultado, ahora):
+        ResultadoTryOn.objects.filter(clave=clave).update(ultimo_uso=ahora, usos=F('usos') + 1)
+        return ACIERTO
+    if resultado.estado == 'PENDIENTE' and resultado.ultimo_uso >= ahora - pendiente_maximo():
+        return EN_CURSO
+
+    # Vencido o generación abandonada: este trabajo la vuelve a generar
+    _borrar_archivo(resultado.archivo)
+    ResultadoTryOn.objects.filter(clave=clave).update(estado='PENDIENTE', archivo='', tamano=0, ultimo_uso=ahora)
+    return LIDER
+
+
+def descargar(url):
+    """Bytes y extensión de la salida del modelo (URL http(s) o data URL)."""
+    if url.startswith('data:'):
+        cabecera, datos = url.split(',', 1)
+        tipo = cabecera[5:].split(';')[0]
+        return base64.b64decode(datos), mimetypes.guess_extension(tipo) or '.png'
+    respuesta = requests.get(url, timeout=TIEMPO_DESCARGA)
+    respuesta.raise_for_status()
+    tipo = respuesta.headers.get('Content-Type', '').split(';')[0]
+    return respuesta.content, mimetypes.guess_extension(tipo) or '.png'
+
+
+def guardar(clave, contenido, extension):
+    """Guarda la imagen y marca la clave LISTO. Devuelve la URL para el navegador."""
+    nombre = almacen().save(f'{clave[:2]}/{clave}{extension}', ContentFile(contenido))
+    ResultadoTryOn.objects.update_or_create(
+        clave=clave,
+        defaults={'estado': 'LISTO', 'archivo': nombre, 'tamano': len(contenido), 'ultimo_uso': timezone.now()},
+    )
+    return url_resultado(clave)
+
+
+def liberar(clave):
+    """La generación falló: la próxima prueba idéntica vuelve a intentarlo."""
+    ResultadoTryOn.objects.filter(clave=clave, estado='PENDIENTE').delete()
+
+
+def abrir(clave):
+    """(archivo, nombre) de un resultado LISTO. Lanza ResultadoTryOn.DoesNotExist."""
+    resultado = ResultadoTryOn.objects.get(clave=clave, estado='LISTO')
+    return almacen().open(resultado.archivo, 'rb'), resultado.archivo
+
+
+def _borrar_archivo(nombre):
+    if nombre:
+        try:
+            almacen().delete(nombre)
+        except Exception:
+            logger.warning("No se pudo borrar %s del caché de try-on", nombre, exc_info=True)
+
+
+def purgar(ahora=None):
+    """Borra los resultados vencidos y los menos usados sobre el tope. Devuelve cuántos borró."""
+    ahora = ahora or timezone.now()
+    listos = ResultadoTryOn.objects.filter(estado='LISTO')
+    vencidos = list(listos.filter(ultimo_uso__lt=ahora - timedelta(days=settings.TRYON_CACHE_DIAS))
+                    .values_list('clave', 'archivo'))
+    exceso = listos.count() - len(vencidos) - settings.TRYON_CACHE_MAX
+    if exceso > 0:
+        vencidos += list(listos.filter(ultimo_uso__gte=ahora - timedelta(days=settings.TRYON_CACHE_DIAS))
+                         .order_by('ultimo_uso').values_list('clave', 'archivo')[:exceso])
+    if not vencidos:
+        return 0
+    ResultadoTryOn.objects.filter(clave__in=[c for c, _ in vencidos], estado='LISTO').delete()
+    for _, archivo in vencidos:
+        _borrar_archivo(archivo)
+    return len(vencidos)
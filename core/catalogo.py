@@ -0,0 +1,239 @@
+# core/catalogo.py
+
+"""
+Capa de consultas del catálogo digital.
+
+ConsultaCatalogo arma el queryset filtrado (búsqueda, categoría, marca, precio)
+y entrega cada página con sus variantes ya adjuntas. Una página cuesta como
+máximo PRESUPUESTO_CONSULTAS consultas, sin importar su tamaño:
+
+1. La búsqueda en el índice full-text (solo si hay 'q').
+2. Los productos de la página + el total (COUNT como función de ventana).
+   Con 'q' son dos: los ids que pasan los filtros (el total es su largo) y,
+   ya ordenados por relevancia en Python, los productos de la página.
+3. Un único prefetch de las variantes de toda la página.
+
+Hay dos modos de paginación: numerada (pagina) y por cursor (pagina_cursor).
+"""
+
+import time
+from contextlib import contextmanager
+from urllib.parse import urlencode
+
+from django.core.cache import cache
+from django.core.paginator import Paginator, Page
+from django.db import connection, connections
+from django.db.models import Count, Prefetch, Q, Window, prefetch_related_objects
+from django.test.utils import CaptureQueriesContext
+
+from .models import Producto, Variante
+from . import busqueda
+from .paginacion import paginar_keyset
+
+PRODUCTOS_POR_PAGINA = 9
+PRESUPUESTO_CONSULTAS = 4
+
+CLAVE_VERSION = 'catalogo:version'
+
+
+class ConsultaCatalogo:
+    """Filtros del catálogo leídos desde request.GET."""
+
+    def __init__(self, q=None, categoria=None, marca=None, min_price=None, max_price=None):
+        self.q = (q or '').strip() or None
+        self.categoria = categoria or None
+        self.marca = marca or None
+        self.min_price = _entero_o_none(min_price)
+        self.max_price = _entero_o_none(max_price)
+        self._ids_busqueda = None
+
+    @classmethod
+    def desde_request(cls, params):
+        return cls(
+            q=params.get('q'),
+            categoria=params.get('categoria'),
+            marca=params.get('marca'),
+            min_price=params.get('min_price'),
+            max_price=params.get('max_price'),
+        )
+
+    def parametros(self, **cambios):
+        """Filtros actuales como dict de GET (sin vacíos), con `cambios` aplicados."""
+        params = {
+            'q': self.q, 'categoria': self.categoria, 'marca': self.marca,
+            'min_price': self.min_price, 'max_price': self.max_price,
+        }
+        params.update(cambios)
+        return {k: v for k, v in params.items() if v not in (None, '')}
+
+    def querystring(self, **cambios):
+        return urlencode(self.parametros(**cambios))
+
+    def firma(self):
+        """Identificador estable de la combinación de filtros (para claves de caché)."""
+        return urlencode(sorted(self.parametros().items()))
+
+    def ids_busqueda(self):
+        """Resultado del índice full-text, memorizado para no repetir la búsqueda."""
+        if self._ids_busqueda is None:
+            self._ids_busqueda = busqueda.buscar(self.q) if self.q else []
+        return self._ids_busqueda
+
+    def filtros_q(self, excluir=()):
+        """
+        Q con los filtros de categoría, marca y precio. `excluir` omite
+        dimensiones ('categoria', 'marca', 'precio'), útil para las facetas.
+        """
+        filtro = Q()
+        if self.categoria and 'categoria' not in excluir:
+            filtro &= Q(categoria=self.categoria)
+        if self.marca and 'marca' not in excluir:
+            filtro &= Q(marca=self.marca)
+        if 'precio' not in excluir:
+            if self.min_price is not None:
+                filtro &= Q(precio__gte=self.min_price)
+            if self.max_price is not None:
+                filtro &= Q(precio__lte=self.max_price)
+        return filtro
+
+    def base(self):
+        """Productos activos que coinciden con la búsqueda (sin el resto de filtros)."""
+        productos = Producto.objects.filter(activo=True)
+        if self.q:
+            productos = productos.filter(id__in=self.ids_busqueda())
+        return productos
+
+    def queryset(self):
+        """Productos activos que cumplen todos los filtros, de lo más nuevo a lo más antiguo."""
+        productos = Producto.objects.filter(activo=True).filter(self.filtros_q()).order_by('-fecha_creacion', '-id')
+        if self.q:
+            productos = busqueda.filtrar_queryset(productos, self.q, ids=self.ids_busqueda())
+        return productos
+
+    def pagina(self, numero, por_pagina=PRODUCTOS_POR_PAGINA):
+        """
+        Devuelve un django.core.paginator.Page con las variantes precargadas.
+        Igual que Paginator.get_page, un número inválido o fuera de rango
+        entrega la primera o la última página.
+        """
+        productos = self.queryset()
+        numero = max(_entero_o_none(numero) or 1, 1)
+
+        if self.q:
+            filas, numero, total = self._filas_por_relevancia(numero, por_pagina)
+        else:
+            filas, numero, total = _paginar_queryset(productos, numero, por_pagina)
+
+        adjuntar_variantes(filas)
+
+        paginator = Paginator(productos, por_pagina)
+        paginator.count = total  # Evita el COUNT(*) separado del Paginator
+        return Page(filas, numero, paginator)
+
+    def _filas_por_relevancia(self, numero, por_pagina):
+        """Página de una búsqueda en el orden del ranking (sin ORDER BY CASE de miles de ramas)."""
+        validos = self.queryset().order_by().values_list('id', flat=True)
+        orden = busqueda.ordenar_por_relevancia(self.ids_busqueda(), validos)
+        total = len(orden)
+        numero = min(numero, max((total + por_pagina - 1) // por_pagina, 1))
+        inicio = (numero - 1) * por_pagina
+        ids_pagina = orden[inicio:inicio + por_pagina]
+        por_id = Producto.objects.in_bulk(ids_pagina)
+        return [por_id[pid] for pid in ids_pagina], numero, total
+
+    def pagina_cursor(self, cursor, por_pagina=PRODUCTOS_POR_PAGINA):
+        """
+        Modo keyset (ver core/paginacion.py): sin OFFSET ni COUNT, el costo no
+        depende de la profundidad. Ordena por fecha: con búsqueda (orden por
+        relevancia) el catálogo usa pagina().
+        """
+        pagina = paginar_keyset(self.queryset(), cursor, por_pagina)
+        adjuntar_variantes(pagina.object_list)
+        return pagina
+
+
+def _paginar_queryset(productos, numero, por_pagina):
+    """(filas, numero, total) de una página numerada; fuera de rango cae a la última."""
+    filas = _cargar_filas(productos, numero, por_pagina)
+    if filas:
+        return filas, numero, filas[0].total_catalogo
+    # Página fuera de rango (o catálogo vacío): caemos a la última
+    total = productos.count()
+    ultima = max((total + por_pagina - 1) // por_pagina, 1)
+    if numero > ultima:
+        numero = ultima
+        filas = _cargar_filas(productos, numero, por_pagina)
+    return filas, numero, total
+
+
+# ==========================================
+# --- VERSIÓN DEL CATÁLOGO (invalidación de cachés) ---
+# ==========================================
+
+def version_catalogo():
+    """
+    Número que cambia cada vez que se modifica un Producto o Variante.
+    Las cachés del catálogo lo incluyen en sus claves, así que al cambiar
+    la versión todo lo anterior queda obsoleto sin tener que borrarlo.
+    """
+    version = cache.get(CLAVE_VERSION)
+    if version is None:
+        # Partimos de un timestamp: si la clave se pierde, la nueva versión
+        # siempre es mayor que cualquiera usada antes.
+        cache.add(CLAVE_VERSION, int(time.time() * 1000), None)
+        version = cache.get(CLAVE_VERSION)
+    return version
+
+
+def invalidar_catalogo():
+    """Incrementa la versión del catálogo (llamado desde core/signals.py)."""
+    try:
+        cache.incr(CLAVE_VERSION)
+    except ValueError:
+        version_catalogo()
+
+
+def _entero_o_none(valor):
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def _cargar_filas(productos, numero, por_pagina):
+    inicio = (numero - 1) * por_pagina
+    con_total = productos.annotate(total_catalogo=Window(expression=Count('id')))
+    return list(con_total[inicio:inicio + por_pagina])
+
+
+def adjuntar_variantes(productos):
+    """
+    Precarga las variantes de una lista de productos en una sola consulta y
+    deja calculados los flags de stock:
+    - producto.hay_stock: alguna variante con stock > 0
+    - variante.disponible: stock > 0
+    """
+    prefetch_related_objects(productos, Prefetch('variantes', queryset=Variante.objects.order_by('id')))
+    for producto in productos:
+        hay_stock = False
+        for variante in producto.variantes.all():
+            variante.disponible = variante.stock > 0
+            hay_stock = hay_stock or variante.disponible
+        producto.hay_stock = hay_stock
+    return productos
+
+
+@contextmanager
+def presupuesto_consultas(maximo=PRESUPUESTO_CONSULTAS, using=None):
+    """
+    Falla con AssertionError si el bloque ejecuta más de `maximo` consultas.
+
+        with presupuesto_consultas(3):
+            ConsultaCatalogo().pagina(1)
+    """
+    conexion = connections[using] if using else connection
+    with CaptureQueriesContext(conexion) as capturadas:
+        yield capturadas
+    if len(capturadas) > maximo:
+        detalle = '\n'.join(f"{i}. {c['sql']}" for i, c in enumerate(capturadas.captured_queries, 1))
+        raise AssertionError(f"Se ejecutaron {len(capturadas)} consultas (máximo {maximo}):\n{detalle}")
@@ -0,0 +1,88 @@
+# core/consola_ordenes.py
+
+"""
+Consulta de la Estación de Despacho (admin_ordenes).
+
+- Filtros del lado del servidor: estado, rango de fechas, email y número de orden.
+- Paginación por cursor (core/paginacion.py): cada página cuesta lo mismo.
+- Ítems con prefetch_related (una consulta por página, no por orden) y el
+  teléfono de la última dirección del cliente como subconsulta anotada.
+"""
+
+from datetime import date, datetime, time, timedelta
+
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from .models import Direccion, ESTADOS_PEDIDO, Orden
+from .paginacion import paginar_keyset
+
+ORDENES_POR_PAGINA = 50
+ESTADOS_VALIDOS = {codigo for codigo, _ in ESTADOS_PEDIDO}
+# Órdenes pagadas que todavía no salen de bodega
+ESTADOS_POR_DESPACHAR = ('CONFIRMADO', 'PICKING', 'EMBALAJE')
+
+
+def _fecha(valor):
+    try:
+        return date.fromisoformat(valor) if valor else None
+    except ValueError:
+        return None
+
+
+def filtros_desde_request(params):
+    """Normaliza los filtros del querystring (los inválidos se ignoran)."""
+    estado = params.get('estado', '')
+    return {
+        'estado': estado if estado in ESTADOS_VALIDOS else '',
+        'desde': _fecha(params.get('desde')),
+        'hasta': _fecha(params.get('hasta')),
+        'email': params.get('email', '').strip(),
+        'numero': params.get('numero', '').strip().upper(),
+    }
+
+
+def consulta_ordenes(estado='', desde=None, hasta=None, email='', numero=''):
+    ordenes = Orden.objects.select_related('usuario').prefetch_related('items_orden').annotate(
+        telefono=Subquery(
+            Direccion.objects.filter(usuario=OuterRef('usuario_id')).order_by('-id').values('telefono')[:1]
+        ),
+    )
+    if estado:
+        ordenes = ordenes.filter(estado=estado)
+    if desde:
+        ordenes = ordenes.filter(fecha_creacion__gte=timezone.make_aware(datetime.combine(desde, time.min)))
+    if hasta:
+        ordenes = ordenes.filter(fecha_creacion__lt=timezone.make_aware(datetime.combine(hasta + timedelta(days=1), time.min)))
+    if email:
+        ordenes = ordenes.filter(email__icontains=email)
+    if numero:
+        # Prefijo sobre el índice único de numero_orden
+        ordenes = ordenes.filter(numero_orden__startswith=numero)
+    return ordenes
+
+
+def pagina_ordenes(filtros, cursor=None, por_pagina=ORDENES_POR_PAGINA):
+    return paginar_keyset(consulta_ordenes(**filtros), cursor, por_pagina)
+
+
+def orden_a_dict(orden):
+    """Representación JSON de una fila de la consola (usa los ítems ya precargados)."""
+    return {
+        'id': orden.id,
+        'numero_orden': orden.numero_orden,
+        'fecha_creacion': orden.fecha_creacion.isoformat(),
+        'estado': orden.estado,
+        'estado_display': orden.get_estado_display(),
+        'cliente': f"{orden.usuario.first_name} {orden.usuario.last_name}".strip() if orden.usuario else '',
+        'email': orden.email,
+        'telefono': orden.telefono,
+        'direccion_envio': orden.direccion_envio,
+        'costo_envio': int(orden.costo_envio),
+        'total_final': int(orden.total_final),
+        'codigo_seguimiento': orden.codigo_seguimiento,
+        'items': [
+            {'nombre_producto': i.nombre_producto, 'talla_color': i.talla_color, 'cantidad': i.cantidad}
+            for i in orden.items_orden.all()
+        ],
+    }
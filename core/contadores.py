@@ -0,0 +1,64 @@
+# core/contadores.py
+
+"""
+Contadores de servicio compartidos entre procesos (tabla ContadorServicio).
+
+Los suman los workers (correo, inferencia) y los lee el proceso web: en la
+caché de Django con LocMemCache (el default) cada proceso vería solo los
+suyos. registrar() aplica todas las sumas y máximos de una vez en un solo
+UPDATE atómico (CASE por nombre sobre F('valor')); las filas se crean la
+primera vez que se usan.
+"""
+
+from django.db.models import BigIntegerField, Case, F, Value, When
+from django.db.models.functions import Greatest
+
+from .models import ContadorServicio
+
+
+# Nombres cuya fila ya existe (las filas no se borran): se crean una vez por proceso
+_con_fila = set()
+
+
+def registrar(sumas=None, maximos=None):
+    """
+    sumas: {nombre: cantidad} que se suman; maximos: {nombre: valor} que se
+    guardan si superan al actual. Todo en un solo UPDATE (más un INSERT la
+    primera vez que el proceso ve un nombre).
+    """
+    sumas = sumas or {}
+    maximos = maximos or {}
+    nombres = set(sumas) | set(maximos)
+    if not nombres:
+        return
+    faltan = nombres - _con_fila
+    if faltan:
+        ContadorServicio.objects.bulk_create([ContadorServicio(nombre=n) for n in faltan], ignore_conflicts=True)
+        _con_fila.update(faltan)
+
+    casos = [When(nombre=n, then=F('valor') + Value(c)) for n, c in sumas.items()]
+    casos += [When(nombre=n, then=Greatest(F('valor'), Value(v))) for n, v in maximos.items()]
+    valor = Case(*casos, default=F('valor'), output_field=BigIntegerField())
+    filas = ContadorServicio.objects.filter(nombre__in=nombres)
+    if filas.update(valor=valor) < len(nombres):
+        # Alguien borró filas que este proceso ya había creado: se recrean y se aplican solo a esas
+        perdidas = nombres - set(filas.values_list('nombre', flat=True))
+        ContadorServicio.objects.bulk_create([ContadorServicio(nombre=n) for n in perdidas], ignore_conflicts=True)
+        ContadorServicio.objects.filter(nombre__in=perdidas).update(valor=valor)
+
+
+def sumar(valores):
+    """valores: {nombre: cantidad}."""
+    registrar(sumas=valores)
+
+
+def maximo(nombre, valor):
+    """Guarda `valor` si supera al actual."""
+    registrar(maximos={nombre: valor})
+
+
+def leer(*nombres):
+    """{nombre: valor} en una consulta (0 para los que todavía no existen)."""
+    valores = dict.fromkeys(nombres, 0)
+    valores.update(ContadorServicio.objects.filter(nombre__in=nombres).values_list('nombre', 'valor'))
+    return valores
@@ -0,0 +1,73 @@
+# core/conversion.py
+
+"""
+Conversión del probador virtual: pruebas (RegistroTryOn) vs. unidades
+vendidas de cada producto, en UNA consulta agrupada.
+
+Las pruebas se agrupan por producto_id y las ventas salen de una subconsulta
+correlacionada sobre los rollups diarios (core/rollups.py), unidas por id de
+producto (no por el nombre como texto). El costo no depende de cuántos
+productos se pidan: top-5 o top-50 es la misma consulta.
+"""
+
+from datetime import datetime, time, timedelta
+
+from django.db.models import Count, F, FloatField, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Cast, Coalesce, Greatest
+from django.utils import timezone
+
+from .models import RegistroTryOn, VentaDiariaProducto
+from .rollups import ESTADOS_VENTA
+
+ORDENES = {
+    'pruebas': ('-veces_probado', '-ventas_reales'),
+    'ventas': ('-ventas_reales', '-veces_probado'),
+    'conversion': ('-tasa', '-veces_probado'),
+}
+
+
+def _inicio_dia(fecha):
+    return timezone.make_aware(datetime.combine(fecha, time.min))
+
+
+def conversion_tryon(desde=None, hasta=None, productos=None, limite=50, ordenar='pruebas'):
+    """
+    Lista de {'producto_id', 'producto__nombre', 'veces_probado', 'ventas_reales',
+    'tasa_conversion'} para los productos probados en el rango (fechas inclusive).
+    `productos` restringe a esos ids; `ordenar` es 'pruebas', 'ventas' o 'conversion'.
+    """
+    ventas = VentaDiariaProducto.objects.filter(producto_id=OuterRef('producto_id'), estado__in=ESTADOS_VENTA)
+    pruebas = RegistroTryOn.objects.all()
+    if desde:
+        ventas = ventas.filter(fecha__gte=desde)
+        pruebas = pruebas.filter(fecha__gte=_inicio_dia(desde))
+    if hasta:
+        ventas = ventas.filter(fecha__lte=hasta)
+        pruebas = pruebas.filter(fecha__lt=_inicio_dia(hasta) + timedelta(days=1))
+    if productos is not None:
+        pruebas = pruebas.filter(producto_id__in=productos)
+
+    ventas = ventas.values('producto_id').annotate(total=Sum('unidades')).values('total')
+
+    filas = pruebas.values('producto_id', 'producto__nombre') \
+        .annotate(
+            veces_probado=Count('id'),
+            ventas_reales=Coalesce(Subquery(ventas, output_field=IntegerField()), Value(0)),
+        ) \
+        .annotate(
+            tasa=Cast(F('ventas_reales'), FloatField()) * 100 / Greatest(F('veces_probado'), Value(1)),
+        ) \
+        .order_by(*ORDENES[ordenar], 'producto_id')
+
+    if limite:
+        filas = filas[:limite]
+    return [
+        {
+            'producto_id': f['producto_id'],
+            'producto__nombre': f['producto__nombre'],
+            'veces_probado': f['veces_probado'],
+            'ventas_reales': f['ventas_reales'],
+            'tasa_conversion': round(f['tasa'], 1),
+        }
+        for f in filas
+    ]
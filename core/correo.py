@@ -0,0 +1,170 @@
+# core/correo.py
+
+"""
+Envío de correo con una conexión SMTP reutilizada por worker.
+
+Django abre, autentica (STARTTLS + LOGIN) y cierra una conexión por cada
+EmailMessage.send(). Aquí cada hilo guarda su conexión abierta y la reutiliza:
+
+- Si estuvo ociosa más de VERIFICAR_TRAS segundos se comprueba con NOOP; si
+  pasó MAX_INACTIVIDAD (Gmail corta las ociosas) o el NOOP falla, se reabre.
+- Si el servidor cortó justo antes del envío (SMTPServerDisconnected) se
+  reconecta y se reintenta una vez.
+- enviar() recibe varios mensajes y los manda uno por uno por la misma
+  conexión, cada uno con su propio manejo de errores: un destinatario
+  rechazado no frena al resto y, ante un error del servidor o de la conexión,
+  lo que faltaba queda `pendiente` para que el que llama lo reencole (sin
+  volver a mandar lo que ya salió).
+
+Contadores (enviados, fallidos, lotes, conexiones abiertas y latencia) en la
+base (core/contadores.py): cada enviar() los acumula y los escribe una sola
+vez al final (un UPDATE por lote, no uno por correo); los lee el panel web.
+"""
+
+import logging
+import smtplib
+import threading
+import time
+from dataclasses import dataclass, field
+
+from django.core.mail import get_connection
+
+from . import contadores
+
+logger = logging.getLogger(__name__)
+
+VERIFICAR_TRAS = 15      # segundos ociosa antes de hacer NOOP
+MAX_INACTIVIDAD = 60 * 4  # segundos ociosa antes de reabrir sin preguntar
+
+CLAVE_ENVIADOS = 'correo:enviados'
+CLAVE_FALLIDOS = 'correo:fallidos'
+CLAVE_LOTES = 'correo:lotes'
+CLAVE_CONEXIONES = 'correo:conexiones'
+CLAVE_LATENCIA_MS = 'correo:latencia_ms'
+CLAVE_LATENCIA_MAX_MS = 'correo:latencia_max_ms'
+
+_local = threading.local()
+
+
+@dataclass
+class ResultadoEnvio:
+    enviados: list = field(default_factory=list)
+    rechazados: list = field(default_factory=list)  # destinatario inválido o rechazado: no se reintenta
+    pendientes: list = field(default_factory=list)  # error del servidor/conexión: se puede reintentar
+    error: Exception = None
+
+
+def _viva(conexion):
+    """NOOP sobre la conexión SMTP (los backends sin socket, como locmem, siempre están vivos)."""
+    if not hasattr(conexion, 'connection'):
+        return True
+    if conexion.connection is None:
+        return False
+    try:
+        return conexion.connection.noop()[0] == 250
+    except (smtplib.SMTPException, OSError):
+        return False
+
+
+def _conexion():
+    conexion = getattr(_local, 'conexion', None)
+    if conexion is not None:
+        ociosa = time.monotonic() - _local.ultimo_uso
+        if ociosa > MAX_INACTIVIDAD or (ociosa > VERIFICAR_TRAS and not _viva(conexion)):
+            cerrar()
+            conexion = None
+    if conexion is None:
+        conexion = get_connection()
+        conexion.open()
+        _local.conexion = conexion
+        # Se escribe junto con el resto de los contadores al final de enviar()
+        _local.abiertas = getattr(_local, 'abiertas', 0) + 1
+    _local.ultimo_uso = time.monotonic()
+    return conexion
+
+
+def cerrar():
+    """Cierra la conexión del hilo actual (al detener el worker o tras un error)."""
+    conexion = getattr(_local, 'conexion', None)
+    _local.conexion = None
+    if conexion is not None:
+        try:
+            conexion.close()
+        except Exception:
+            logger.debug("Error al cerrar la conexión SMTP", exc_info=True)
+
+
+def _enviar_uno(mensaje):
+    try:
+        _conexion().send_messages([mensaje])
+    except smtplib.SMTPServerDisconnected:
+        # La conexión murió entre el chequeo y el envío: una reconexión y un reintento
+        cerrar()
+        _conexion().send_messages([mensaje])
+
+
+def enviar(mensajes):
+    """
+    Envía los mensajes por la conexión del worker, uno por uno. Devuelve un
+    ResultadoEnvio; no lanza por errores de envío.
+    """
+    resultado = ResultadoEnvio()
+    mensajes = list(mensajes)
+    if not mensajes:
+        return resultado
+    inicio = time.monotonic()
+    for i, mensaje in enumerate(mensajes):
+        try:
+            _enviar_uno(mensaje)
+        except (smtplib.SMTPRecipientsRefused, ValueError) as e:
+            logger.warning("Correo '%s' rechazado para %s: %s", mensaje.subject, mensaje.to, e)
+            resultado.rechazados.append(mensaje)
+        except Exception as e:
+            # Servidor caído o conexión rota: no se insiste con el resto en esta vuelta
+            cerrar()
+            logger.warning("Error SMTP, quedan %s correos pendientes: %s", len(mensajes) - i, e)
+            resultado.pendientes = mensajes[i:]
+            resultado.error = e
+            break
+        else:
+            resultado.enviados.append(mensaje)
+
+    latencia = int((time.monotonic() - inicio) * 1000)
+    _local.ultimo_uso = time.monotonic()
+    abiertas, _local.abiertas = getattr(_local, 'abiertas', 0), 0
+    contadores.registrar(
+        sumas={
+            CLAVE_ENVIADOS: len(resultado.enviados),
+            CLAVE_FALLIDOS: len(resultado.rechazados) + len(resultado.pendientes),
+            CLAVE_LOTES: 1,
+            CLAVE_LATENCIA_MS: latencia,
+            CLAVE_CONEXIONES: abiertas,
+        },
+        maximos={CLAVE_LATENCIA_MAX_MS: latencia},
+    )
+    return resultado
+
+
+def enviar_uno(mensaje):
+    """Para las tareas de un solo correo: True si salió, False si lo rechazaron; relanza los errores reintentables."""
+    resultado = enviar([mensaje])
+    if resultado.pendientes:
+        raise resultado.error
+    return bool(resultado.enviados)
+
+
+def estadisticas():
+    """Contadores de envío de todos los workers."""
+    c = contadores.leer(
+        CLAVE_ENVIADOS, CLAVE_FALLIDOS, CLAVE_LOTES, CLAVE_CONEXIONES, CLAVE_LATENCIA_MS, CLAVE_LATENCIA_MAX_MS
+    )
+    enviados, lotes, latencia = c[CLAVE_ENVIADOS], c[CLAVE_LOTES], c[CLAVE_LATENCIA_MS]
+    return {
+        'enviados': enviados,
+        'fallidos': c[CLAVE_FALLIDOS],
+        'lotes': lotes,
+        'conexiones_abiertas': c[CLAVE_CONEXIONES],
+        'latencia_promedio_lote_ms': round(latencia / lotes, 1) if lotes else None,
+        'latencia_promedio_mensaje_ms': round(latencia / enviados, 1) if enviados else None,
+        'latencia_max_ms': c[CLAVE_LATENCIA_MAX_MS],
+    }
@@ -0,0 +1,135 @@
+# core/eventos.py
+
+"""
+Ingesta en lotes de eventos de alto volumen: pruebas del probador
+(RegistroTryOn) y vistas de producto (VistaProducto).
+
+registrar() solo agrega el evento a un buffer en memoria del proceso (no toca
+la base). Un hilo de fondo (uno por proceso) vacía el buffer con bulk_create:
+
+- apenas junta settings.EVENTOS_LOTE eventos (registrar() lo despierta),
+- cada settings.EVENTOS_INTERVALO segundos,
+- al terminar el proceso (atexit: apagado ordenado de gunicorn o del worker).
+
+Si el guardado falla los eventos vuelven al buffer y se reintentan en la
+próxima vuelta. El buffer nunca pasa de EVENTOS_MAX_BUFFER: sobre ese tope se
+descartan los más antiguos (también en registrar(), por si la base está caída
+mucho rato). Ningún error mata el hilo de fondo.
+
+bulk_create no dispara post_save, así que el snapshot de segmentos de los
+clientes que usaron el probador se refresca explícitamente después de cada lote.
+"""
+
+import atexit
+import logging
+import os
+import threading
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from . import segmentacion
+from .models import Producto, RegistroTryOn, VistaProducto
+
+logger = logging.getLogger(__name__)
+
+MODELOS = {
+    'tryon': RegistroTryOn,
+    'vista': VistaProducto,
+}
+
+Evento = namedtuple('Evento', 'tipo producto_id usuario_id fecha')
+
+_lock = threading.Lock()
+_despertar = threading.Event()
+_buffer = []
+_pid = None
+
+
+def _iniciar():
+    """Arranca el hilo de vaciado (una vez por proceso; tras un fork se vuelve a arrancar)."""
+    global _pid
+    if _pid == os.getpid():
+        return
+    _pid = os.getpid()
+    _buffer.clear()
+    threading.Thread(target=_vaciar_periodicamente, name='eventos-buffer', daemon=True).start()
+
+
+def _vaciar_periodicamente():
+    while True:
+        _despertar.wait(settings.EVENTOS_INTERVALO)
+        _despertar.clear()
+        try:
+            vaciar()
+        except Exception:
+            logger.exception("Error al vaciar el buffer de eventos")
+        finally:
+            # Este hilo tiene su propia conexión a la base
+            close_old_connections()
+
+
+def registrar(tipo, producto_id, usuario_id=None, fecha=None):
+    """Agrega un evento al buffer, sin consultas: el guardado ocurre en el hilo de fondo."""
+    if tipo not in MODELOS:
+        raise ValueError(f"Tipo de evento desconocido: {tipo}")
+    with _lock:
+        _iniciar()
+        _buffer.append(Evento(tipo, int(producto_id), usuario_id, fecha or timezone.now()))
+        _recortar()
+        if len(_buffer) >= settings.EVENTOS_LOTE:
+            _despertar.set()
+
+
+def _recortar():
+    """Con el lock tomado: descarta los eventos más antiguos sobre EVENTOS_MAX_BUFFER."""
+    sobrante = len(_buffer) - settings.EVENTOS_MAX_BUFFER
+    if sobrante > 0:
+        del _buffer[:sobrante]
+        logger.error("Buffer de eventos lleno: se descartaron %s eventos", sobrante)
+
+
+def pendientes():
+    return len(_buffer)
+
+
+def vaciar():
+    """Guarda todo lo que hay en el buffer. Devuelve la cantidad de eventos guardados."""
+    with _lock:
+        lote = _buffer[:]
+        _buffer.clear()
+    if not lote:
+        return 0
+
+    try:
+        # Los productos borrados mientras el evento esperaba se descartan
+        existentes = set(
+            Producto.objects.filter(id__in={e.producto_id for e in lote}).values_list('id', flat=True)
+        )
+        validos = [e for e in lote if e.producto_id in existentes]
+        with transaction.atomic():
+            for tipo, modelo in MODELOS.items():
+                filas = [
+                    modelo(producto_id=e.producto_id, usuario_id=e.usuario_id, fecha=e.fecha)
+                    for e in validos if e.tipo == tipo
+                ]
+                if filas:
+                    modelo.objects.bulk_create(filas, batch_size=500)
+    except Exception:
+        logger.exception("No se pudieron guardar %s eventos; se reintenta en la próxima vuelta", len(lote))
+        with _lock:
+            _buffer[:0] = lote
+            _recortar()
+        return 0
+
+    try:
+        segmentacion.refrescar_segmentos({e.usuario_id for e in validos if e.tipo == 'tryon' and e.usuario_id})
+    except Exception:
+        # Los eventos ya quedaron guardados; el pase diario (refrescar_segmentos) corrige el snapshot
+        logger.exception("No se pudo refrescar el segmento de los clientes del lote")
+    return len(validos)
+
+
+atexit.register(vaciar)
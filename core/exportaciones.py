@@ -0,0 +1,257 @@
+# core/exportaciones.py
+
+"""
+Exportaciones en streaming para BI: órdenes, ítems, pruebas del probador y
+métricas de clientes (snapshot SegmentoCliente).
+
+Las filas se leen por lotes con keyset (id > último_id ORDER BY id LIMIT n),
+así la memoria es constante aunque sean millones de filas y el primer byte
+sale apenas llega el primer lote. Funciona igual en MySQL y SQLite, sin
+depender de cursores del lado del servidor.
+
+Formatos: CSV siempre; Parquet si está instalado pyarrow (opcional).
+"""
+
+import csv
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db.models import Exists, OuterRef
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from .models import ItemOrden, Orden, RegistroTryOn, SegmentoCliente
+
+LOTE = 2000
+
+
+class ExportacionInvalida(Exception):
+    pass
+
+
+def _inicio_dia(fecha):
+    return timezone.make_aware(datetime.combine(fecha, time.min))
+
+
+def _filtrar_fechas(queryset, campo, desde, hasta):
+    if desde:
+        queryset = queryset.filter(**{f'{campo}__gte': _inicio_dia(desde)})
+    if hasta:
+        queryset = queryset.filter(**{f'{campo}__lt': _inicio_dia(hasta + timedelta(days=1))})
+    return queryset
+
+
+# ==========================================
+# --- 1. DATASETS ---
+# ==========================================
+# Cada dataset: (queryset filtrado, campo de keyset, columnas para values_list)
+
+def _ordenes(desde=None, hasta=None, estado=None, marca=None):
+    ordenes = _filtrar_fechas(Orden.objects.all(), 'fecha_creacion', desde, hasta)
+    if estado:
+        ordenes = ordenes.filter(estado=estado)
+    if marca:
+        ordenes = ordenes.filter(Exists(
+            ItemOrden.objects.filter(orden=OuterRef('pk'), variante__producto__marca=marca)
+        ))
+    return ordenes, 'id', (
+        'id', 'numero_orden', 'fecha_creacion', 'estado', 'usuario_id', 'email',
+        'subtotal', 'costo_envio', 'total_final', 'codigo_seguimiento',
+    )
+
+
+def _items(desde=None, hasta=None, estado=None, marca=None):
+    items = _filtrar_fechas(ItemOrden.objects.all(), 'orden__fecha_creacion', desde, hasta)
+    if estado:
+        items = items.filter(orden__estado=estado)
+    if marca:
+        items = items.filter(variante__producto__marca=marca)
+    return items, 'id', (
+        'id', 'orden_id', 'orden__numero_orden', 'orden__fecha_creacion', 'orden__estado',
+        'variante_id', 'variante__producto_id', 'variante__producto__marca', 'variante__producto__categoria',
+        'nombre_producto', 'talla_color', 'cantidad', 'precio_unitario',
+    )
+
+
+def _tryon(desde=None, hasta=None, estado=None, marca=None):
+    pruebas = _filtrar_fechas(RegistroTryOn.objects.all(), 'fecha', desde, hasta)
+    if marca:
+        pruebas = pruebas.filter(producto__marca=marca)
+    return pruebas, 'id', (
+        'id', 'fecha', 'producto_id', 'producto__nombre', 'producto__marca', 'producto__categoria', 'usuario_id',
+    )
+
+
+def _clientes(desde=None, hasta=None, estado=None, marca=None):
+    # `estado` filtra por segmento; el rango de fechas aplica a la última orden
+    clientes = _filtrar_fechas(SegmentoCliente.objects.all(), 'ultima_orden', desde, hasta)
+    if estado:
+        clientes = clientes.filter(segmento=estado)
+    return clientes, 'usuario_id', (
+        'usuario_id', 'usuario__username', 'usuario__email', 'usuario__first_name', 'usuario__last_name',
+        'telefono', 'segmento', 'total_gastado', 'total_ordenes', 'veces_ia', 'ultima_orden',
+    )
+
+
+DATASETS = {
+    'ordenes': _ordenes,
+    'items': _items,
+    'tryon': _tryon,
+    'clientes': _clientes,
+}
+
+
+def filas_por_lotes(queryset, campo_id, columnas, lote=LOTE):
+    """Genera tuplas de `columnas` recorriendo `queryset` por keyset sobre `campo_id`."""
+    columnas = list(columnas)
+    posicion = columnas.index(campo_id)
+    ultimo = None
+    while True:
+        pagina = queryset
+        if ultimo is not None:
+            pagina = pagina.filter(**{f'{campo_id}__gt': ultimo})
+        filas = list(pagina.order_by(campo_id).values_list(*columnas)[:lote])
+        if not filas:
+            return
+        yield from filas
+        if len(filas) < lote:
+            return
+        ultimo = filas[-1][posicion]
+
+
+# ==========================================
+# --- 2. FORMATOS ---
+# ==========================================
+
+class _Eco:
+    """Pseudo-archivo para csv.writer: devuelve la línea en vez de guardarla."""
+    def write(self, valor):
+        return valor
+
+
+def _encabezados(columnas):
+    return [c.replace('__', '_') for c in columnas]
+
+
+def lineas_csv(columnas, filas, modelo=None):
+    escritor = csv.writer(_Eco())
+    yield escritor.writerow(_encabezados(columnas))
+    for fila in filas:
+        yield escritor.writerow(fila)
+
+
+def bloques_parquet(columnas, filas, modelo, lote=LOTE):
+    """Parquet por row groups de `lote` filas (requiere pyarrow)."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ExportacionInvalida('El formato parquet requiere el paquete pyarrow.')
+
+    # Esquema fijo desde los campos del modelo (inferirlo del primer lote falla si una columna viene toda en NULL)
+    esquema = pa.schema([(nombre, _tipo_arrow(pa, modelo, ruta)) for nombre, ruta in zip(_encabezados(columnas), columnas)])
+
+    def generar():
+        sumidero = _Sumidero()
+        escritor = None
+        grupo = []
+        for fila in filas:
+            grupo.append(fila)
+            if len(grupo) == lote:
+                escritor = _escribir_grupo(pa, pq, escritor, sumidero, esquema, grupo)
+                grupo = []
+                yield sumidero.drenar()
+        if grupo or escritor is None:
+            escritor = _escribir_grupo(pa, pq, escritor, sumidero, esquema, grupo)
+        escritor.close()
+        yield sumidero.drenar()
+
+    return generar()
+
+
+class _Sumidero:
+    """Archivo de solo escritura para pyarrow: acumula bytes hasta que se drenan al response."""
+    closed = False
+
+    def __init__(self):
+        self.partes = []
+        self.posicion = 0
+
+    def write(self, datos):
+        datos = bytes(datos)
+        self.partes.append(datos)
+        self.posicion += len(datos)
+        return len(datos)
+
+    def tell(self):
+        return self.posicion
+
+    def writable(self):
+        return True
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drenar(self):
+        datos = b''.join(self.partes)
+        self.partes = []
+        return datos
+
+
+def _escribir_grupo(pa, pq, escritor, sumidero, esquema, grupo):
+    columnas = [[_valor_arrow(f[i]) for f in grupo] for i in range(len(esquema))]
+    tabla = pa.Table.from_arrays([pa.array(c, type=campo.type) for c, campo in zip(columnas, esquema)], schema=esquema)
+    if escritor is None:
+        escritor = pq.ParquetWriter(sumidero, esquema)
+    escritor.write_table(tabla)
+    return escritor
+
+
+def _tipo_arrow(pa, modelo, ruta):
+    """Tipo arrow de una ruta de values_list ('orden__fecha_creacion', 'usuario_id', ...)."""
+    *relaciones, nombre = ruta.split('__')
+    for relacion in relaciones:
+        modelo = modelo._meta.get_field(relacion).related_model
+    tipo = modelo._meta.get_field(nombre).get_internal_type()
+    if tipo in ('AutoField', 'BigAutoField', 'IntegerField', 'BigIntegerField', 'PositiveIntegerField',
+                'PositiveSmallIntegerField', 'ForeignKey', 'OneToOneField'):
+        return pa.int64()
+    if tipo == 'DecimalField':
+        return pa.float64()
+    if tipo == 'DateTimeField':
+        return pa.timestamp('us', tz='UTC')
+    if tipo == 'DateField':
+        return pa.date32()
+    if tipo == 'BooleanField':
+        return pa.bool_()
+    return pa.string()
+
+
+def _valor_arrow(valor):
+    # Decimales como float (montos sin decimales); fechas y textos tal cual
+    if isinstance(valor, Decimal):
+        return float(valor)
+    return valor
+
+
+FORMATOS = {
+    'csv': (lineas_csv, 'text/csv; charset=utf-8'),
+    'parquet': (bloques_parquet, 'application/vnd.apache.parquet'),
+}
+
+
+def exportar(dataset, formato='csv', **filtros):
+    """StreamingHttpResponse con el dataset filtrado. Lanza ExportacionInvalida."""
+    if dataset not in DATASETS:
+        raise ExportacionInvalida(f"Dataset desconocido: {dataset}")
+    if formato not in FORMATOS:
+        raise ExportacionInvalida(f"Formato desconocido: {formato}")
+    queryset, campo_id, columnas = DATASETS[dataset](**filtros)
+    generador, tipo = FORMATOS[formato]
+    filas = filas_por_lotes(queryset, campo_id, columnas)
+    response = StreamingHttpResponse(generador(columnas, filas, queryset.model), content_type=tipo)
+    response['Content-Disposition'] = f'attachment; filename="{dataset}.{formato}"'
+    return response
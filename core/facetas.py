@@ -0,0 +1,113 @@
+# core/facetas.py
+
+"""
+Facetas del catálogo: cuántos productos hay por categoría, por marca y por
+rango de precio para la búsqueda/filtros actuales.
+
+Todo sale de UNA consulta con agregados condicionales (COUNT ... FILTER / CASE).
+Cada dimensión ignora su propio filtro para que el cliente vea las
+alternativas (p. ej. con marca=guess se siguen contando las otras marcas).
+El resultado se guarda en caché por firma de filtros + versión del catálogo,
+que cambia con cada save/delete de Producto o Variante.
+"""
+
+import hashlib
+
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from .models import CATEGORIAS, MARCAS
+from .catalogo import version_catalogo
+
+# Rangos de precio en CLP: (desde, hasta) con hasta exclusivo; None = sin tope
+RANGOS_PRECIO = (
+    (0, 20000),
+    (20000, 50000),
+    (50000, 100000),
+    (100000, 200000),
+    (200000, None),
+)
+
+TIEMPO_CACHE = 60 * 15
+
+
+def _etiqueta_rango(desde, hasta):
+    if hasta is None:
+        return f"Desde ${desde:,}".replace(',', '.')
+    return f"${desde:,} - ${hasta:,}".replace(',', '.')
+
+
+def _clave(consulta):
+    firma = hashlib.md5(consulta.firma().encode()).hexdigest()
+    return f"catalogo:facetas:{version_catalogo()}:{firma}"
+
+
+def contar_facetas(consulta):
+    """
+    Devuelve {'categorias': [...], 'marcas': [...], 'precios': [...]} para una
+    ConsultaCatalogo. Cada entrada trae valor/nombre, total y el querystring
+    para aplicar (o quitar) ese filtro.
+    """
+    clave = _clave(consulta)
+    conteos = cache.get(clave)
+    if conteos is None:
+        conteos = _agregar(consulta)
+        cache.set(clave, conteos, TIEMPO_CACHE)
+    return _armar(consulta, conteos)
+
+
+def _agregar(consulta):
+    """Una sola consulta agregada con un COUNT condicional por valor de faceta."""
+    sin_categoria = consulta.filtros_q(excluir=('categoria',))
+    sin_marca = consulta.filtros_q(excluir=('marca',))
+    sin_precio = consulta.filtros_q(excluir=('precio',))
+
+    agregados = {}
+    for valor, _ in CATEGORIAS:
+        agregados[f'cat__{valor}'] = Count('id', filter=sin_categoria & Q(categoria=valor))
+    for valor, _ in MARCAS:
+        agregados[f'marca__{valor}'] = Count('id', filter=sin_marca & Q(marca=valor))
+    for i, (desde, hasta) in enumerate(RANGOS_PRECIO):
+        rango = Q(precio__gte=desde)
+        if hasta is not None:
+            rango &= Q(precio__lt=hasta)
+        agregados[f'precio__{i}'] = Count('id', filter=sin_precio & rango)
+
+    return consulta.base().aggregate(**agregados)
+
+
+def _armar(consulta, conteos):
+    categorias = [{
+        'valor': valor,
+        'nombre': nombre,
+        'total': conteos[f'cat__{valor}'],
+        'activo': consulta.categoria == valor,
+        'querystring': consulta.querystring(categoria=None if consulta.categoria == valor else valor),
+    } for valor, nombre in CATEGORIAS]
+
+    marcas = [{
+        'valor': valor,
+        'nombre': nombre,
+        'total': conteos[f'marca__{valor}'],
+        'activo': consulta.marca == valor,
+        'querystring': consulta.querystring(marca=None if consulta.marca == valor else valor),
+    } for valor, nombre in MARCAS]
+
+    precios = []
+    for i, (desde, hasta) in enumerate(RANGOS_PRECIO):
+        # max_price es inclusivo en el catálogo, por eso hasta - 1
+        max_price = hasta - 1 if hasta is not None else None
+        activo = consulta.min_price == desde and consulta.max_price == max_price
+        precios.append({
+            'desde': desde,
+            'hasta': hasta,
+            'etiqueta': _etiqueta_rango(desde, hasta),
+            'total': conteos[f'precio__{i}'],
+            'activo': activo,
+            'querystring': consulta.querystring(
+                min_price=None if activo else desde,
+                max_price=None if activo else max_price,
+            ),
+        })
+
+    return {'categorias': categorias, 'marcas': marcas, 'precios': precios}
@@ -0,0 +1,110 @@
+# core/fotos_tryon.py
+
+"""
+Preparación de la foto del cliente antes de mandarla al probador.
+
+Las fotos de celular llegan a 12+ MP y varios MB; IDM-VTON trabaja a
+768x1024. preparar_foto() recibe el archivo subido (multipart, Django lo
+deja en disco si es grande) o un data URL y:
+
+1. Decodifica con Image.draft: un JPEG grande se decodifica directamente a
+   1/2, 1/4 u 1/8 de escala, sin pasar por la imagen completa en memoria.
+2. Aplica la orientación EXIF y baja a RESOLUCION_MODELO (sin agrandar).
+3. Re-codifica como JPEG/WebP sin metadatos (EXIF, GPS, perfil de cámara).
+
+El resultado es el data URL que se guarda en el trabajo y viaja a Replicate,
+junto con los bytes ahorrados.
+"""
+
+import base64
+import binascii
+import io
+import logging
+from dataclasses import dataclass
+
+from django.conf import settings
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+RESOLUCION_MODELO = (768, 1024)   # ancho, alto de trabajo de IDM-VTON
+MAX_BYTES_SUBIDA = 20 * 1024 * 1024
+MAX_PIXELES = 50_000_000          # por sobre esto se rechaza (bomba de descompresión)
+CALIDAD = 88
+
+TIPOS = {'JPEG': 'image/jpeg', 'WEBP': 'image/webp'}
+
+
+class FotoInvalida(Exception):
+    pass
+
+
+@dataclass
+class FotoPreparada:
+    data_url: str
+    bytes_originales: int
+    bytes_finales: int
+    ancho: int
+    alto: int
+
+    @property
+    def bytes_ahorrados(self):
+        return max(self.bytes_originales - self.bytes_finales, 0)
+
+    def resumen(self):
+        return {
+            'bytes_originales': self.bytes_originales,
+            'bytes_enviados': self.bytes_finales,
+            'bytes_ahorrados': self.bytes_ahorrados,
+            'resolucion': f'{self.ancho}x{self.alto}',
+        }
+
+
+def _desde_data_url(valor):
+    try:
+        _, datos = valor.split(',', 1) if valor.startswith('data:') else ('', valor)
+        return io.BytesIO(base64.b64decode(datos, validate=True))
+    except (ValueError, binascii.Error):
+        raise FotoInvalida('La foto no es un data URL válido.')
+
+
+def preparar_foto(origen):
+    """`origen`: archivo subido (UploadedFile / objeto tipo archivo) o data URL. Lanza FotoInvalida."""
+    archivo = _desde_data_url(origen) if isinstance(origen, str) else origen
+    archivo.seek(0, io.SEEK_END)
+    bytes_originales = archivo.tell()
+    archivo.seek(0)
+    if not bytes_originales:
+        raise FotoInvalida('Falta la foto.')
+    if bytes_originales > MAX_BYTES_SUBIDA:
+        raise FotoInvalida('La foto supera los 20 MB.')
+
+    try:
+        imagen = Image.open(archivo)
+        if imagen.width * imagen.height > MAX_PIXELES:
+            raise FotoInvalida('La foto es demasiado grande.')
+        # La orientación EXIF puede rotar 90°: el borrador se pide para el lado mayor
+        lado = max(RESOLUCION_MODELO)
+        imagen.draft('RGB', (lado, lado))
+        imagen = ImageOps.exif_transpose(imagen)
+        imagen = imagen.convert('RGB')
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+        raise FotoInvalida('No pudimos leer la foto. Prueba con un JPG o PNG.')
+
+    imagen.thumbnail(RESOLUCION_MODELO, Image.Resampling.LANCZOS)
+
+    formato = getattr(settings, 'TRYON_FORMATO_FOTO', 'JPEG')
+    salida = io.BytesIO()
+    # Sin exif=...: Pillow no copia metadatos al re-codificar
+    imagen.save(salida, formato, quality=CALIDAD, optimize=True)
+    contenido = salida.getvalue()
+
+    foto = FotoPreparada(
+        data_url=f'data:{TIPOS[formato]};base64,{base64.b64encode(contenido).decode()}',
+        bytes_originales=bytes_originales,
+        bytes_finales=len(contenido),
+        ancho=imagen.width,
+        alto=imagen.height,
+    )
+    logger.info("Foto try-on: %s -> %s bytes (%sx%s)", bytes_originales, len(contenido), imagen.width, imagen.height)
+    return foto
@@ -0,0 +1,341 @@
+# core/inferencia.py
+
+"""
+Gateway de salida hacia Replicate para el probador (core/tryon.py).
+
+- Cliente: uno por proceso (cliente()), con su pool de conexiones HTTP y
+  timeouts de conexión/lectura; con settings.TRYON_CLIENTE_FALSO se usa
+  ClienteReplicateFalso, sin red.
+- Concurrencia global: settings.INFERENCIA_CONCURRENCIA cupos en la tabla
+  CupoInferencia, compartidos por todos los workers. Un cupo se toma con
+  SELECT ... FOR UPDATE SKIP LOCKED y queda arrendado por ARRIENDO (se renueva
+  mientras la predicción avanza; si el worker muere, vence solo).
+- Fila justa: los trabajos en espera se ordenan por ronda de usuario (el
+  1er trabajo de cada cliente, luego el 2do de cada uno, ...) y después por
+  llegada. Un trabajo solo toma cupo si su posición cabe en los cupos libres;
+  si no, su tarea se pospone (core/tareas.Posponer) sin gastar el intento. La
+  posición se muestra al cliente mientras espera.
+- Fila justa calculada a lo más una vez por FILA_TTL segundos por proceso
+  (la consultan cada intento de turno y cada tick de SSE); el cupo real lo
+  decide tomar_cupo(), así que una fila con un segundo de atraso no rompe nada.
+- Circuit breaker: tras INFERENCIA_UMBRAL_FALLOS fallos seguidos del servicio
+  no se llama a Replicate por INFERENCIA_ENFRIAMIENTO segundos; después pasa
+  una sola llamada de prueba y, si funciona, se cierra. El estado vive en la
+  fila CircuitoInferencia: es el mismo para todos los workers.
+- Un trabajo que espera más de INFERENCIA_ESPERA_MAXIMA segundos falla con
+  un mensaje en vez de quedarse en la fila para siempre.
+
+Métricas (profundidad de la fila, cupos, estado del circuito, latencia del
+modelo) en estadisticas(); los contadores viven en la base
+(core/contadores.py), igual que los de core/correo.py.
+"""
+
+import logging
+import os
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import timedelta
+from functools import lru_cache
+
+import httpx
+import replicate
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from replicate.prediction import Prediction
+
+from . import contadores
+from .models import CircuitoInferencia, CupoInferencia, TrabajoTryOn
+from .tareas import Posponer
+
+logger = logging.getLogger(__name__)
+
+ARRIENDO = timedelta(seconds=90)
+ESPERA_TURNO = 2          # segundos hasta reintentar un trabajo sin turno
+TIMEOUT_HTTP = httpx.Timeout(30.0, connect=5.0)
+MAX_FILA = 1000           # trabajos considerados al calcular la fila justa
+FILA_TTL = 1.0            # segundos que se reutiliza la fila calculada en este proceso
+
+CLAVE_EJECUCIONES = 'inferencia:ejecuciones'
+CLAVE_FALLOS = 'inferencia:fallos'
+CLAVE_LATENCIA_MS = 'inferencia:latencia_ms'
+CLAVE_LATENCIA_MAX_MS = 'inferencia:latencia_max_ms'
+
+
+class ServicioNoConfigurado(Exception):
+    falla_servicio = False
+
+
+class FilaAgotada(Exception):
+    falla_servicio = False
+
+
+# ==========================================
+# --- 1. CLIENTE ---
+# ==========================================
+
+@lru_cache(maxsize=1)
+def _cliente_replicate(api_token):
+    return replicate.Client(api_token=api_token, timeout=TIMEOUT_HTTP)
+
+
+def cliente():
+    """Cliente de Replicate del proceso (se reutiliza entre trabajos)."""
+    if settings.TRYON_CLIENTE_FALSO:
+        return ClienteReplicateFalso()
+    api_token = os.environ.get('REPLICATE_API_TOKEN')
+    if not api_token:
+        raise ServicioNoConfigurado('Falta configurar el Token en el servidor')
+    return _cliente_replicate(api_token)
+
+
+# ==========================================
+# --- 2. CUPOS (semáforo entre workers) ---
+# ==========================================
+
+def _cupos_vigentes(ahora):
+    return CupoInferencia.objects.filter(id__lt=settings.INFERENCIA_CONCURRENCIA).filter(
+        Q(ocupado_hasta__isnull=True) | Q(ocupado_hasta__lt=ahora)
+    )
+
+
+def cupos_libres():
+    ocupados = CupoInferencia.objects.filter(
+        id__lt=settings.INFERENCIA_CONCURRENCIA, ocupado_hasta__gte=timezone.now()
+    ).count()
+    return settings.INFERENCIA_CONCURRENCIA - ocupados
+
+
+def tomar_cupo(dueno):
+    """Id del cupo tomado para `dueno`, o None si están todos ocupados."""
+    CupoInferencia.objects.bulk_create(
+        [CupoInferencia(id=i) for i in range(settings.INFERENCIA_CONCURRENCIA)], ignore_conflicts=True
+    )
+    ahora = timezone.now()
+    with transaction.atomic():
+        cupo = _cupos_vigentes(ahora).select_for_update(skip_locked=True).order_by('id').first()
+        if cupo is None:
+            return None
+        cupo.dueno = str(dueno)
+        cupo.ocupado_hasta = ahora + ARRIENDO
+        cupo.save(update_fields=['dueno', 'ocupado_hasta'])
+    return cupo.id
+
+
+def renovar_cupo(cupo_id, dueno):
+    CupoInferencia.objects.filter(id=cupo_id, dueno=str(dueno)).update(ocupado_hasta=timezone.now() + ARRIENDO)
+
+
+def liberar_cupo(cupo_id, dueno):
+    CupoInferencia.objects.filter(id=cupo_id, dueno=str(dueno)).update(dueno='', ocupado_hasta=None)
+
+
+def abandonado(trabajo):
+    """Un trabajo PROCESANDO sin cupo vigente ni avances en un ARRIENDO: su worker murió."""
+    if CupoInferencia.objects.filter(dueno=str(trabajo.id), ocupado_hasta__gte=timezone.now()).exists():
+        return False
+    return trabajo.fecha_actualizacion < timezone.now() - ARRIENDO
+
+
+# ==========================================
+# --- 3. FILA JUSTA ---
+# ==========================================
+
+def _en_fila():
+    # Solo los trabajos con tarea propia (los que se suman a uno idéntico no llevan foto)
+    return TrabajoTryOn.objects.filter(estado='EN_COLA').exclude(imagen_usuario='')
+
+
+_fila = (0.0, [])
+
+
+def fila_justa():
+    """Ids de los trabajos en espera en el orden en que van a pasar (cacheada FILA_TTL segundos)."""
+    global _fila
+    calculada, orden = _fila
+    if time.monotonic() - calculada < FILA_TTL:
+        return orden
+    orden = _calcular_fila()
+    _fila = (time.monotonic(), orden)
+    return orden
+
+
+def _calcular_fila():
+    filas = _en_fila().order_by('fecha_creacion', 'id').values_list('id', 'usuario_id')[:MAX_FILA]
+    rondas = defaultdict(int)
+    orden = []
+    for llegada, (trabajo_id, usuario_id) in enumerate(filas):
+        # Los anónimos no comparten ronda entre ellos
+        quien = usuario_id or trabajo_id
+        orden.append((rondas[quien], llegada, trabajo_id))
+        rondas[quien] += 1
+    return [trabajo_id for _, _, trabajo_id in sorted(orden)]
+
+
+def posicion_en_cola(trabajo):
+    """1 = es el siguiente; None si ya no está esperando."""
+    if trabajo.estado != 'EN_COLA':
+        return None
+    lider_id = trabajo.id
+    if not trabajo.imagen_usuario:
+        # Se sumó a un trabajo idéntico: espera lo mismo que ese
+        lider_id = _en_fila().filter(clave=trabajo.clave).values_list('id', flat=True).first()
+    fila = fila_justa()
+    return fila.index(lider_id) + 1 if lider_id in fila else None
+
+
+# ==========================================
+# --- 4. CIRCUIT BREAKER ---
+# ==========================================
+
+def _circuito():
+    return CircuitoInferencia.objects.get_or_create(id=1)[0]
+
+
+def circuito_abierto():
+    circuito = _circuito()
+    ahora = timezone.now()
+    if circuito.abierto_hasta is None:
+        return False
+    if ahora < circuito.abierto_hasta:
+        return True
+    # Semiabierto: pasa una sola llamada de prueba por período (UPDATE condicional: gana un worker)
+    prueba = CircuitoInferencia.objects.filter(id=1, abierto_hasta__lte=ahora).filter(
+        Q(prueba_hasta__isnull=True) | Q(prueba_hasta__lt=ahora)
+    ).update(prueba_hasta=ahora + timedelta(seconds=settings.INFERENCIA_ENFRIAMIENTO))
+    return not prueba
+
+
+def _registrar_exito(latencia_ms):
+    contadores.sumar({CLAVE_EJECUCIONES: 1, CLAVE_LATENCIA_MS: latencia_ms})
+    contadores.maximo(CLAVE_LATENCIA_MAX_MS, latencia_ms)
+    CircuitoInferencia.objects.filter(id=1).filter(Q(fallos_seguidos__gt=0) | Q(abierto_hasta__isnull=False)).update(
+        fallos_seguidos=0, abierto_hasta=None, prueba_hasta=None
+    )
+
+
+def _registrar_fallo():
+    contadores.sumar({CLAVE_FALLOS: 1})
+    _circuito()
+    CircuitoInferencia.objects.filter(id=1).update(fallos_seguidos=F('fallos_seguidos') + 1)
+    ahora = timezone.now()
+    # Abre (o reabre tras una prueba fallida) si no está abierto ya
+    abierto = CircuitoInferencia.objects.filter(id=1, fallos_seguidos__gte=settings.INFERENCIA_UMBRAL_FALLOS).filter(
+        Q(abierto_hasta__isnull=True) | Q(abierto_hasta__lte=ahora)
+    ).update(abierto_hasta=ahora + timedelta(seconds=settings.INFERENCIA_ENFRIAMIENTO), prueba_hasta=None)
+    if abierto:
+        logger.warning("Circuito de inferencia abierto por %ss", settings.INFERENCIA_ENFRIAMIENTO)
+
+
+# ==========================================
+# --- 5. TURNO (todo junto) ---
+# ==========================================
+
+@contextmanager
+def turno(trabajo):
+    """
+    Espera el turno justo y un cupo libre para `trabajo`; lanza Posponer si
+    todavía no le toca. Entrega una función para renovar el arriendo del cupo.
+    Las excepciones con falla_servicio = False no cuentan para el circuito.
+    """
+    if trabajo.fecha_creacion < timezone.now() - timedelta(seconds=settings.INFERENCIA_ESPERA_MAXIMA):
+        raise FilaAgotada('Hay demasiadas pruebas en espera, intenta de nuevo en unos minutos.')
+    if circuito_abierto():
+        raise Posponer(ESPERA_TURNO)
+    fila = fila_justa()
+    posicion = fila.index(trabajo.id) if trabajo.id in fila else len(fila)
+    if posicion >= cupos_libres():
+        raise Posponer(ESPERA_TURNO)
+    cupo_id = tomar_cupo(trabajo.id)
+    if cupo_id is None:
+        raise Posponer(ESPERA_TURNO)
+
+    ultima_renovacion = [time.monotonic()]
+
+    def renovar():
+        if time.monotonic() - ultima_renovacion[0] > ARRIENDO.total_seconds() / 3:
+            renovar_cupo(cupo_id, trabajo.id)
+            ultima_renovacion[0] = time.monotonic()
+
+    inicio = time.monotonic()
+    try:
+        yield renovar
+    except Exception as e:
+        if getattr(e, 'falla_servicio', True):
+            _registrar_fallo()
+        raise
+    else:
+        _registrar_exito(int((time.monotonic() - inicio) * 1000))
+    finally:
+        liberar_cupo(cupo_id, trabajo.id)
+
+
+def estadisticas():
+    c = contadores.leer(CLAVE_EJECUCIONES, CLAVE_FALLOS, CLAVE_LATENCIA_MS, CLAVE_LATENCIA_MAX_MS)
+    ejecuciones = c[CLAVE_EJECUCIONES]
+    circuito_db = _circuito()
+    if circuito_db.abierto_hasta is None:
+        circuito = 'cerrado'
+    else:
+        circuito = 'abierto' if timezone.now() < circuito_db.abierto_hasta else 'semiabierto'
+    return {
+        'en_cola': _en_fila().count(),
+        'procesando': TrabajoTryOn.objects.filter(estado='PROCESANDO').count(),
+        'concurrencia': settings.INFERENCIA_CONCURRENCIA,
+        'cupos_libres': cupos_libres(),
+        'circuito': circuito,
+        'fallos_seguidos': circuito_db.fallos_seguidos,
+        'ejecuciones': ejecuciones,
+        'fallos': c[CLAVE_FALLOS],
+        'latencia_promedio_ms': round(c[CLAVE_LATENCIA_MS] / ejecuciones) if ejecuciones else None,
+        'latencia_max_ms': c[CLAVE_LATENCIA_MAX_MS],
+    }
+
+
+# ==========================================
+# --- 6. CLIENTE FALSO (sin red, para desarrollo y pruebas) ---
+# ==========================================
+
+class _PrediccionFalsa:
+    """Imita replicate.Prediction: avanza PASOS_POR_RELOAD pasos por cada reload()."""
+    PASOS_POR_RELOAD = 10
+
+    def __init__(self, entrada):
+        self.entrada = entrada
+        self.pasos = entrada.get('steps', 30)
+        self.status = 'starting'
+        self.logs = ''
+        self.output = None
+        self.error = None
+        self.paso = 0
+
+    def reload(self):
+        if self.status in ('succeeded', 'failed', 'canceled'):
+            return
+        self.status = 'processing'
+        self.paso = min(self.paso + self.PASOS_POR_RELOAD, self.pasos)
+        porcentaje = self.paso * 100 // self.pasos
+        self.logs += f"{porcentaje:3d}%|{'#' * (porcentaje // 10)}| {self.paso}/{self.pasos}\n"
+        if self.paso >= self.pasos:
+            self.status = 'succeeded'
+            # Sin modelo real devolvemos la misma foto del cliente como "resultado"
+            self.output = [self.entrada['human_img']]
+
+    @property
+    def progress(self):
+        return Prediction.Progress.parse(self.logs) if self.logs else None
+
+    def cancel(self):
+        self.status = 'canceled'
+
+
+class _PrediccionesFalsas:
+    def create(self, version=None, input=None, **kwargs):
+        return _PrediccionFalsa(input or {})
+
+
+class ClienteReplicateFalso:
+    def __init__(self):
+        self.predictions = _PrediccionesFalsas()
@@ -0,0 +1,93 @@
+# core/inventario.py
+
+"""
+Motor de alertas de stock por velocidad de venta.
+
+En UNA consulta: cada variante con su venta de los últimos `ventana_dias`
+(subconsulta agrupada sobre ItemOrden, sin órdenes canceladas), la velocidad
+diaria y los días de cobertura (stock / velocidad). Las alertas son las
+variantes con stock que se están vendiendo y que tienen poco stock o poca
+cobertura, ordenadas de la más urgente a la menos.
+
+Lo usan dashboard_expansion, DashboardKPIView y el resumen por correo
+(python manage.py digest_stock, pensado para programarse a diario).
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage
+from django.db.models import (
+    Case, F, FloatField, IntegerField, OuterRef, Q, Subquery, Sum, Value, When,
+)
+from django.db.models.functions import Cast, Coalesce
+from django.utils import timezone
+
+from .correo import enviar_uno
+from .models import ItemOrden, Variante
+
+VENTANA_DIAS = 30
+STOCK_CRITICO = 5
+COBERTURA_MINIMA = 14  # días
+
+
+def variantes_con_velocidad(ventana_dias=VENTANA_DIAS):
+    """Variantes anotadas con vendidas, velocidad (unid./día) y dias_cobertura (None si no se venden)."""
+    desde = timezone.now() - timedelta(days=ventana_dias)
+    vendidas = ItemOrden.objects.filter(variante=OuterRef('pk'), orden__fecha_creacion__gte=desde) \
+        .exclude(orden__estado='CANCELADO') \
+        .order_by().values('variante').annotate(total=Sum('cantidad')).values('total')
+
+    return Variante.objects.select_related('producto').annotate(
+        vendidas=Coalesce(Subquery(vendidas, output_field=IntegerField()), Value(0)),
+    ).annotate(
+        velocidad=Cast(F('vendidas'), FloatField()) / ventana_dias,
+        dias_cobertura=Case(
+            When(vendidas__gt=0, then=Cast(F('stock'), FloatField()) * ventana_dias / F('vendidas')),
+            default=None, output_field=FloatField(),
+        ),
+    )
+
+
+def alertas_stock(ventana_dias=VENTANA_DIAS, stock_critico=STOCK_CRITICO, cobertura_minima=COBERTURA_MINIMA, limite=None):
+    """Variantes en riesgo de quiebre, de menor a mayor cobertura."""
+    alertas = variantes_con_velocidad(ventana_dias).filter(
+        Q(stock__lte=stock_critico) | Q(dias_cobertura__lt=cobertura_minima),
+        stock__gt=0, vendidas__gt=0,
+    ).order_by('dias_cobertura', 'stock', 'id')
+    return list(alertas[:limite] if limite else alertas)
+
+
+def resumen_alerta(v):
+    """Versión serializable (API / correo) de una variante anotada."""
+    return {
+        'variante_id': v.id,
+        'producto_id': v.producto_id,
+        'producto': v.producto.nombre,
+        'talla': v.talla,
+        'color': v.color,
+        'stock': v.stock,
+        'vendidas': v.vendidas,
+        'velocidad_diaria': round(v.velocidad, 2),
+        'dias_cobertura': round(v.dias_cobertura, 1),
+    }
+
+
+def enviar_digest_stock(destinatarios, limite=50):
+    """Envía el resumen de alertas por correo. Devuelve la cantidad de alertas (0 = no se envía nada)."""
+    alertas = alertas_stock(limite=limite)
+    if not alertas:
+        return 0
+    lineas = [
+        f"- {a.producto.nombre} ({a.talla}/{a.color}): quedan {a.stock}, "
+        f"se venden {a.velocidad:.1f}/día, ~{a.dias_cobertura:.0f} días de cobertura"
+        for a in alertas
+    ]
+    cuerpo = (
+        f"Variantes en riesgo de quiebre de stock (ventas de los últimos {VENTANA_DIAS} días):\n\n"
+        + "\n".join(lineas)
+    )
+    enviar_uno(EmailMessage(
+        f"ModaOne | {len(alertas)} alertas de stock", cuerpo, settings.EMAIL_HOST_USER, destinatarios
+    ))
+    return len(alertas)
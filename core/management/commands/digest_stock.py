@@ -0,0 +1,28 @@
+# core/management/commands/digest_stock.py
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.inventario import enviar_digest_stock
+
+
+class Command(BaseCommand):
+    help = (
+        'Envía por correo el resumen de alertas de stock (velocidad de venta y días de cobertura). '
+        'Pensado para programarse una vez al día (cron / Render Cron Job).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--para', nargs='+', default=None,
+            help='Destinatarios (por defecto settings.STOCK_DIGEST_DESTINATARIOS o EMAIL_HOST_USER)',
+        )
+        parser.add_argument('--limite', type=int, default=50)
+
+    def handle(self, *args, **options):
+        destinatarios = options['para'] or getattr(settings, 'STOCK_DIGEST_DESTINATARIOS', None) or [settings.EMAIL_HOST_USER]
+        enviadas = enviar_digest_stock(destinatarios, limite=options['limite'])
+        if enviadas:
+            self.stdout.write(self.style.SUCCESS(f'Resumen enviado a {", ".join(destinatarios)}: {enviadas} alertas.'))
+        else:
+            self.stdout.write('Sin alertas de stock: no se envió correo.')
@@ -0,0 +1,39 @@
+# core/management/commands/procesar_tareas.py
+
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core import correo, tareas
+
+
+class Command(BaseCommand):
+    help = 'Worker de la cola de tareas (boletas PDF, correos). Correr como proceso aparte de gunicorn.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=10, help='Tareas tomadas por vuelta')
+        parser.add_argument('--intervalo', type=float, default=2.0, help='Segundos de espera cuando la cola está vacía')
+        parser.add_argument('--tipo', action='append', dest='tipos', help='Procesar solo estos tipos (repetible)')
+        parser.add_argument('--una-vez', action='store_true', help='Procesar lo pendiente y salir')
+
+    def handle(self, *args, **opts):
+        self.detener = False
+        signal.signal(signal.SIGTERM, self._detener)
+        signal.signal(signal.SIGINT, self._detener)
+
+        self.stdout.write(f"Worker de tareas iniciado (lote={opts['lote']}).")
+        while not self.detener:
+            close_old_connections()
+            procesadas = tareas.procesar_pendientes(opts['lote'], opts['tipos'])
+            if opts['una_vez'] and not procesadas:
+                break
+            if not procesadas:
+                time.sleep(opts['intervalo'])
+        correo.cerrar()
+        self.stdout.write('Worker de tareas detenido.')
+
+    def _detener(self, signum, frame):
+        # Termina la tarea en curso y sale en la próxima vuelta
+        self.detener = True
@@ -0,0 +1,16 @@
+# core/management/commands/purgar_cache_tryon.py
+
+from django.core.management.base import BaseCommand
+
+from core.cache_tryon import purgar
+
+
+class Command(BaseCommand):
+    help = (
+        'Borra del caché del probador los resultados vencidos (TRYON_CACHE_DIAS) y los menos usados '
+        'sobre TRYON_CACHE_MAX. Pensado para programarse una vez al día (cron / Render Cron Job).'
+    )
+
+    def handle(self, *args, **options):
+        borrados = purgar()
+        self.stdout.write(self.style.SUCCESS(f'{borrados} resultados borrados del caché de try-on.'))
@@ -0,0 +1,26 @@
+# core/management/commands/reconstruir_rollups.py
+
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import rollups
+
+
+class Command(BaseCommand):
+    help = 'Recalcula los rollups diarios de ventas (VentaDiariaEstado / VentaDiariaProducto) desde las órdenes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help='Solo desde esta fecha (AAAA-MM-DD); por defecto todo el historial')
+
+    def handle(self, *args, **options):
+        desde = None
+        if options['desde']:
+            try:
+                desde = date.fromisoformat(options['desde'])
+            except ValueError:
+                raise CommandError('--desde debe tener formato AAAA-MM-DD')
+        filas_estado, filas_producto = rollups.reconstruir(desde)
+        self.stdout.write(self.style.SUCCESS(
+            f'Rollups reconstruidos: {filas_estado} filas por estado, {filas_producto} por producto.'
+        ))
@@ -0,0 +1,25 @@
+# core/management/commands/refrescar_segmentos.py
+
+from django.core.management.base import BaseCommand
+
+from core import segmentacion
+
+
+class Command(BaseCommand):
+    help = (
+        'Refresca el snapshot de segmentación de clientes (SegmentoCliente). '
+        'Sin opciones aplica el pase diario de inactividad (programarlo una vez al día); '
+        'con --completo reconstruye la tabla entera.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--completo', action='store_true', help='Recalcula todos los clientes')
+        parser.add_argument('--lote', type=int, default=1000, help='Clientes por lote en --completo')
+
+    def handle(self, *args, **options):
+        if options['completo']:
+            total = segmentacion.reconstruir_segmentos(lote=options['lote'])
+            self.stdout.write(self.style.SUCCESS(f'Snapshot reconstruido: {total} clientes.'))
+        else:
+            total = segmentacion.refrescar_inactividad()
+            self.stdout.write(self.style.SUCCESS(f'Pase de inactividad: {total} clientes recalculados.'))
@@ -0,0 +1,16 @@
+# core/management/commands/reindexar_busqueda.py
+
+from django.core.management.base import BaseCommand
+
+from core import busqueda
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el índice de búsqueda del catálogo desde cero.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=500, help='Productos por bulk_create')
+
+    def handle(self, *args, **options):
+        total = busqueda.reindexar_todo(lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(f'Índice reconstruido: {total} productos.'))
@@ -0,0 +1,58 @@
+# core/management/commands/stress_numeracion.py
+
+import multiprocessing
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from core.models import SecuenciaNumeracion
+from core.numeracion import AsignadorNumeros, formatear_numero_orden
+
+# Secuencia aparte para no consumir números de orden reales
+SECUENCIA_STRESS = 'stress_orden'
+
+
+def _generar(args):
+    """Corre en un proceso hijo: simula un worker de gunicorn pidiendo números."""
+    cantidad, bloque = args
+    connections.close_all()  # El hijo abre su propia conexión
+    asignador = AsignadorNumeros(SECUENCIA_STRESS, bloque=bloque)
+    numeros = [formatear_numero_orden(asignador.siguiente()) for _ in range(cantidad)]
+    connections.close_all()
+    return numeros
+
+
+class Command(BaseCommand):
+    help = (
+        'Prueba de estrés multiproceso de core/numeracion.py: varios procesos piden '
+        'números de orden en paralelo y se verifica que no haya repetidos.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--procesos', type=int, default=8)
+        parser.add_argument('--cantidad', type=int, default=2000, help='Números por proceso')
+        parser.add_argument('--bloque', type=int, default=100)
+
+    def handle(self, *args, **opts):
+        connections.close_all()  # No heredar la conexión del padre en el fork
+        contexto = multiprocessing.get_context('fork')
+        inicio = time.perf_counter()
+        try:
+            with contexto.Pool(opts['procesos']) as pool:
+                resultados = pool.map(_generar, [(opts['cantidad'], opts['bloque'])] * opts['procesos'])
+        finally:
+            SecuenciaNumeracion.objects.filter(nombre=SECUENCIA_STRESS).delete()
+        duracion = time.perf_counter() - inicio
+
+        todos = [n for lote in resultados for n in lote]
+        unicos = set(todos)
+        self.stdout.write(
+            f"{len(todos)} números en {duracion:.2f}s ({len(todos) / duracion:,.0f}/s), "
+            f"{len(unicos)} únicos, {len(todos) // opts['bloque']} reservas de bloque."
+        )
+        if len(unicos) != len(todos):
+            raise CommandError(f"Se repitieron {len(todos) - len(unicos)} números de orden.")
+        if any(len(n) > 20 for n in unicos):
+            raise CommandError("Hay números que no caben en Orden.numero_orden (max_length=20).")
+        self.stdout.write(self.style.SUCCESS('OK: sin colisiones.'))
@@ -0,0 +1,80 @@
+# core/management/commands/stress_stock.py
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction, OperationalError
+
+from core.models import Producto, Variante
+from core.stock import reservar_stock, liberar_stock, StockInsuficiente
+
+
+class Command(BaseCommand):
+    help = (
+        'Arnés de concurrencia para core/stock.py: lanza N checkouts en paralelo '
+        'contra las mismas variantes y verifica que el stock nunca quede negativo '
+        'ni se pierdan actualizaciones. Usar contra MySQL (SQLite serializa las escrituras).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--checkouts', type=int, default=48, help='Checkouts concurrentes')
+        parser.add_argument('--stock', type=int, default=30, help='Stock inicial de cada variante')
+        parser.add_argument('--variantes', type=int, default=3, help='Variantes compartidas por los checkouts')
+        parser.add_argument('--unidades', type=int, default=2, help='Unidades por línea')
+
+    def handle(self, *args, **opts):
+        producto = Producto.objects.create(
+            nombre='[stress] producto temporal', precio=1, descripcion='stress_stock', activo=False,
+            categoria='accesorios', marca='guess',
+        )
+        variantes = [
+            Variante.objects.create(producto=producto, talla=f'T{i}', color='stress', stock=opts['stock'])
+            for i in range(opts['variantes'])
+        ]
+        ids = [v.id for v in variantes]
+        barrera = threading.Barrier(opts['checkouts'])
+        resultados = {'ok': 0, 'sin_stock': 0, 'error': 0}
+        lock = threading.Lock()
+
+        def checkout(n):
+            # Cada hilo toma las variantes en distinto orden: el servicio debe ordenar los locks
+            lineas = [(vid, opts['unidades']) for vid in (ids if n % 2 else reversed(ids))]
+            barrera.wait()
+            try:
+                with transaction.atomic():
+                    reservar_stock(lineas)
+                estado = 'ok'
+            except StockInsuficiente:
+                estado = 'sin_stock'
+            except OperationalError:
+                estado = 'error'
+            finally:
+                connection.close()
+            with lock:
+                resultados[estado] += 1
+
+        try:
+            with ThreadPoolExecutor(max_workers=opts['checkouts']) as pool:
+                list(pool.map(checkout, range(opts['checkouts'])))
+
+            finales = list(Variante.objects.filter(id__in=ids).values_list('stock', flat=True))
+            esperado = opts['stock'] - resultados['ok'] * opts['unidades']
+            self.stdout.write(f"Resultados: {resultados} | stock final: {finales} | esperado: {esperado}")
+
+            if any(s < 0 for s in finales):
+                raise CommandError('El stock quedó negativo.')
+            if any(s != esperado for s in finales):
+                raise CommandError('Se perdieron actualizaciones: el stock no cuadra con las reservas exitosas.')
+            if resultados['ok'] != min(opts['checkouts'], opts['stock'] // opts['unidades']) and not resultados['error']:
+                raise CommandError('Hubo checkouts rechazados con stock disponible.')
+
+            # La liberación usa el mismo servicio
+            with transaction.atomic():
+                liberar_stock((vid, resultados['ok'] * opts['unidades']) for vid in ids)
+            if set(Variante.objects.filter(id__in=ids).values_list('stock', flat=True)) != {opts['stock']}:
+                raise CommandError('liberar_stock no restauró el stock inicial.')
+
+            self.stdout.write(self.style.SUCCESS('OK: sin stock negativo, sin actualizaciones perdidas.'))
+        finally:
+            producto.delete()
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.9 on 2026-10-17 20:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def crear_indice_fulltext(apps, schema_editor):
+    """Índice específico del motor: FULLTEXT en MySQL, tabla FTS5 en SQLite."""
+    vendor = schema_editor.connection.vendor
+    if vendor == 'mysql':
+        schema_editor.execute(
+            "ALTER TABLE core_documentobusqueda ADD FULLTEXT INDEX core_docbusq_ft (contenido)"
+        )
+    elif vendor == 'sqlite':
+        try:
+            schema_editor.execute(
+                "CREATE VIRTUAL TABLE core_documentobusqueda_fts USING fts5(contenido)"
+            )
+        except Exception:
+            pass  # SQLite compilado sin FTS5: se usa el backend 'documentos'
+
+
+def eliminar_indice_fulltext(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS core_documentobusqueda_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_producto_categoria_producto_marca_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentoBusqueda',
+            fields=[
+                ('producto', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='documento_busqueda', serialize=False, to='core.producto')),
+                ('contenido', models.TextField()),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(crear_indice_fulltext, eliminar_indice_fulltext),
+    ]
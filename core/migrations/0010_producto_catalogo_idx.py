@@ -0,0 +1,17 @@
+# Generated by Django 5.2.9 on 2026-10-17 20:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_documentobusqueda'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['activo', 'fecha_creacion', 'id'], name='producto_catalogo_idx'),
+        ),
+    ]
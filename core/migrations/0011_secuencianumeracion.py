@@ -0,0 +1,20 @@
+# Generated by Django 5.2.9 on 2026-10-17 20:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_producto_catalogo_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SecuenciaNumeracion',
+            fields=[
+                ('nombre', models.CharField(max_length=30, primary_key=True, serialize=False)),
+                ('siguiente', models.BigIntegerField(default=1)),
+            ],
+        ),
+    ]
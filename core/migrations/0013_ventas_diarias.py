@@ -0,0 +1,43 @@
+# Generated by Django 5.2.9 on 2026-10-17 20:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_tarea'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VentaDiariaEstado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('estado', models.CharField(choices=[('PENDIENTE', 'Pendiente de Pago'), ('CONFIRMADO', 'Confirmado / En Preparación'), ('PICKING', 'Picking de Productos'), ('EMBALAJE', 'En Embalaje'), ('DESPACHO', 'Despachado al Courier'), ('ENTREGADO', 'Entregado al Cliente'), ('CANCELADO', 'Cancelado')], max_length=20)),
+                ('ordenes', models.IntegerField(default=0)),
+                ('monto', models.DecimalField(decimal_places=0, default=0, max_digits=14)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'estado'), name='venta_diaria_estado_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='VentaDiariaProducto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('estado', models.CharField(choices=[('PENDIENTE', 'Pendiente de Pago'), ('CONFIRMADO', 'Confirmado / En Preparación'), ('PICKING', 'Picking de Productos'), ('EMBALAJE', 'En Embalaje'), ('DESPACHO', 'Despachado al Courier'), ('ENTREGADO', 'Entregado al Cliente'), ('CANCELADO', 'Cancelado')], max_length=20)),
+                ('nombre_producto', models.CharField(max_length=255)),
+                ('unidades', models.IntegerField(default=0)),
+                ('lineas', models.IntegerField(default=0)),
+                ('monto', models.DecimalField(decimal_places=0, default=0, max_digits=14)),
+                ('producto', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='core.producto')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'estado', 'nombre_producto'), name='venta_diaria_producto_uniq')],
+            },
+        ),
+    ]
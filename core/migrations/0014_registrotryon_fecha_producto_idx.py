@@ -0,0 +1,19 @@
+# Generated by Django 5.2.9 on 2026-10-17 20:26
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_ventas_diarias'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='registrotryon',
+            index=models.Index(fields=['fecha', 'producto'], name='tryon_fecha_producto_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.9 on 2026-10-17 20:28
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('core', '0014_registrotryon_fecha_producto_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SegmentoCliente',
+            fields=[
+                ('usuario', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='segmento_cliente', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('segmento', models.CharField(choices=[('vip', 'VIP'), ('curioso', 'Curioso (IA)'), ('inactivo', 'Inactivo'), ('cliente', 'Cliente'), ('nuevo', 'Nuevo')], max_length=20)),
+                ('total_gastado', models.DecimalField(decimal_places=0, default=0, max_digits=14)),
+                ('total_ordenes', models.IntegerField(default=0)),
+                ('veces_ia', models.IntegerField(default=0)),
+                ('ultima_orden', models.DateTimeField(blank=True, null=True)),
+                ('telefono', models.CharField(blank=True, max_length=15, null=True)),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['segmento', '-total_gastado'], name='segmento_gasto_idx'), models.Index(fields=['segmento', 'ultima_orden'], name='segmento_ultima_orden_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.9 on 2026-10-17 20:30
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import ExtractMonth
+
+
+def completar_mes(apps, schema_editor):
+    for nombre in ('VentaDiariaEstado', 'VentaDiariaProducto'):
+        apps.get_model('core', nombre).objects.update(mes=ExtractMonth('fecha'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_segmentocliente'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ventadiariaestado',
+            name='mes',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='ventadiariaproducto',
+            name='mes',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='orden',
+            index=models.Index(fields=['estado', 'fecha_creacion'], name='orden_estado_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ventadiariaestado',
+            index=models.Index(fields=['estado', 'fecha'], name='venta_estado_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ventadiariaestado',
+            index=models.Index(fields=['estado', 'mes'], name='venta_estado_mes_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ventadiariaproducto',
+            index=models.Index(fields=['estado', 'fecha'], name='venta_prod_estado_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ventadiariaproducto',
+            index=models.Index(fields=['estado', 'mes'], name='venta_prod_estado_mes_idx'),
+        ),
+        migrations.RunPython(completar_mes, migrations.RunPython.noop),
+    ]
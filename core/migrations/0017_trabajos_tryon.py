@@ -0,0 +1,34 @@
+# Generated by Django 5.2.9 on 2026-10-17 20:39
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_reportes_indices'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrabajoTryOn',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('categoria', models.CharField(default='upper_body', max_length=20)),
+                ('imagen_prenda', models.URLField(max_length=500)),
+                ('imagen_usuario', models.TextField(blank=True)),
+                ('estado', models.CharField(choices=[('EN_COLA', 'En cola'), ('PROCESANDO', 'Procesando'), ('COMPLETADO', 'Completado'), ('FALLIDO', 'Fallido')], default='EN_COLA', max_length=20)),
+                ('progreso', models.PositiveSmallIntegerField(default=0)),
+                ('imagen_resultado', models.URLField(blank=True, max_length=1000)),
+                ('error', models.TextField(blank=True)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+                ('producto', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='core.producto')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
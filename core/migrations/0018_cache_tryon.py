@@ -0,0 +1,34 @@
+# Generated by Django 5.2.9 on 2026-10-17 20:41
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_trabajos_tryon'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trabajotryon',
+            name='clave',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.CreateModel(
+            name='ResultadoTryOn',
+            fields=[
+                ('clave', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('estado', models.CharField(choices=[('PENDIENTE', 'Generándose'), ('LISTO', 'Listo')], default='PENDIENTE', max_length=20)),
+                ('archivo', models.CharField(blank=True, max_length=255)),
+                ('tamano', models.PositiveIntegerField(default=0)),
+                ('usos', models.PositiveIntegerField(default=0)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('ultimo_uso', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['ultimo_uso'], name='resultado_tryon_lru_idx')],
+            },
+        ),
+    ]
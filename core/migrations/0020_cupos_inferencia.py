@@ -0,0 +1,21 @@
+# Generated by Django 5.2.9 on 2026-10-17 20:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_eventos_en_lote'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CupoInferencia',
+            fields=[
+                ('id', models.PositiveSmallIntegerField(primary_key=True, serialize=False)),
+                ('dueno', models.CharField(blank=True, max_length=64)),
+                ('ocupado_hasta', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.9 on 2026-10-17 20:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_cupos_inferencia'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContadorServicio',
+            fields=[
+                ('nombre', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('valor', models.BigIntegerField(default=0)),
+            ],
+        ),
+    ]
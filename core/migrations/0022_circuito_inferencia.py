@@ -0,0 +1,28 @@
+# Generated by Django 5.2.9 on 2026-10-17 20:56
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_contadores_servicio'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CircuitoInferencia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fallos_seguidos', models.PositiveIntegerField(default=0)),
+                ('abierto_hasta', models.DateTimeField(blank=True, null=True)),
+                ('prueba_hasta', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='trabajotryon',
+            index=models.Index(fields=['estado', 'fecha_creacion'], name='tryon_fila_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.9 on 2026-10-17 20:58
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0022_circuito_inferencia'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='orden',
+            index=models.Index(fields=['fecha_creacion', 'id'], name='orden_fecha_id_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.9 on 2026-10-17 21:15
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fusionar_por_producto(apps, schema_editor):
+    """Las filas de un producto renombrado (antes separadas por nombre) se suman en una."""
+    VentaDiariaProducto = apps.get_model('core', 'VentaDiariaProducto')
+    repetidas = VentaDiariaProducto.objects.filter(producto__isnull=False) \
+        .values('fecha', 'estado', 'producto_id') \
+        .annotate(filas=Count('id')) \
+        .filter(filas__gt=1)
+    for clave in repetidas:
+        primera, *resto = VentaDiariaProducto.objects.filter(
+            fecha=clave['fecha'], estado=clave['estado'], producto_id=clave['producto_id']
+        ).order_by('id')
+        for fila in resto:
+            primera.unidades += fila.unidades
+            primera.lineas += fila.lineas
+            primera.monto += fila.monto
+        primera.save(update_fields=['unidades', 'lineas', 'monto'])
+        VentaDiariaProducto.objects.filter(id__in=[f.id for f in resto]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0023_orden_fecha_id_idx'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='ventadiariaproducto',
+            name='venta_diaria_producto_uniq',
+        ),
+        migrations.RunPython(fusionar_por_producto, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ventadiariaproducto',
+            constraint=models.UniqueConstraint(fields=('fecha', 'estado', 'producto'), name='venta_diaria_producto_uniq'),
+        ),
+    ]
@@ -1,6 +1,8 @@
+import uuid
+
 from django.db import models
 from django.contrib.auth.models import User
-import time # <--- USAMOS ESTO EN VEZ DE TIMEZONE PARA QUE NO FALLE NUNCA
+from django.utils import timezone
 
 CATEGORIAS = (
     ('hombre', 'Hombres'),
@@ -36,6 +38,12 @@ class Producto(models.Model):
     activo = models.BooleanField(default=True) 
     fecha_creacion = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        indexes = [
+            # Paginación keyset del catálogo: activo + (fecha_creacion, id)
+            models.Index(fields=['activo', 'fecha_creacion', 'id'], name='producto_catalogo_idx'),
+        ]
+
     def __str__(self):
         return f"{self.nombre} - {self.get_marca_display()}" # Muestra marca en el admin
 
@@ -112,10 +120,19 @@ class Orden(models.Model):
     direccion_envio = models.TextField()
     fecha_creacion = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Reportes por estado y rango de fechas (dashboard, BI, ventanas de venta)
+            models.Index(fields=['estado', 'fecha_creacion'], name='orden_estado_fecha_idx'),
+            # Consola de órdenes sin filtros: keyset (-fecha_creacion, -id) leído por índice
+            models.Index(fields=['fecha_creacion', 'id'], name='orden_fecha_id_idx'),
+        ]
+
     def save(self, *args, **kwargs):
-        # Si no tiene número, lo creamos usando time.time() que es infalible
+        # Si no tiene número, lo asignamos desde la secuencia por bloques (sin colisiones)
         if not self.numero_orden:
-            self.numero_orden = 'MODA' + str(int(time.time()))
+            from .numeracion import siguiente_numero_orden
+            self.numero_orden = siguiente_numero_orden()
         super().save(*args, **kwargs)
 
 # 7. ItemOrden
@@ -131,7 +148,252 @@ class ItemOrden(models.Model):
 class RegistroTryOn(models.Model):
     producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='probador_logs')
     usuario = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
-    fecha = models.DateTimeField(auto_now_add=True)
+    # Hora del evento (no de la inserción): se guardan en lotes, ver core/eventos.py
+    fecha = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # Conversión por rango de fechas (core/conversion.py): rango + agrupación por producto
+            models.Index(fields=['fecha', 'producto'], name='tryon_fecha_producto_idx'),
+        ]
+
+    def __str__(self):
+        return f"Prueba de {self.producto.nombre} - {self.fecha}"
+
+# 9. Documento de Búsqueda (texto normalizado que alimenta el índice full-text)
+class DocumentoBusqueda(models.Model):
+    producto = models.OneToOneField(Producto, on_delete=models.CASCADE, primary_key=True, related_name='documento_busqueda')
+    contenido = models.TextField()
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Índice de {self.producto_id}"
+
+
+# 10. Secuencias de Numeración (se reservan en bloques, ver core/numeracion.py)
+class SecuenciaNumeracion(models.Model):
+    nombre = models.CharField(max_length=30, primary_key=True)
+    siguiente = models.BigIntegerField(default=1)
+
+    def __str__(self):
+        return f"{self.nombre}: {self.siguiente}"
+
+
+# 11. Cola de Tareas en segundo plano (ver core/tareas.py)
+ESTADOS_TAREA = (
+    ('PENDIENTE', 'Pendiente'),
+    ('EN_CURSO', 'En curso'),
+    ('COMPLETADA', 'Completada'),
+    ('FALLIDA', 'Fallida'),
+)
+
+class Tarea(models.Model):
+    tipo = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict)
+    # Evita encolar dos veces el mismo trabajo (p. ej. 'boleta:15')
+    clave = models.CharField(max_length=100, unique=True, null=True, blank=True)
+
+    estado = models.CharField(max_length=20, choices=ESTADOS_TAREA, default='PENDIENTE')
+    intentos = models.PositiveIntegerField(default=0)
+    max_intentos = models.PositiveIntegerField(default=5)
+    ejecutar_despues = models.DateTimeField()
+    bloqueada_hasta = models.DateTimeField(null=True, blank=True)
+    ultimo_error = models.TextField(blank=True)
+
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['estado', 'ejecutar_despues'], name='tarea_cola_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.tipo} #{self.id} ({self.estado})"
+
+
+# 12. Rollups diarios de ventas (se mantienen incrementalmente, ver core/rollups.py)
+class VentaDiariaEstado(models.Model):
+    fecha = models.DateField()
+    mes = models.PositiveSmallIntegerField(default=0)  # fecha.month, guardado para estacionalidad indexable
+    estado = models.CharField(max_length=20, choices=ESTADOS_PEDIDO)
+    ordenes = models.IntegerField(default=0)
+    monto = models.DecimalField(max_digits=14, decimal_places=0, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['fecha', 'estado'], name='venta_diaria_estado_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['estado', 'fecha'], name='venta_estado_fecha_idx'),
+            models.Index(fields=['estado', 'mes'], name='venta_estado_mes_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha} {self.estado}: {self.ordenes} órdenes"
+
+
+class VentaDiariaProducto(models.Model):
+    fecha = models.DateField()
+    mes = models.PositiveSmallIntegerField(default=0)  # fecha.month
+    estado = models.CharField(max_length=20, choices=ESTADOS_PEDIDO)
+    # La fila es por producto; el nombre es solo un snapshot para mostrar (y para
+    # distinguir las líneas cuyo producto ya no existe, con producto NULL)
+    nombre_producto = models.CharField(max_length=255)
+    producto = models.ForeignKey(Producto, on_delete=models.SET_NULL, null=True, blank=True)
+    unidades = models.IntegerField(default=0)
+    lineas = models.IntegerField(default=0)
+    monto = models.DecimalField(max_digits=14, decimal_places=0, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['fecha', 'estado', 'producto'], name='venta_diaria_producto_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['estado', 'fecha'], name='venta_prod_estado_fecha_idx'),
+            models.Index(fields=['estado', 'mes'], name='venta_prod_estado_mes_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha} {self.estado} {self.nombre_producto}: {self.unidades} u."
+
+
+# 13. Snapshot de segmentación de clientes (se refresca incrementalmente, ver core/segmentacion.py)
+SEGMENTOS_CLIENTE = (
+    ('vip', 'VIP'),
+    ('curioso', 'Curioso (IA)'),
+    ('inactivo', 'Inactivo'),
+    ('cliente', 'Cliente'),
+    ('nuevo', 'Nuevo'),
+)
+
+class SegmentoCliente(models.Model):
+    usuario = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='segmento_cliente')
+    segmento = models.CharField(max_length=20, choices=SEGMENTOS_CLIENTE)
+    total_gastado = models.DecimalField(max_digits=14, decimal_places=0, default=0)
+    total_ordenes = models.IntegerField(default=0)
+    veces_ia = models.IntegerField(default=0)
+    ultima_orden = models.DateTimeField(null=True, blank=True)
+    telefono = models.CharField(max_length=15, blank=True, null=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Miembros de un segmento ordenados por gasto: lectura por índice
+            models.Index(fields=['segmento', '-total_gastado'], name='segmento_gasto_idx'),
+            # Pase diario de inactividad
+            models.Index(fields=['segmento', 'ultima_orden'], name='segmento_ultima_orden_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.usuario} ({self.segmento})"
+
+
+# 14. Trabajos del probador virtual (se procesan en el worker, ver core/tryon.py)
+ESTADOS_TRYON = (
+    ('EN_COLA', 'En cola'),
+    ('PROCESANDO', 'Procesando'),
+    ('COMPLETADO', 'Completado'),
+    ('FALLIDO', 'Fallido'),
+)
+
+class TrabajoTryOn(models.Model):
+    # UUID: el id viaja al navegador y no debe poder adivinarse
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    usuario = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    producto = models.ForeignKey(Producto, on_delete=models.SET_NULL, null=True, blank=True)
+    categoria = models.CharField(max_length=20, default='upper_body')
+    imagen_prenda = models.URLField(max_length=500)
+    # Clave de ResultadoTryOn: los trabajos idénticos en curso comparten una sola ejecución
+    clave = models.CharField(max_length=64, blank=True, db_index=True)
+    # Foto del cliente (data URL) solo mientras el trabajo está pendiente
+    imagen_usuario = models.TextField(blank=True)
+
+    estado = models.CharField(max_length=20, choices=ESTADOS_TRYON, default='EN_COLA')
+    progreso = models.PositiveSmallIntegerField(default=0)  # 0-100
+    imagen_resultado = models.URLField(max_length=1000, blank=True)
+    error = models.TextField(blank=True)
+
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Fila justa de core/inferencia.py: trabajos EN_COLA por llegada
+            models.Index(fields=['estado', 'fecha_creacion'], name='tryon_fila_idx'),
+        ]
+
+    def __str__(self):
+        return f"Try-on {self.id} ({self.estado})"
+
+
+# 15. Caché de resultados del probador, direccionada por contenido (ver core/cache_tryon.py)
+ESTADOS_RESULTADO_TRYON = (
+    ('PENDIENTE', 'Generándose'),
+    ('LISTO', 'Listo'),
+)
+
+class ResultadoTryOn(models.Model):
+    # SHA-256 de (foto, prenda, categoría, versión del modelo)
+    clave = models.CharField(max_length=64, primary_key=True)
+    estado = models.CharField(max_length=20, choices=ESTADOS_RESULTADO_TRYON, default='PENDIENTE')
+    archivo = models.CharField(max_length=255, blank=True)
+    tamano = models.PositiveIntegerField(default=0)
+    usos = models.PositiveIntegerField(default=0)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    # Último acierto (o inicio de la generación si está PENDIENTE): base del TTL y del LRU
+    ultimo_uso = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['ultimo_uso'], name='resultado_tryon_lru_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.clave[:12]} ({self.estado})"
+
+
+# 16. Vistas de producto (eventos del navegador, se guardan en lotes, ver core/eventos.py)
+class VistaProducto(models.Model):
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='vistas')
+    usuario = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    fecha = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['fecha', 'producto'], name='vista_fecha_producto_idx'),
+        ]
+
+    def __str__(self):
+        return f"Vista de {self.producto_id} - {self.fecha}"
+
+
+# 17. Cupos de inferencia compartidos entre workers (semáforo con arriendo, ver core/inferencia.py)
+class CupoInferencia(models.Model):
+    id = models.PositiveSmallIntegerField(primary_key=True)
+    dueno = models.CharField(max_length=64, blank=True)
+    # Si el worker muere el cupo se libera solo al vencer el arriendo
+    ocupado_hasta = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Cupo {self.id} ({self.dueno or 'libre'})"
+
+
+# 19. Estado del circuit breaker de inferencia (una sola fila, compartida por todos los workers)
+class CircuitoInferencia(models.Model):
+    fallos_seguidos = models.PositiveIntegerField(default=0)
+    abierto_hasta = models.DateTimeField(null=True, blank=True)
+    # Semiabierto: el worker que reserva la llamada de prueba la tiene hasta esta hora
+    prueba_hasta = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Circuito de inferencia ({self.fallos_seguidos} fallos seguidos)"
+
+
+# 18. Contadores de servicios (correo, inferencia): los suman los workers y los lee el panel, ver core/contadores.py
+class ContadorServicio(models.Model):
+    nombre = models.CharField(max_length=50, primary_key=True)
+    valor = models.BigIntegerField(default=0)
 
     def __str__(self):
-        return f"Prueba de {self.producto.nombre} - {self.fecha}"
\ No newline at end of file
+        return f"{self.nombre}: {self.valor}"
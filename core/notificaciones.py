@@ -0,0 +1,114 @@
+# core/notificaciones.py
+
+"""
+Handlers de la cola de tareas (core/tareas.py) para boletas y correos.
+Se ejecutan en el worker (python manage.py procesar_tareas), fuera del request.
+"""
+
+import hashlib
+
+from django.conf import settings
+from django.core.mail import EmailMessage
+
+from .models import Orden
+from .tareas import tarea, encolar
+from .boletas import contenido_boleta
+from .correo import enviar, enviar_uno
+
+# Estados que generan correo al cliente
+ESTADOS_NOTIFICADOS = ('CONFIRMADO', 'DESPACHO', 'ENTREGADO')
+# Correos por tarea en los cambios masivos (todos viajan por la misma conexión SMTP)
+CORREOS_POR_LOTE = 50
+
+
+def encolar_boleta(orden):
+    """Boleta PDF + correo de compra exitosa (una sola vez por orden)."""
+    if orden.email:
+        encolar('enviar_boleta', {'orden_id': orden.id}, clave=f'boleta:{orden.id}')
+
+
+def encolar_notificacion_estado(orden):
+    """Correo de cambio de estado (no se duplica mientras el anterior siga pendiente)."""
+    if orden.email and orden.estado in ESTADOS_NOTIFICADOS:
+        encolar(
+            'notificar_estado',
+            {'orden_id': orden.id, 'estado': orden.estado},
+            clave=f'estado:{orden.id}:{orden.estado}',
+            solo_pendiente=True,
+        )
+
+
+def encolar_notificaciones_lote(ordenes):
+    """Correos de cambio de estado de muchas órdenes, en tareas de hasta CORREOS_POR_LOTE."""
+    pares = sorted((o.id, o.estado) for o in ordenes if o.email and o.estado in ESTADOS_NOTIFICADOS)
+    for i in range(0, len(pares), CORREOS_POR_LOTE):
+        lote = pares[i:i + CORREOS_POR_LOTE]
+        huella = hashlib.sha1(repr(lote).encode()).hexdigest()
+        encolar('notificar_estados_lote', {'pares': [list(p) for p in lote]}, clave=f'estados:{huella}', solo_pendiente=True)
+
+
+def mensaje_estado(orden, estado):
+    """Texto del correo para cada estado (vacío si el estado no se notifica)."""
+    nombre = orden.usuario.first_name if orden.usuario else ''
+
+    # Detectar tipo de envío (Flash vs Courier)
+    es_courier = int(orden.costo_envio) == 5990
+
+    if estado == 'CONFIRMADO':
+        return f"Hola {nombre}, tu pago está confirmado. Estamos preparando tu pedido."
+    if estado == 'DESPACHO':
+        if es_courier:
+            track_msg = f"Tu código de seguimiento es: {orden.codigo_seguimiento}" if orden.codigo_seguimiento else "Pronto recibirás tu código."
+            return f"¡Tu pedido va en camino! Lo hemos entregado al Courier. {track_msg}"
+        # Mensaje Flash
+        return f"¡Tu pedido va en camino! Nuestro repartidor Flash ha salido a ruta hacia {orden.direccion_envio}."
+    if estado == 'ENTREGADO':
+        return "¡Pedido Entregado! Gracias por comprar en ModaOne. Esperamos que lo disfrutes."
+    return ""
+
+
+@tarea('enviar_boleta')
+def enviar_boleta(orden_id):
+    orden = Orden.objects.select_related('usuario').prefetch_related('items_orden').get(id=orden_id)
+    nombre = orden.usuario.first_name if orden.usuario else ''
+    email = EmailMessage(
+        f'¡Compra Exitosa! Boleta Orden #{orden.numero_orden}',
+        f'Hola {nombre}, tu pago con PayPal fue exitoso. Adjuntamos tu boleta.',
+        settings.EMAIL_HOST_USER,
+        [orden.email]
+    )
+    email.attach(f'boleta_{orden.numero_orden}.pdf', contenido_boleta(orden), 'application/pdf')
+    enviar_uno(email)
+
+
+@tarea('notificar_estado')
+def notificar_estado(orden_id, estado):
+    orden = Orden.objects.select_related('usuario').get(id=orden_id)
+    mensaje = mensaje_estado(orden, estado)
+    if mensaje:
+        asunto = f"Actualización de tu Orden #{orden.numero_orden}"
+        enviar_uno(EmailMessage(asunto, mensaje, settings.EMAIL_HOST_USER, [orden.email]))
+
+
+@tarea('notificar_estados_lote')
+def notificar_estados_lote(pares):
+    """
+    pares: [[orden_id, estado], ...]. Una consulta y todos los correos por la
+    misma conexión. Si el servidor falla a mitad, solo los que no salieron se
+    reencolan en una tarea nueva (los ya enviados no se repiten).
+    """
+    ordenes = Orden.objects.select_related('usuario').in_bulk([orden_id for orden_id, _ in pares])
+    mensajes = {}
+    for orden_id, estado in pares:
+        orden = ordenes.get(orden_id)
+        mensaje = mensaje_estado(orden, estado) if orden else ''
+        if mensaje:
+            asunto = f"Actualización de tu Orden #{orden.numero_orden}"
+            mensajes[(orden_id, estado)] = EmailMessage(asunto, mensaje, settings.EMAIL_HOST_USER, [orden.email])
+    resultado = enviar(mensajes.values())
+    if resultado.pendientes and not resultado.enviados:
+        # No salió nada: la misma tarea se reintenta con su backoff
+        raise resultado.error
+    if resultado.pendientes:
+        pendientes = [list(par) for par, m in mensajes.items() if m in resultado.pendientes]
+        encolar('notificar_estados_lote', {'pares': pendientes}, retraso=60)
@@ -0,0 +1,83 @@
+# core/numeracion.py
+
+"""
+Asignador de números de orden sin colisiones.
+
+Cada proceso reserva en la base de datos un bloque de BLOQUE números
+consecutivos (un solo UPDATE por bloque) y luego los entrega desde memoria
+con un lock, así que miles de órdenes por segundo repartidas entre varios
+workers de gunicorn no necesitan una consulta por número ni pueden repetirse.
+
+Formato: MODA-AAMMDD-000123 (fecha del día + secuencia global). La secuencia
+crece siempre, por lo que los números quedan aproximadamente ordenados en el
+tiempo; al reiniciar un worker se pierde el resto de su bloque (huecos), nunca
+se repite un número.
+
+Los bloques solo se reservan en autocommit. Dentro de una transacción del
+llamador (p. ej. Orden.save() en un atomic) el incremento se revertiría con
+ella mientras el bloque sigue en memoria, y otro worker volvería a reservar
+esos números: ahí se reserva un único número en la misma transacción.
+"""
+
+import os
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+BLOQUE = getattr(settings, 'NUMERACION_BLOQUE', 100)
+SECUENCIA_ORDEN = 'orden'
+
+
+def reservar_bloque(nombre, tamano):
+    """Reserva [inicio, inicio + tamano) en la secuencia `nombre`. Devuelve inicio."""
+    from .models import SecuenciaNumeracion
+    SecuenciaNumeracion.objects.get_or_create(nombre=nombre)
+    with transaction.atomic():
+        # El UPDATE toma el lock de la fila primero; la lectura posterior ve nuestro propio incremento
+        SecuenciaNumeracion.objects.filter(nombre=nombre).update(siguiente=F('siguiente') + tamano)
+        tope = SecuenciaNumeracion.objects.values_list('siguiente', flat=True).get(nombre=nombre)
+    return tope - tamano
+
+
+class AsignadorNumeros:
+    """Entrega números de una secuencia reservando bloques en la base de datos."""
+
+    def __init__(self, nombre, bloque=BLOQUE):
+        self.nombre = nombre
+        self.bloque = bloque
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._siguiente = 0
+        self._tope = 0
+
+    def siguiente(self):
+        if transaction.get_connection().in_atomic_block:
+            # Si la transacción se revierte, el número vuelve a la secuencia junto con la orden
+            return reservar_bloque(self.nombre, 1)
+        with self._lock:
+            # Tras un fork (gunicorn --preload) el hijo no puede reutilizar el bloque del padre
+            if os.getpid() != self._pid:
+                self._pid = os.getpid()
+                self._siguiente = self._tope = 0
+            if self._siguiente >= self._tope:
+                self._siguiente = reservar_bloque(self.nombre, self.bloque)
+                self._tope = self._siguiente + self.bloque
+            numero = self._siguiente
+            self._siguiente += 1
+        return numero
+
+
+_asignador_ordenes = AsignadorNumeros(SECUENCIA_ORDEN)
+
+
+def formatear_numero_orden(secuencia, fecha=None):
+    fecha = fecha or timezone.localdate()
+    return f"MODA-{fecha:%y%m%d}-{secuencia:06d}"
+
+
+def siguiente_numero_orden():
+    """Número de orden único, p. ej. 'MODA-251017-000123'."""
+    return formatear_numero_orden(_asignador_ordenes.siguiente())
@@ -0,0 +1,89 @@
+# core/ordenes.py
+
+"""
+Materialización de órdenes: convierte el carrito de un usuario en una Orden
+con sus ItemOrden usando un número fijo de consultas, sin importar cuántas
+líneas tenga el carrito:
+
+1. Líneas del carrito + variante + producto (un solo JOIN).
+2. Reserva de stock (lock ordenado + UPDATE condicional, ver core/stock.py).
+3. INSERT de la Orden.
+4. bulk_create de todos los ItemOrden (snapshots de nombre y talla/color).
+5. DELETE de las líneas del carrito en una sentencia.
+6. Rollups diarios de ventas (ver core/rollups.py).
+"""
+
+from django.db import transaction
+
+from .models import ItemCarrito, ItemOrden, Orden
+from .stock import reservar_stock
+from .numeracion import siguiente_numero_orden
+from .rollups import registrar_orden
+
+COSTOS_ENVIO = {'1': 5990, '2': 3990}
+
+
+class CarritoVacio(Exception):
+    pass
+
+
+def lineas_carrito(usuario):
+    """Líneas del carrito con variante y producto ya cargados (una consulta)."""
+    return list(
+        ItemCarrito.objects.filter(carrito__usuario=usuario)
+        .select_related('variante__producto')
+        .order_by('id')
+    )
+
+
+def materializar_orden(usuario, direccion, metodo_envio, email):
+    """
+    Crea la orden PENDIENTE del carrito de `usuario` y lo vacía.
+    Lanza CarritoVacio o core.stock.StockInsuficiente (en ambos casos no se escribe nada).
+    """
+    lineas = lineas_carrito(usuario)
+    if not lineas:
+        raise CarritoVacio()
+
+    # El número se asigna fuera de la transacción: si toca reservar un bloque
+    # nuevo, el lock de la secuencia no queda tomado durante todo el checkout.
+    numero_orden = siguiente_numero_orden()
+
+    with transaction.atomic():
+        return _crear_orden(usuario, direccion, metodo_envio, email, lineas, numero_orden)
+
+
+def _crear_orden(usuario, direccion, metodo_envio, email, lineas, numero_orden):
+    reservar_stock((i.variante_id, i.cantidad) for i in lineas)
+
+    envio_val = COSTOS_ENVIO.get(metodo_envio, 0)
+    subtotal = sum(i.subtotal for i in lineas)
+
+    orden = Orden.objects.create(
+        numero_orden=numero_orden,
+        usuario=usuario,
+        email=email,
+        subtotal=subtotal,
+        costo_envio=envio_val,
+        total_final=subtotal + envio_val,
+        estado='PENDIENTE',
+        direccion_envio=f"{direccion.calle} #{direccion.numero}, {direccion.comuna}",
+    )
+
+    items = ItemOrden.objects.bulk_create([
+        ItemOrden(
+            orden=orden,
+            variante=i.variante,
+            nombre_producto=i.variante.producto.nombre,
+            talla_color=f"{i.variante.talla}/{i.variante.color}",
+            cantidad=i.cantidad,
+            precio_unitario=i.precio_unitario,
+        )
+        for i in lineas
+    ])
+
+    # Vaciar el carrito en un solo DELETE (el Carrito se conserva para reutilizarlo)
+    ItemCarrito.objects.filter(id__in=[i.id for i in lineas]).delete()
+
+    registrar_orden(orden, items)
+    return orden
@@ -0,0 +1,92 @@
+# core/paginacion.py
+
+"""
+Paginación por cursor (keyset) sobre (fecha_creacion, id), de lo más nuevo
+a lo más antiguo. En vez de OFFSET cada página filtra "después de la última
+fila vista", así que la página 5.000 cuesta lo mismo que la primera y no se
+ejecuta ningún COUNT(*).
+
+Los cursores son opacos para el cliente (JSON en base64 url-safe); un cursor
+inválido se trata como si no hubiera cursor (primera página).
+"""
+
+import base64
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+SIGUIENTE = 's'
+ANTERIOR = 'a'
+
+
+def codificar_cursor(fecha, pk, direccion):
+    datos = json.dumps({'f': fecha.isoformat(), 'i': pk, 'd': direccion}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(datos.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """Devuelve (fecha, id, direccion) o None si el cursor no es válido."""
+    if not cursor:
+        return None
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        datos = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        fecha = parse_datetime(datos['f'])
+        if fecha is None or datos['d'] not in (SIGUIENTE, ANTERIOR):
+            return None
+        return fecha, int(datos['i']), datos['d']
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+class PaginaKeyset:
+    """Página de resultados con los cursores para moverse hacia adelante y atrás."""
+
+    def __init__(self, object_list, hay_siguiente, hay_anterior):
+        self.object_list = object_list
+        self.has_next = hay_siguiente
+        self.has_previous = hay_anterior
+        self.cursor_siguiente = None
+        self.cursor_anterior = None
+        if object_list and hay_siguiente:
+            ultimo = object_list[-1]
+            self.cursor_siguiente = codificar_cursor(ultimo.fecha_creacion, ultimo.pk, SIGUIENTE)
+        if object_list and hay_anterior:
+            primero = object_list[0]
+            self.cursor_anterior = codificar_cursor(primero.fecha_creacion, primero.pk, ANTERIOR)
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def paginar_keyset(queryset, cursor, por_pagina):
+    """
+    Pagina un queryset de modelos con fecha_creacion e id (orden descendente).
+    Se pide una fila extra para saber si hay otra página sin contar.
+    """
+    posicion = decodificar_cursor(cursor)
+
+    if posicion is None:
+        filas = list(queryset.order_by('-fecha_creacion', '-id')[:por_pagina + 1])
+        return PaginaKeyset(filas[:por_pagina], len(filas) > por_pagina, False)
+
+    fecha, pk, direccion = posicion
+    if direccion == SIGUIENTE:
+        filtro = Q(fecha_creacion__lt=fecha) | Q(fecha_creacion=fecha, id__lt=pk)
+        filas = list(queryset.filter(filtro).order_by('-fecha_creacion', '-id')[:por_pagina + 1])
+        return PaginaKeyset(filas[:por_pagina], len(filas) > por_pagina, True)
+
+    filtro = Q(fecha_creacion__gt=fecha) | Q(fecha_creacion=fecha, id__gt=pk)
+    filas = list(queryset.filter(filtro).order_by('fecha_creacion', 'id')[:por_pagina + 1])
+    hay_anterior = len(filas) > por_pagina
+    filas = filas[:por_pagina]
+    filas.reverse()
+    return PaginaKeyset(filas, True, hay_anterior)
@@ -0,0 +1,81 @@
+# core/reportes.py
+
+"""
+Reportes por período para dashboard_expansion.
+
+Sale de los rollups diarios VentaDiariaProducto (core/rollups.py), con dos
+consultas acotadas por fecha sobre el índice (estado, fecha), así el costo
+depende del período pedido y no de todo el historial:
+
+- Ranking: unidades por producto dentro del período elegido.
+- Estacionalidad: líneas vendidas en verano / invierno durante los últimos
+  MESES_ESTACIONALIDAD meses (columna `mes` guardada, sin extraer el mes de
+  fecha_creacion en cada fila de Orden).
+"""
+
+from datetime import date, timedelta
+
+from django.db.models import Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import VentaDiariaProducto
+from .rollups import agrupar_por_producto
+
+ESTADOS_VENDIDOS = ('CONFIRMADO', 'DESPACHO', 'ENTREGADO')
+MESES_VERANO = (12, 1, 2, 3)
+MESES_INVIERNO = (6, 7, 8, 9)
+MESES_ESTACIONALIDAD = 12
+
+
+def rango_periodo(filtro, hoy=None):
+    """(desde, hasta, titulo) del filtro; desde=None significa todo el historial."""
+    hoy = hoy or timezone.localdate()
+    if filtro == 'semana':
+        return hoy - timedelta(days=7), hoy, "Última Semana"
+    if filtro == 'mes':
+        return hoy - timedelta(days=30), hoy, "Último Mes"
+    if filtro == 'trimestre':
+        return hoy - timedelta(days=90), hoy, "Último Trimestre"
+    if filtro == 'semestre1':
+        return date(hoy.year, 1, 1), date(hoy.year, 6, 30), f"Primer Semestre {hoy.year}"
+    if filtro == 'semestre2':
+        return date(hoy.year, 7, 1), date(hoy.year, 12, 31), f"Segundo Semestre {hoy.year}"
+    if filtro == 'anio':
+        return date(hoy.year, 1, 1), hoy, f"Año {hoy.year}"
+    return None, hoy, "Análisis General"
+
+
+def reporte_periodo(filtro, hoy=None):
+    """{'titulo', 'desde', 'hasta', 'ranking', 'clima'} con dos consultas acotadas por fecha."""
+    hoy = hoy or timezone.localdate()
+    desde, hasta, titulo = rango_periodo(filtro, hoy)
+    vendidas = VentaDiariaProducto.objects.filter(estado__in=ESTADOS_VENDIDOS)
+
+    en_periodo = vendidas.filter(fecha__lt=hasta + timedelta(days=1))
+    if desde:
+        en_periodo = en_periodo.filter(fecha__gte=desde)
+    ranking = agrupar_por_producto(en_periodo) \
+        .annotate(total_vendido=Sum('unidades')) \
+        .filter(total_vendido__gt=0) \
+        .order_by('-total_vendido', 'nombre', 'producto_id')
+
+    inicio_estacionalidad = _restar_meses(hoy.replace(day=1), MESES_ESTACIONALIDAD - 1)
+    clima = vendidas.filter(fecha__gte=inicio_estacionalidad, fecha__lt=hoy + timedelta(days=1)).aggregate(
+        verano=Coalesce(Sum('lineas', filter=Q(mes__in=MESES_VERANO)), 0),
+        invierno=Coalesce(Sum('lineas', filter=Q(mes__in=MESES_INVIERNO)), 0),
+    )
+
+    return {
+        'titulo': titulo,
+        'desde': desde,
+        'hasta': hasta,
+        'ranking': [dict(f, nombre_producto=f['nombre']) for f in ranking],
+        'clima': clima,
+    }
+
+
+def _restar_meses(fecha, meses):
+    """Primer día del mes que está `meses` meses antes de `fecha` (que ya es día 1)."""
+    total = fecha.year * 12 + fecha.month - 1 - meses
+    return date(total // 12, total % 12 + 1, 1)
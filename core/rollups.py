@@ -0,0 +1,271 @@
+# core/rollups.py
+
+"""
+Rollups diarios de ventas para el dashboard y los reportes de gestión.
+
+- VentaDiariaEstado:   por día y estado -> órdenes y monto (total_final).
+- VentaDiariaProducto: por día, estado y producto -> unidades, líneas y monto.
+  La clave es el id del producto; nombre_producto es solo el nombre que se
+  muestra (un producto renombrado sigue siendo una fila, y dos productos con
+  el mismo nombre no se mezclan). Las líneas sin producto (variante o
+  producto borrados) se agrupan por su nombre guardado.
+
+El día es la fecha (local) de creación de la orden, igual que los filtros por
+fecha_creacion de los reportes. Se mantienen de forma incremental, dentro de
+la misma transacción que el cambio:
+
+- registrar_orden() al crear la orden (core/ordenes.py).
+- registrar_cambio_estado() / registrar_cambios_estado() cuando cambia el
+  estado: resta en el estado anterior y suma en el nuevo.
+
+Cada aplicación de deltas cuesta dos consultas sin importar cuántas líneas
+tenga la orden (SELECT de ids, UPDATE con CASE), más un INSERT IGNORE de filas
+en cero y otro SELECT cuando aparecen claves nuevas.
+Si algo se desalinea: python manage.py reconstruir_rollups.
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, CharField, Count, DecimalField, F, IntegerField, Max, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import ItemOrden, Orden, VentaDiariaEstado, VentaDiariaProducto
+
+# Estados que cuentan como venta concretada
+ESTADOS_VENTA = ('CONFIRMADO', 'PICKING', 'EMBALAJE', 'DESPACHO', 'ENTREGADO')
+
+CLAVE_ESTADO = ('fecha', 'estado')
+CLAVE_PRODUCTO = ('fecha', 'estado', 'producto_id')
+# Líneas cuyo producto ya no existe: producto_id NULL, se distinguen por nombre
+CLAVE_HUERFANO = ('fecha', 'estado', 'producto_id', 'nombre_producto')
+
+
+def fecha_rollup(orden):
+    return timezone.localdate(orden.fecha_creacion)
+
+
+# ==========================================
+# --- 1. ACTUALIZACIÓN INCREMENTAL ---
+# ==========================================
+
+def registrar_orden(orden, items):
+    """Suma una orden recién creada en su estado actual (items con su variante ya cargada)."""
+    _aplicar_movimientos([(orden, orden.estado, 1)], {orden.id: items})
+
+
+def registrar_cambio_estado(orden, estado_anterior, items=None):
+    """`orden.estado` ya es el nuevo estado."""
+    registrar_cambios_estado([(orden, estado_anterior)], items)
+
+
+def registrar_cambios_estado(cambios, items=None):
+    """
+    cambios: pares (orden, estado_anterior) con orden.estado ya actualizado.
+    items: {orden_id: [ItemOrden con su variante]}; si no se pasa se cargan en una consulta.
+    """
+    cambios = [(o, anterior) for o, anterior in cambios if anterior != o.estado]
+    if not cambios:
+        return
+    if items is None:
+        items = defaultdict(list)
+        for item in ItemOrden.objects.filter(orden_id__in=[o.id for o, _ in cambios]).select_related('variante'):
+            items[item.orden_id].append(item)
+
+    movimientos = []
+    for orden, anterior in cambios:
+        movimientos.append((orden, anterior, -1))
+        movimientos.append((orden, orden.estado, 1))
+    _aplicar_movimientos(movimientos, items)
+
+
+def _aplicar_movimientos(movimientos, items):
+    """movimientos: (orden, estado, signo) -> deltas por clave de cada tabla."""
+    por_estado = defaultdict(lambda: {'ordenes': 0, 'monto': Decimal(0)})
+    por_producto = defaultdict(lambda: {'unidades': 0, 'lineas': 0, 'monto': Decimal(0)})
+    por_huerfano = defaultdict(lambda: {'unidades': 0, 'lineas': 0, 'monto': Decimal(0)})
+    # Valores que solo se escriben al crear la fila
+    iniciales_estado = {}
+    iniciales_producto = {}
+
+    for orden, estado, signo in movimientos:
+        fecha = fecha_rollup(orden)
+        iniciales_estado[(fecha, estado)] = {'mes': fecha.month}
+        fila = por_estado[(fecha, estado)]
+        fila['ordenes'] += signo
+        fila['monto'] += signo * orden.total_final
+        for item in items.get(orden.id, ()):
+            producto_id = item.variante.producto_id if item.variante_id else None
+            if producto_id:
+                clave = (fecha, estado, producto_id)
+                fila = por_producto[clave]
+                iniciales_producto.setdefault(clave, {'mes': fecha.month, 'nombre_producto': item.nombre_producto})
+            else:
+                clave = (fecha, estado, None, item.nombre_producto)
+                fila = por_huerfano[clave]
+                iniciales_producto.setdefault(clave, {'mes': fecha.month})
+            fila['unidades'] += signo * item.cantidad
+            fila['lineas'] += signo
+            fila['monto'] += signo * item.cantidad * item.precio_unitario
+
+    _aplicar(VentaDiariaEstado, CLAVE_ESTADO, por_estado, iniciales_estado)
+    _aplicar(VentaDiariaProducto, CLAVE_PRODUCTO, por_producto, iniciales_producto)
+    _aplicar(VentaDiariaProducto, CLAVE_HUERFANO, por_huerfano, iniciales_producto)
+
+
+def _aplicar(modelo, campos_clave, deltas, iniciales=None):
+    """Suma `deltas` ({clave: {campo: delta}}) a las filas de `modelo`, creándolas si faltan."""
+    deltas = {k: d for k, d in deltas.items() if any(d.values())}
+    if not deltas:
+        return
+    iniciales = iniciales or {}
+
+    # 1. Ids de las filas existentes
+    ids = _ids_por_clave(modelo, campos_clave, deltas)
+
+    # 2. Filas en cero para las claves nuevas (si otra transacción la creó antes, se ignora)
+    nuevas = [k for k in deltas if k not in ids]
+    if nuevas:
+        modelo.objects.bulk_create(
+            [modelo(**dict(zip(campos_clave, k)), **iniciales.get(k, {})) for k in nuevas],
+            ignore_conflicts=True,
+        )
+        ids = _ids_por_clave(modelo, campos_clave, deltas)
+
+    # 3. Un solo UPDATE con un CASE por columna
+    campos = next(iter(deltas.values())).keys()
+    cambios = {}
+    for campo in campos:
+        salida = modelo._meta.get_field(campo)
+        salida = DecimalField(max_digits=salida.max_digits, decimal_places=salida.decimal_places) \
+            if isinstance(salida, DecimalField) else IntegerField()
+        cambios[campo] = F(campo) + Case(
+            *[When(id=ids[k], then=Value(d[campo])) for k, d in deltas.items()],
+            default=Value(0), output_field=salida,
+        )
+    modelo.objects.filter(id__in=[ids[k] for k in deltas]).update(**cambios)
+
+
+def _ids_por_clave(modelo, campos_clave, claves):
+    """{clave: id}. El filtro por columna trae un superconjunto que se afina en Python; None = IS NULL."""
+    filtro = Q()
+    for i, campo in enumerate(campos_clave):
+        valores = {k[i] for k in claves}
+        columna = Q(**{f'{campo}__in': valores - {None}})
+        if None in valores:
+            columna |= Q(**{f'{campo}__isnull': True})
+        filtro &= columna
+    return {
+        tuple(fila[c] for c in campos_clave): fila['id']
+        for fila in modelo.objects.filter(filtro).values('id', *campos_clave)
+    }
+
+
+# ==========================================
+# --- 2. RECONSTRUCCIÓN COMPLETA ---
+# ==========================================
+
+def reconstruir(desde=None):
+    """
+    Recalcula los rollups desde Orden/ItemOrden (todo, o desde la fecha `desde`).
+    Devuelve (filas_estado, filas_producto).
+    """
+    ordenes = Orden.objects.all()
+    items = ItemOrden.objects.all()
+    if desde:
+        ordenes = ordenes.filter(fecha_creacion__date__gte=desde)
+        items = items.filter(orden__fecha_creacion__date__gte=desde)
+
+    por_estado = ordenes.annotate(dia=TruncDate('fecha_creacion')) \
+        .values('dia', 'estado') \
+        .annotate(cantidad=Count('id'), total=Sum('total_final')) \
+        .order_by()
+    # Por producto; las líneas sin producto, por su nombre
+    por_producto = items.annotate(dia=TruncDate('orden__fecha_creacion'), estado_orden=F('orden__estado')) \
+        .values('dia', 'estado_orden', 'variante__producto_id', huerfano=_nombre_si_no_hay('variante__producto_id')) \
+        .annotate(
+            nombre=Max('nombre_producto'),
+            total_unidades=Sum('cantidad'),
+            total_lineas=Count('id'),
+            total=Sum(F('cantidad') * F('precio_unitario'), output_field=DecimalField(max_digits=14, decimal_places=0)),
+        ).order_by()
+
+    with transaction.atomic():
+        for modelo in (VentaDiariaEstado, VentaDiariaProducto):
+            filas = modelo.objects.all()
+            if desde:
+                filas = filas.filter(fecha__gte=desde)
+            filas.delete()
+
+        creadas_estado = VentaDiariaEstado.objects.bulk_create([
+            VentaDiariaEstado(fecha=f['dia'], mes=f['dia'].month, estado=f['estado'], ordenes=f['cantidad'], monto=f['total'] or 0)
+            for f in por_estado
+        ], batch_size=1000)
+        creadas_producto = VentaDiariaProducto.objects.bulk_create([
+            VentaDiariaProducto(
+                fecha=f['dia'], mes=f['dia'].month, estado=f['estado_orden'], nombre_producto=f['nombre'],
+                producto_id=f['variante__producto_id'], unidades=f['total_unidades'], lineas=f['total_lineas'],
+                monto=f['total'] or 0,
+            )
+            for f in por_producto
+        ], batch_size=1000)
+    return len(creadas_estado), len(creadas_producto)
+
+
+# ==========================================
+# --- 3. LECTURAS (dashboard y reportes) ---
+# ==========================================
+
+def _filtrar(queryset, desde=None, hasta=None, estados=None, excluir=None):
+    if desde:
+        queryset = queryset.filter(fecha__gte=desde)
+    if hasta:
+        queryset = queryset.filter(fecha__lte=hasta)
+    if estados is not None:
+        queryset = queryset.filter(estado__in=estados)
+    if excluir:
+        queryset = queryset.exclude(estado__in=excluir)
+    return queryset
+
+
+def resumen_ventas(**filtros):
+    """{'ordenes': n, 'monto': total} del rango (desde/hasta son fechas, inclusive)."""
+    datos = _filtrar(VentaDiariaEstado.objects.all(), **filtros).aggregate(
+        ordenes=Sum('ordenes'), monto=Sum('monto')
+    )
+    return {'ordenes': datos['ordenes'] or 0, 'monto': datos['monto'] or 0}
+
+
+def _nombre_si_no_hay(campo_producto):
+    """'' si la fila tiene producto, o su nombre guardado si no (para agrupar los borrados por nombre)."""
+    return Case(
+        When(**{f'{campo_producto}__isnull': True}, then=F('nombre_producto')),
+        default=Value(''), output_field=CharField(),
+    )
+
+
+def agrupar_por_producto(queryset):
+    """
+    Agrupa filas de VentaDiariaProducto por producto y anota `nombre` (el
+    actual del producto, o el guardado si ya no existe). Sobre esto se
+    agregan las sumas.
+    """
+    return queryset.values('producto_id', huerfano=_nombre_si_no_hay('producto_id')) \
+        .annotate(nombre=Coalesce(Max('producto__nombre'), Max('nombre_producto')))
+
+
+def ranking_productos(limite=None, **filtros):
+    """Productos por unidades vendidas: [{'producto_id', 'nombre_producto', 'total_vendido'}, ...]."""
+    ranking = agrupar_por_producto(_filtrar(VentaDiariaProducto.objects.all(), **filtros)) \
+        .annotate(total_vendido=Sum('unidades')) \
+        .filter(total_vendido__gt=0) \
+        .order_by('-total_vendido', 'nombre', 'producto_id')
+    if limite:
+        ranking = ranking[:limite]
+    return [
+        {'producto_id': f['producto_id'], 'nombre_producto': f['nombre'], 'total_vendido': f['total_vendido']}
+        for f in ranking
+    ]
+
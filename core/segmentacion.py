@@ -0,0 +1,215 @@
+# core/segmentacion.py
+
+"""
+Segmentación de clientes para el CRM (panel_clientes).
+
+Todas las métricas y el perfil se calculan en UNA consulta set-based: cada
+métrica es una subconsulta correlacionada por usuario (sin el producto
+cartesiano de juntar órdenes y pruebas en el mismo JOIN) y el segmento es un
+CASE sobre esas métricas, así se puede filtrar y paginar en la base de datos.
+
+Reglas (en orden de prioridad):
+- VIP:      gastó más de $50.000 o tiene 3+ órdenes pagadas.
+- Curioso:  usó el probador más de 3 veces y no tiene órdenes pagadas.
+- Inactivo: tiene órdenes pagadas pero su última orden tiene más de 60 días.
+- Cliente:  tiene órdenes pagadas.
+- Nuevo:    el resto.
+
+El resultado se persiste en SegmentoCliente (una fila por cliente) y se
+refresca por usuario cuando cambia algo que lo afecta:
+- una Orden se crea o cambia de estado (señal post_save; cancelar_orden, que
+  usa UPDATE, llama a programar_refresco explícitamente; los cambios masivos
+  de core/transiciones.py refrescan a todos sus clientes de una vez),
+- se registran pruebas en el probador: core/eventos.py las guarda con
+  bulk_create (sin señales) y, tras cada lote, refresca a sus usuarios con
+  refrescar_segmentos,
+- se registra un cliente nuevo.
+La regla de inactividad depende del reloj: la aplica una vez al día
+`python manage.py refrescar_segmentos`; `--completo` reconstruye toda la tabla.
+"""
+
+from datetime import datetime, time, timedelta
+
+from django.contrib.auth.models import User
+from django.db.models import (
+    Case, CharField, Count, DecimalField, IntegerField, Max, OuterRef, Q, Subquery, Sum, Value, When,
+)
+from django.db.models.functions import Coalesce
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Direccion, Orden, RegistroTryOn, SegmentoCliente
+
+ESTADOS_PAGADOS = ('CONFIRMADO', 'DESPACHO', 'ENTREGADO')
+GASTO_VIP = 50000
+ORDENES_VIP = 3
+PRUEBAS_CURIOSO = 3
+DIAS_INACTIVO = 60
+CLIENTES_POR_PAGINA = 25
+
+CAMPOS_SNAPSHOT = ('segmento', 'total_gastado', 'total_ordenes', 'veces_ia', 'ultima_orden', 'telefono')
+
+# clave -> (etiqueta, color bootstrap)
+SEGMENTOS = {
+    'vip': ("💎 VIP", "info"),
+    'curioso': ("👀 Curioso (IA)", "warning"),
+    'inactivo': ("👻 Inactivo", "danger"),
+    'cliente': ("✅ Cliente", "success"),
+    'nuevo': ("Nuevo", "secondary"),
+}
+
+
+# ==========================================
+# --- 1. CÁLCULO SET-BASED ---
+# ==========================================
+
+def _agregado_por_usuario(queryset, agregado):
+    """Subconsulta escalar: `agregado` de `queryset` para el usuario de la fila externa."""
+    return Subquery(
+        queryset.filter(usuario=OuterRef('pk')).order_by().values('usuario').annotate(valor=agregado).values('valor')[:1]
+    )
+
+
+def limite_inactividad(hoy=None):
+    """Órdenes anteriores a este instante cuentan como 'más de DIAS_INACTIVO días'."""
+    hoy = hoy or timezone.localdate()
+    return timezone.make_aware(datetime.combine(hoy - timedelta(days=DIAS_INACTIVO), time.min))
+
+
+def expresion_segmento(hoy=None):
+    return Case(
+        When(Q(total_gastado__gt=GASTO_VIP) | Q(total_ordenes__gte=ORDENES_VIP), then=Value('vip')),
+        When(veces_ia__gt=PRUEBAS_CURIOSO, total_ordenes__lt=1, then=Value('curioso')),
+        When(total_ordenes__gt=0, ultima_orden__lt=limite_inactividad(hoy), then=Value('inactivo')),
+        When(total_ordenes__gt=0, then=Value('cliente')),
+        default=Value('nuevo'),
+        output_field=CharField(),
+    )
+
+
+def clientes_con_metricas(hoy=None):
+    """
+    Clientes (no staff) anotados con total_gastado, total_ordenes, veces_ia,
+    ultima_orden, telefono (de la última dirección) y segmento.
+    """
+    pagadas = Orden.objects.filter(estado__in=ESTADOS_PAGADOS)
+    return User.objects.filter(is_staff=False).annotate(
+        total_gastado=Coalesce(
+            _agregado_por_usuario(pagadas, Sum('total_final')), Value(0), output_field=DecimalField(max_digits=14, decimal_places=0)
+        ),
+        total_ordenes=Coalesce(_agregado_por_usuario(pagadas, Count('id')), Value(0), output_field=IntegerField()),
+        veces_ia=Coalesce(_agregado_por_usuario(RegistroTryOn.objects.all(), Count('id')), Value(0), output_field=IntegerField()),
+        ultima_orden=_agregado_por_usuario(Orden.objects.all(), Max('fecha_creacion')),
+        telefono=Subquery(Direccion.objects.filter(usuario=OuterRef('pk')).order_by('-id').values('telefono')[:1]),
+    ).annotate(segmento=expresion_segmento(hoy))
+
+
+# ==========================================
+# --- 2. SNAPSHOT PERSISTIDO (SegmentoCliente) ---
+# ==========================================
+
+def refrescar_segmentos(usuario_ids, hoy=None):
+    """Recalcula y guarda el snapshot de esos usuarios (un SELECT + un upsert)."""
+    usuario_ids = set(usuario_ids)
+    if not usuario_ids:
+        return 0
+    filas = [
+        SegmentoCliente(usuario_id=c.id, **{campo: getattr(c, campo) for campo in CAMPOS_SNAPSHOT})
+        for c in clientes_con_metricas(hoy).filter(id__in=usuario_ids)
+    ]
+    _guardar(filas)
+    # Usuarios que ya no son clientes (staff o eliminados) salen del snapshot
+    obsoletos = usuario_ids - {f.usuario_id for f in filas}
+    if obsoletos:
+        SegmentoCliente.objects.filter(usuario_id__in=obsoletos).delete()
+    return len(filas)
+
+
+def programar_refresco(usuario_id):
+    """Refresca el snapshot del usuario cuando la transacción actual se confirme."""
+    if usuario_id:
+        transaction.on_commit(lambda: refrescar_segmentos([usuario_id]))
+
+
+def refrescar_inactividad(hoy=None):
+    """
+    Pase diario: la única regla que cambia sin que el cliente haga nada es la
+    de inactividad. Recalcula solo a los candidatos (clientes cuya última orden
+    cruzó el límite) y a los clientes que todavía no tienen snapshot.
+    """
+    candidatos = set(
+        SegmentoCliente.objects.filter(segmento='cliente', ultima_orden__lt=limite_inactividad(hoy))
+        .values_list('usuario_id', flat=True)
+    )
+    candidatos |= set(
+        User.objects.filter(is_staff=False, segmento_cliente__isnull=True).values_list('id', flat=True)
+    )
+    candidatos |= set(
+        SegmentoCliente.objects.filter(usuario__is_staff=True).values_list('usuario_id', flat=True)
+    )
+    return refrescar_segmentos(candidatos, hoy)
+
+
+def reconstruir_segmentos(lote=1000, hoy=None):
+    """Recalcula el snapshot de todos los clientes por lotes de `lote` usuarios."""
+    total = 0
+    ultimo_id = 0
+    while True:
+        clientes = list(clientes_con_metricas(hoy).filter(id__gt=ultimo_id).order_by('id')[:lote])
+        if not clientes:
+            break
+        _guardar([
+            SegmentoCliente(usuario_id=c.id, **{campo: getattr(c, campo) for campo in CAMPOS_SNAPSHOT})
+            for c in clientes
+        ])
+        total += len(clientes)
+        ultimo_id = clientes[-1].id
+    SegmentoCliente.objects.filter(usuario__is_staff=True).delete()
+    return total
+
+
+def _guardar(filas):
+    # MySQL no acepta unique_fields: ON DUPLICATE KEY UPDATE usa la clave única de usuario por sí solo
+    unico = ['usuario'] if connection.features.supports_update_conflicts_with_target else None
+    SegmentoCliente.objects.bulk_create(
+        filas,
+        update_conflicts=True,
+        unique_fields=unico,
+        update_fields=[*CAMPOS_SNAPSHOT, 'fecha_actualizacion'],
+    )
+
+
+def conteo_segmentos():
+    """{clave_segmento: cantidad} leído del snapshot (una consulta agrupada sobre el índice)."""
+    conteo = dict.fromkeys(SEGMENTOS, 0)
+    filas = SegmentoCliente.objects.values('segmento').annotate(total=Count('usuario')).order_by()
+    conteo.update({f['segmento']: f['total'] for f in filas})
+    return conteo
+
+
+def miembros(segmento=None):
+    """Snapshot de un segmento (o de todos) ordenado por gasto."""
+    filas = SegmentoCliente.objects.select_related('usuario')
+    if segmento:
+        filas = filas.filter(segmento=segmento)
+    return filas.order_by('-total_gastado', 'usuario_id')
+
+
+def ficha_cliente(c, hoy=None):
+    """Diccionario que usa la plantilla del CRM a partir de un SegmentoCliente (sin consultas extra)."""
+    hoy = hoy or timezone.localdate()
+    perfil, color = SEGMENTOS[c.segmento]
+    dias = (hoy - timezone.localtime(c.ultima_orden).date()).days if c.ultima_orden else None
+    return {
+        'usuario': c.usuario,
+        'gasto': c.total_gastado,
+        'ordenes': c.total_ordenes,
+        'uso_ia': c.veces_ia,
+        # Cada uso de IA suma 10%. Máximo 100%.
+        'porcentaje_ia': min(c.veces_ia * 10, 100),
+        'dias_inactivo': dias,
+        'segmento': c.segmento,
+        'perfil': perfil,
+        'color': color,
+        'telefono': c.telefono,
+    }
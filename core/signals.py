@@ -0,0 +1,53 @@
+# core/signals.py
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.contrib.auth.models import User
+
+from .models import Orden, Producto, RegistroTryOn, Variante
+from . import busqueda, segmentacion
+from .catalogo import invalidar_catalogo
+
+
+# ==========================================
+# --- 1. ÍNDICE DE BÚSQUEDA ---
+# ==========================================
+
+@receiver(post_save, sender=Producto)
+def indexar_producto_guardado(sender, instance, **kwargs):
+    busqueda.indexar_producto(instance)
+
+@receiver(post_delete, sender=Producto)
+def desindexar_producto_eliminado(sender, instance, **kwargs):
+    busqueda.desindexar_producto(instance.pk)
+
+
+# ==========================================
+# --- 2. VERSIÓN DEL CATÁLOGO (cachés) ---
+# ==========================================
+
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+@receiver(post_save, sender=Variante)
+@receiver(post_delete, sender=Variante)
+def invalidar_cache_catalogo(sender, **kwargs):
+    # Tras el commit (como core/stock.py): antes, otro request podría cachear la grilla vieja con la versión nueva
+    transaction.on_commit(invalidar_catalogo)
+
+
+# ==========================================
+# --- 3. SEGMENTACIÓN DE CLIENTES (snapshot) ---
+# ==========================================
+
+@receiver(post_save, sender=Orden)
+@receiver(post_delete, sender=Orden)
+@receiver(post_save, sender=RegistroTryOn)
+@receiver(post_delete, sender=RegistroTryOn)
+def refrescar_segmento_cliente(sender, instance, **kwargs):
+    segmentacion.programar_refresco(instance.usuario_id)
+
+@receiver(post_save, sender=User)
+def crear_segmento_cliente(sender, instance, created, **kwargs):
+    if created:
+        segmentacion.programar_refresco(instance.id)
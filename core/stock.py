@@ -0,0 +1,94 @@
+# core/stock.py
+
+"""
+Reserva y liberación de stock de variantes.
+
+Todas las líneas de una orden se reservan con UNA sentencia condicional:
+
+    UPDATE core_variante
+       SET stock = stock - CASE id WHEN ... END
+     WHERE id IN (...) AND stock >= CASE id WHEN ... END
+
+Si alguna línea no alcanza, se actualizan menos filas que líneas y se lanza
+StockInsuficiente: como todo corre dentro de transaction.atomic, la orden
+completa se revierte y el stock nunca queda negativo.
+
+Antes del UPDATE las filas se bloquean con SELECT ... FOR UPDATE ordenado por
+id, así dos checkouts que comparten variantes siempre toman los locks en el
+mismo orden y no se producen deadlocks.
+"""
+
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, When
+
+from .models import Variante
+from .catalogo import invalidar_catalogo
+
+
+class StockInsuficiente(Exception):
+    """Una o más líneas piden más unidades de las disponibles."""
+
+    def __init__(self, faltantes):
+        # faltantes: lista de (variante, cantidad_pedida, stock_disponible)
+        self.faltantes = faltantes
+        detalle = ', '.join(f"{v} (pedido {pedido}, disponible {disp})" for v, pedido, disp in faltantes)
+        super().__init__(f"Stock insuficiente: {detalle}")
+
+
+def _agrupar(lineas):
+    """Acepta pares (variante_id, cantidad) y suma cantidades por variante."""
+    cantidades = defaultdict(int)
+    for variante_id, cantidad in lineas:
+        if variante_id is not None and cantidad > 0:
+            cantidades[variante_id] += cantidad
+    return dict(cantidades)
+
+
+def _por_variante(cantidades):
+    return Case(
+        *[When(id=vid, then=cant) for vid, cant in cantidades.items()],
+        output_field=IntegerField(),
+    )
+
+
+def reservar_stock(lineas):
+    """
+    Descuenta el stock de todas las líneas o de ninguna.
+    Debe llamarse dentro de transaction.atomic(). Lanza StockInsuficiente.
+    """
+    cantidades = _agrupar(lineas)
+    if not cantidades:
+        return
+
+    # 1. Locks en orden de id (evita deadlocks entre checkouts concurrentes)
+    bloqueadas = list(
+        Variante.objects.select_for_update()
+        .filter(id__in=cantidades.keys())
+        .order_by('id')
+        .select_related('producto')
+    )
+    faltantes = [
+        (v, cantidades[v.id], v.stock) for v in bloqueadas if v.stock < cantidades[v.id]
+    ]
+    if faltantes or len(bloqueadas) != len(cantidades):
+        raise StockInsuficiente(faltantes)
+
+    # 2. Un solo UPDATE condicional para todas las líneas
+    descuento = _por_variante(cantidades)
+    actualizadas = Variante.objects.filter(id__in=cantidades.keys(), stock__gte=descuento) \
+        .update(stock=F('stock') - descuento)
+    if actualizadas != len(cantidades):
+        raise StockInsuficiente(faltantes)
+
+    transaction.on_commit(invalidar_catalogo)
+
+
+def liberar_stock(lineas):
+    """Devuelve al stock las cantidades de las líneas (p. ej. al cancelar una orden)."""
+    cantidades = _agrupar(lineas)
+    if not cantidades:
+        return
+    Variante.objects.filter(id__in=cantidades.keys()).update(stock=F('stock') + _por_variante(cantidades))
+    transaction.on_commit(invalidar_catalogo)
@@ -0,0 +1,174 @@
+# core/tareas.py
+
+"""
+Cola de tareas en segundo plano respaldada por la base de datos.
+
+- encolar() guarda una Tarea en la MISMA transacción que el cambio que la
+  origina (si la orden no se confirma, la tarea tampoco existe).
+- La `clave` hace idempotente el encolado: encolar dos veces 'boleta:15'
+  devuelve la tarea existente. Con solo_pendiente=True la clave solo
+  deduplica contra una tarea que aún no empezó (p. ej. el correo de un estado
+  al que la orden vuelve más tarde).
+- El worker (python manage.py procesar_tareas) toma lotes con
+  SELECT ... FOR UPDATE SKIP LOCKED, así varios workers no se pisan, y deja
+  cada tarea "arrendada" por TIEMPO_BLOQUEO: si el worker muere, otra la retoma.
+  El arriendo se renueva justo antes de correr cada tarea del lote (si ya lo
+  perdió, la tarea se salta) y los tipos largos (@tarea(..., de_a_una=True),
+  p. ej. 'tryon') se toman de a una por lote.
+- Si el handler falla se reintenta con backoff exponencial + jitter hasta
+  max_intentos; después queda FALLIDA con el último error.
+- Si el handler lanza Posponer (p. ej. no hay cupo para llamar a la IA) la
+  tarea vuelve a la cola sin gastar un intento.
+
+Los handlers se registran con el decorador @tarea('tipo').
+"""
+
+import logging
+import random
+import traceback
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Tarea
+
+logger = logging.getLogger(__name__)
+
+TIEMPO_BLOQUEO = timedelta(minutes=5)
+BACKOFF_BASE = 30  # segundos; el n-ésimo reintento espera BACKOFF_BASE * 2**(n-1)
+BACKOFF_MAX = 60 * 60
+
+_handlers = {}
+_de_a_una = set()
+
+
+class Posponer(Exception):
+    """El handler no puede correr todavía: reprogramar en `segundos` sin contar el intento."""
+
+    def __init__(self, segundos):
+        self.segundos = segundos
+        super().__init__(f"Pospuesta {segundos}s")
+
+
+def tarea(tipo, de_a_una=False):
+    """Registra una función como handler de las tareas de `tipo` (`de_a_una`: máximo una por lote)."""
+    def registrar(funcion):
+        _handlers[tipo] = funcion
+        if de_a_una:
+            _de_a_una.add(tipo)
+        return funcion
+    return registrar
+
+
+def encolar(tipo, payload=None, clave=None, retraso=0, max_intentos=5, solo_pendiente=False):
+    """
+    Crea una tarea PENDIENTE (o devuelve la existente con la misma clave).
+    Con `solo_pendiente` una tarea anterior que ya corrió o está corriendo
+    libera su clave y se crea una nueva.
+    """
+    datos = {
+        'tipo': tipo,
+        'payload': payload or {},
+        'max_intentos': max_intentos,
+        'ejecutar_despues': timezone.now() + timedelta(seconds=retraso),
+    }
+    if clave is None:
+        return Tarea.objects.create(**datos)
+    if solo_pendiente:
+        Tarea.objects.filter(clave=clave).exclude(estado='PENDIENTE').update(clave=None)
+    try:
+        with transaction.atomic():
+            return Tarea.objects.create(clave=clave, **datos)
+    except IntegrityError:
+        return Tarea.objects.get(clave=clave)
+
+
+def calcular_backoff(intentos):
+    espera = min(BACKOFF_BASE * 2 ** (intentos - 1), BACKOFF_MAX)
+    return timedelta(seconds=espera * random.uniform(0.8, 1.2))
+
+
+def tomar_lote(tamano=10, tipos=None):
+    """Marca EN_CURSO hasta `tamano` tareas listas y las devuelve."""
+    ahora = timezone.now()
+    listas = Q(estado='PENDIENTE', ejecutar_despues__lte=ahora) | Q(estado='EN_CURSO', bloqueada_hasta__lt=ahora)
+    with transaction.atomic():
+        candidatas = Tarea.objects.select_for_update(skip_locked=True).filter(listas)
+        if tipos:
+            candidatas = candidatas.filter(tipo__in=tipos)
+        lote = []
+        largas = set()
+        for t in candidatas.order_by('ejecutar_despues', 'id')[:tamano]:
+            # Las demás tareas largas quedan libres para otros workers
+            if t.tipo in _de_a_una:
+                if t.tipo in largas:
+                    continue
+                largas.add(t.tipo)
+            lote.append(t)
+        if lote:
+            Tarea.objects.filter(id__in=[t.id for t in lote]).update(
+                estado='EN_CURSO', bloqueada_hasta=ahora + TIEMPO_BLOQUEO, fecha_actualizacion=ahora
+            )
+            for t in lote:
+                t.estado, t.bloqueada_hasta = 'EN_CURSO', ahora + TIEMPO_BLOQUEO
+    return lote
+
+
+def renovar_arriendo(t):
+    """Extiende el arriendo si la tarea sigue siendo de este worker. Devuelve False si otro la retomó."""
+    ahora = timezone.now()
+    renovada = Tarea.objects.filter(id=t.id, estado='EN_CURSO', bloqueada_hasta=t.bloqueada_hasta).update(
+        bloqueada_hasta=ahora + TIEMPO_BLOQUEO, fecha_actualizacion=ahora
+    )
+    if renovada:
+        t.bloqueada_hasta = ahora + TIEMPO_BLOQUEO
+    return bool(renovada)
+
+
+def ejecutar(t):
+    """Corre el handler de una tarea y registra el resultado. Devuelve True si terminó bien."""
+    handler = _handlers.get(t.tipo)
+    t.intentos += 1
+    try:
+        if handler is None:
+            raise LookupError(f"No hay handler registrado para '{t.tipo}'")
+        handler(**t.payload)
+    except Posponer as p:
+        t.intentos -= 1
+        t.estado = 'PENDIENTE'
+        t.ejecutar_despues = timezone.now() + timedelta(seconds=p.segundos)
+        t.bloqueada_hasta = None
+        t.save(update_fields=['estado', 'intentos', 'ejecutar_despues', 'bloqueada_hasta', 'fecha_actualizacion'])
+        return False
+    except Exception as e:
+        t.ultimo_error = f"{e}\n{traceback.format_exc()}"[-4000:]
+        if t.intentos >= t.max_intentos:
+            t.estado = 'FALLIDA'
+            logger.error("Tarea %s falló definitivamente: %s", t, e)
+        else:
+            t.estado = 'PENDIENTE'
+            t.ejecutar_despues = timezone.now() + calcular_backoff(t.intentos)
+            logger.warning("Tarea %s falló (intento %s), se reintenta: %s", t, t.intentos, e)
+        t.bloqueada_hasta = None
+        t.save(update_fields=['estado', 'intentos', 'ejecutar_despues', 'bloqueada_hasta', 'ultimo_error', 'fecha_actualizacion'])
+        return False
+
+    t.estado = 'COMPLETADA'
+    t.bloqueada_hasta = None
+    t.ultimo_error = ''
+    t.save(update_fields=['estado', 'intentos', 'bloqueada_hasta', 'ultimo_error', 'fecha_actualizacion'])
+    return True
+
+
+def procesar_pendientes(tamano=10, tipos=None):
+    """Toma y ejecuta un lote. Devuelve la cantidad de tareas procesadas."""
+    lote = tomar_lote(tamano, tipos)
+    for t in lote:
+        # Las tareas anteriores del lote pudieron consumir el arriendo de esta
+        if not renovar_arriendo(t):
+            logger.warning("Tarea %s: arriendo perdido antes de empezar, la retoma otro worker", t)
+            continue
+        ejecutar(t)
+    return len(lote)
@@ -1,3 +1,1366 @@
-from django.test import TestCase
+# core/tests.py
 
-# Create your tests here.
+import base64
+import csv
+import io
+import json
+import os
+import shutil
+import smtplib
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail.backends import locmem
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from . import (
+    boletas, busqueda, cache_tryon, consola_ordenes, contadores, correo, eventos, exportaciones, inferencia,
+    notificaciones, numeracion, rollups, segmentacion, tareas, transiciones, tryon,
+)
+from .catalogo import ConsultaCatalogo, presupuesto_consultas, version_catalogo
+from .conversion import conversion_tryon
+from .fotos_tryon import FotoInvalida, preparar_foto
+from .inventario import alertas_stock, enviar_digest_stock, resumen_alerta
+from .models import (
+    Carrito, CircuitoInferencia, ContadorServicio, Direccion, DocumentoBusqueda, ItemCarrito, ItemOrden, Orden,
+    Producto, RegistroTryOn, ResultadoTryOn, SecuenciaNumeracion, SegmentoCliente, Tarea, TrabajoTryOn, Variante,
+    VentaDiariaEstado, VentaDiariaProducto,
+)
+from .ordenes import CarritoVacio, materializar_orden
+from .paginacion import paginar_keyset
+from .reportes import reporte_periodo
+from .stock import StockInsuficiente, reservar_stock
+
+
+def crear_orden(usuario, estado='PENDIENTE', total=10000, email='cliente@modaone.cl'):
+    return Orden.objects.create(
+        usuario=usuario, email=email, subtotal=total, costo_envio=0,
+        total_final=total, estado=estado, direccion_envio='Calle 123, Santiago',
+    )
+
+
+def directorio_temporal(test):
+    """Carpeta temporal que se borra al terminar el test (para no escribir en el repo)."""
+    ruta = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, ruta, ignore_errors=True)
+    return ruta
+
+
+def almacenes_temporales(test):
+    """Resultados del probador y boletas en carpetas temporales durante el test. Devuelve la de resultados."""
+    resultados = directorio_temporal(test)
+    ajustes = override_settings(
+        TRYON_RESULTADOS_ROOT=resultados, TRYON_RESULTADOS_STORAGE=None,
+        BOLETAS_ROOT=directorio_temporal(test), BOLETAS_STORAGE=None,
+    )
+    ajustes.enable()
+    test.addCleanup(ajustes.disable)
+    for almacen in (cache_tryon.almacen, boletas.almacen):
+        almacen.cache_clear()
+        test.addCleanup(almacen.cache_clear)
+    return resultados
+
+
+# ==========================================
+# --- 1. SEGMENTACIÓN (snapshot SegmentoCliente) ---
+# ==========================================
+
+class RefrescoSegmentosTests(TestCase):
+
+    def setUp(self):
+        self.producto = Producto.objects.create(nombre='Polera', precio=15000, descripcion='Algodón')
+
+    def test_registro_crea_snapshot(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            cliente = User.objects.create_user('ana', password='x')
+        self.assertEqual(SegmentoCliente.objects.get(usuario=cliente).segmento, 'nuevo')
+
+    def test_orden_y_pruebas_actualizan_snapshot_existente(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            cliente = User.objects.create_user('ana', password='x')
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(4):
+                RegistroTryOn.objects.create(producto=self.producto, usuario=cliente)
+        self.assertEqual(SegmentoCliente.objects.get(usuario=cliente).segmento, 'curioso')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            crear_orden(cliente, estado='CONFIRMADO', total=60000)
+        snapshot = SegmentoCliente.objects.get(usuario=cliente)
+        self.assertEqual(snapshot.segmento, 'vip')
+        self.assertEqual(snapshot.total_gastado, Decimal(60000))
+        self.assertEqual(SegmentoCliente.objects.count(), 1)
+
+    def test_reconstruccion_completa_actualiza_y_saca_staff(self):
+        cliente = User.objects.create_user('ana', password='x')
+        staff = User.objects.create_user('admin', password='x', is_staff=True)
+        SegmentoCliente.objects.create(usuario=cliente, segmento='vip')
+        SegmentoCliente.objects.create(usuario=staff, segmento='nuevo')
+
+        self.assertEqual(segmentacion.reconstruir_segmentos(lote=1), 1)
+        self.assertEqual(list(SegmentoCliente.objects.values_list('usuario_id', 'segmento')), [(cliente.id, 'nuevo')])
+
+
+class ReglasSegmentacionTests(TestCase):
+
+    def setUp(self):
+        self.producto = Producto.objects.create(nombre='Polera', precio=15000, descripcion='Algodón')
+
+    def cliente(self, nombre, *totales, pruebas=0, dias=0, estado='CONFIRMADO'):
+        usuario = User.objects.create_user(nombre)
+        for total in totales:
+            orden = crear_orden(usuario, estado=estado, total=total)
+            Orden.objects.filter(id=orden.id).update(fecha_creacion=timezone.now() - timedelta(days=dias))
+        RegistroTryOn.objects.bulk_create([RegistroTryOn(producto=self.producto, usuario=usuario) for _ in range(pruebas)])
+        return usuario
+
+    def test_reglas_en_orden_de_prioridad(self):
+        esperado = {
+            self.cliente('gasta', 60000): 'vip',
+            self.cliente('frecuente', 1000, 1000, 1000, dias=90): 'vip',
+            self.cliente('curiosa', pruebas=4): 'curioso',
+            self.cliente('prueba_y_compra', 1000, pruebas=4): 'cliente',
+            self.cliente('olvidada', 1000, dias=61): 'inactivo',
+            self.cliente('reciente', 1000, dias=59): 'cliente',
+            self.cliente('sin_pagar', 90000, estado='PENDIENTE'): 'nuevo',
+        }
+        User.objects.create_user('admin', is_staff=True)
+        segmentos = {u: u.segmento for u in segmentacion.clientes_con_metricas()}
+        self.assertEqual(segmentos, esperado)
+
+    def test_panel_filtra_y_pagina_el_snapshot(self):
+        for i in range(5):
+            self.cliente(f'vip{i}', 60000 + i * 1000)
+        self.cliente('nueva')
+        segmentacion.reconstruir_segmentos()
+        self.client.force_login(User.objects.create_user('staff', is_staff=True))
+
+        with mock.patch.object(segmentacion, 'CLIENTES_POR_PAGINA', 2):
+            respuesta = self.client.get(reverse('panel_clientes'), {'segmento': 'vip', 'page': 3})
+        self.assertEqual([c['usuario'].username for c in respuesta.context['clientes']], ['vip0'])
+        self.assertEqual(respuesta.context['pagina'].paginator.num_pages, 3)
+        self.assertIn(('vip', segmentacion.SEGMENTOS['vip'][0], 5), respuesta.context['segmentos'])
+
+        respuesta = self.client.get(reverse('panel_clientes'), {'segmento': 'otro'})
+        self.assertEqual(respuesta.context['segmento_actual'], '')
+        self.assertEqual(len(respuesta.context['clientes']), 6)
+
+
+# ==========================================
+# --- 2. COLA DE TAREAS (arriendos) ---
+# ==========================================
+
+@override_settings(TRYON_CLIENTE_FALSO=True)
+class ArriendoTareasTests(TestCase):
+
+    def setUp(self):
+        almacenes_temporales(self)
+
+    def test_tryon_se_toma_de_a_una_por_lote(self):
+        for i in range(3):
+            tareas.encolar('tryon', {'trabajo_id': str(i)})
+        tareas.encolar('correo_prueba')
+        lote = tareas.tomar_lote(10, ['tryon', 'correo_prueba'])
+        self.assertEqual(sorted(t.tipo for t in lote), ['correo_prueba', 'tryon'])
+        self.assertEqual(Tarea.objects.filter(tipo='tryon', estado='PENDIENTE').count(), 2)
+
+    def test_tarea_retomada_por_otro_worker_no_se_ejecuta(self):
+        tareas.encolar('tryon', {'trabajo_id': 'x'})
+        (t,) = tareas.tomar_lote(10, ['tryon'])
+        # El arriendo venció y otro worker la tomó
+        Tarea.objects.filter(id=t.id).update(bloqueada_hasta=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(len(tareas.tomar_lote(10, ['tryon'])), 1)
+        self.assertFalse(tareas.renovar_arriendo(t))
+
+    def test_trabajo_procesando_no_crea_otra_prediccion(self):
+        trabajo = TrabajoTryOn.objects.create(
+            estado='PROCESANDO', imagen_usuario='data:,', imagen_prenda='https://x/p.jpg', clave='c' * 64,
+        )
+        with mock.patch.object(tryon, 'ejecutar_prediccion') as prediccion:
+            tryon.procesar_trabajo(str(trabajo.id))
+        prediccion.assert_not_called()
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, 'PROCESANDO')
+
+        # Sin cupo ni avances por más de un arriendo: su worker murió
+        TrabajoTryOn.objects.filter(id=trabajo.id).update(fecha_actualizacion=timezone.now() - timedelta(minutes=5))
+        trabajo.refresh_from_db()
+        tryon.procesar_trabajo(str(trabajo.id))
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, 'FALLIDO')
+
+
+@tareas.tarea('prueba')
+def tarea_de_prueba(falla=None, posponer=None):
+    if posponer:
+        raise tareas.Posponer(posponer)
+    if falla:
+        raise RuntimeError(falla)
+
+
+class ColaTareasTests(TestCase):
+
+    def test_clave_hace_idempotente_el_encolado(self):
+        primera = tareas.encolar('prueba', clave='boleta:1')
+        self.assertEqual(tareas.encolar('prueba', clave='boleta:1'), primera)
+        Tarea.objects.filter(id=primera.id).update(estado='COMPLETADA')
+        self.assertEqual(tareas.encolar('prueba', clave='boleta:1'), primera)
+
+    def test_solo_pendiente_libera_la_clave_de_una_tarea_que_ya_corrio(self):
+        primera = tareas.encolar('prueba', clave='estado:1', solo_pendiente=True)
+        self.assertEqual(tareas.encolar('prueba', clave='estado:1', solo_pendiente=True), primera)
+        for estado in ('EN_CURSO', 'COMPLETADA'):
+            Tarea.objects.filter(clave='estado:1').update(estado=estado)
+            nueva = tareas.encolar('prueba', clave='estado:1', solo_pendiente=True)
+            self.assertEqual(nueva.estado, 'PENDIENTE')
+        self.assertEqual(Tarea.objects.filter(tipo='prueba').count(), 3)
+
+    def test_arriendo_impide_que_otro_worker_la_tome(self):
+        tarea = tareas.encolar('prueba')
+        (tomada,) = tareas.tomar_lote()
+        self.assertEqual((tomada.id, tomada.estado), (tarea.id, 'EN_CURSO'))
+        self.assertEqual(tareas.tomar_lote(), [])
+        Tarea.objects.filter(id=tarea.id).update(bloqueada_hasta=timezone.now() - timedelta(seconds=1))
+        self.assertEqual([t.id for t in tareas.tomar_lote()], [tarea.id])
+
+    def test_reintentos_con_backoff_hasta_fallida(self):
+        tarea = tareas.encolar('prueba', {'falla': 'smtp caído'}, max_intentos=2)
+        self.assertEqual(tareas.procesar_pendientes(), 1)
+        tarea.refresh_from_db()
+        self.assertEqual((tarea.estado, tarea.intentos), ('PENDIENTE', 1))
+        self.assertIn('smtp caído', tarea.ultimo_error)
+        self.assertGreater(tarea.ejecutar_despues, timezone.now() + timedelta(seconds=20))
+
+        Tarea.objects.filter(id=tarea.id).update(ejecutar_despues=timezone.now())
+        tareas.procesar_pendientes()
+        tarea.refresh_from_db()
+        self.assertEqual((tarea.estado, tarea.intentos, tarea.bloqueada_hasta), ('FALLIDA', 2, None))
+
+    def test_posponer_no_gasta_intentos_y_exito_completa(self):
+        tarea = tareas.encolar('prueba', {'posponer': 30})
+        tareas.procesar_pendientes()
+        tarea.refresh_from_db()
+        self.assertEqual((tarea.estado, tarea.intentos), ('PENDIENTE', 0))
+
+        Tarea.objects.filter(id=tarea.id).update(payload={}, ejecutar_despues=timezone.now())
+        tareas.procesar_pendientes()
+        tarea.refresh_from_db()
+        self.assertEqual((tarea.estado, tarea.intentos), ('COMPLETADA', 1))
+
+    def test_tipo_sin_handler_falla(self):
+        tarea = tareas.encolar('desconocida', max_intentos=1)
+        tareas.procesar_pendientes()
+        tarea.refresh_from_db()
+        self.assertEqual(tarea.estado, 'FALLIDA')
+        self.assertIn("No hay handler registrado para 'desconocida'", tarea.ultimo_error)
+
+
+class NotificacionesOrdenTests(TestCase):
+
+    def setUp(self):
+        correo.cerrar()
+        self.addCleanup(correo.cerrar)
+
+    def test_volver_a_un_estado_vuelve_a_notificar(self):
+        orden = crear_orden(None, estado='DESPACHO')
+        notificaciones.encolar_notificaciones_lote([orden])
+        notificaciones.encolar_notificaciones_lote([orden])
+        self.assertEqual(Tarea.objects.filter(tipo='notificar_estados_lote').count(), 1)
+
+        tareas.procesar_pendientes()
+        notificaciones.encolar_notificaciones_lote([orden])
+        tareas.procesar_pendientes()
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_boleta_se_envia_desde_el_worker(self):
+        with override_settings(BOLETAS_ROOT=directorio_temporal(self)):
+            boletas.almacen.cache_clear()
+            self.addCleanup(boletas.almacen.cache_clear)
+            orden = crear_orden(User.objects.create_user('ana', first_name='Ana'), estado='CONFIRMADO')
+            notificaciones.encolar_boleta(orden)
+            notificaciones.encolar_boleta(orden)
+            self.assertEqual(mail.outbox, [])
+            self.assertEqual(tareas.procesar_pendientes(), 1)
+
+        (enviado,) = mail.outbox
+        self.assertEqual(enviado.to, ['cliente@modaone.cl'])
+        nombre, contenido, tipo = enviado.attachments[0]
+        self.assertEqual((nombre, tipo), (f'boleta_{orden.numero_orden}.pdf', 'application/pdf'))
+        self.assertTrue(contenido.startswith(b'%PDF'))
+
+
+# ==========================================
+# --- 3. CORREO (envío por mensaje) ---
+# ==========================================
+
+class BackendSmtpFalso(locmem.EmailBackend):
+    """Rechaza 'rechazado@...' y corta la conexión con 'caida@...' (también al reintentar)."""
+
+    def send_messages(self, messages):
+        for m in messages:
+            if m.to[0].startswith('rechazado@'):
+                raise smtplib.SMTPRecipientsRefused({m.to[0]: (550, b'No existe')})
+            if m.to[0].startswith('caida@'):
+                raise smtplib.SMTPServerDisconnected('Conexión cerrada')
+        return super().send_messages(messages)
+
+
+@override_settings(EMAIL_BACKEND='core.tests.BackendSmtpFalso')
+class EnvioCorreoTests(TestCase):
+
+    def setUp(self):
+        correo.cerrar()
+        self.addCleanup(correo.cerrar)
+
+    def test_lote_reencola_solo_lo_que_no_salio(self):
+        ordenes = [
+            crear_orden(None, estado='CONFIRMADO', email=email)
+            for email in ('uno@modaone.cl', 'rechazado@modaone.cl', 'caida@modaone.cl', 'dos@modaone.cl')
+        ]
+        notificaciones.notificar_estados_lote([[o.id, 'CONFIRMADO'] for o in ordenes])
+
+        self.assertEqual([m.to for m in mail.outbox], [['uno@modaone.cl']])
+        reencolada = Tarea.objects.get(tipo='notificar_estados_lote')
+        self.assertEqual(reencolada.payload['pares'], [[ordenes[2].id, 'CONFIRMADO'], [ordenes[3].id, 'CONFIRMADO']])
+
+    def test_sin_envios_la_tarea_se_reintenta_entera(self):
+        orden = crear_orden(None, estado='CONFIRMADO', email='caida@modaone.cl')
+        with self.assertRaises(smtplib.SMTPServerDisconnected):
+            notificaciones.notificar_estados_lote([[orden.id, 'CONFIRMADO']])
+        self.assertFalse(Tarea.objects.filter(tipo='notificar_estados_lote').exists())
+
+    def test_estadisticas_se_leen_de_la_base(self):
+        correo.enviar([mail.EmailMessage('Hola', 'Texto', 'tienda@modaone.cl', ['uno@modaone.cl'])])
+        correo.enviar([mail.EmailMessage('Hola', 'Texto', 'tienda@modaone.cl', ['rechazado@modaone.cl'])])
+        stats = correo.estadisticas()
+        self.assertEqual((stats['enviados'], stats['fallidos'], stats['lotes']), (1, 1, 2))
+        self.assertEqual(ContadorServicio.objects.get(nombre=correo.CLAVE_ENVIADOS).valor, 1)
+        self.assertEqual(stats['conexiones_abiertas'], 1)
+
+    def test_contadores_se_escriben_una_vez_por_lote(self):
+        def mensajes(*destinos):
+            return [mail.EmailMessage('Hola', 'Texto', 'tienda@modaone.cl', [d]) for d in destinos]
+
+        correo.enviar(mensajes('uno@modaone.cl', 'rechazado@modaone.cl'))
+        with self.assertNumQueries(1):
+            correo.enviar(mensajes('dos@modaone.cl', 'rechazado@modaone.cl', 'tres@modaone.cl'))
+        stats = correo.estadisticas()
+        self.assertEqual((stats['enviados'], stats['fallidos'], stats['lotes']), (3, 2, 2))
+
+    def test_contadores_con_filas_borradas(self):
+        contadores.registrar(sumas={'prueba:a': 2}, maximos={'prueba:max': 7})
+        ContadorServicio.objects.filter(nombre='prueba:a').delete()
+        contadores.registrar(sumas={'prueba:a': 3}, maximos={'prueba:max': 5})
+        self.assertEqual(contadores.leer('prueba:a', 'prueba:max'), {'prueba:a': 3, 'prueba:max': 7})
+
+
+# ==========================================
+# --- 4. GATEWAY DE INFERENCIA ---
+# ==========================================
+
+@override_settings(INFERENCIA_UMBRAL_FALLOS=2, INFERENCIA_ENFRIAMIENTO=60, INFERENCIA_CONCURRENCIA=1)
+class GatewayInferenciaTests(TestCase):
+
+    def setUp(self):
+        inferencia._fila = (0.0, [])
+
+    def crear_trabajo(self, usuario):
+        return TrabajoTryOn.objects.create(
+            usuario=usuario, imagen_usuario='data:,', imagen_prenda='https://x/p.jpg', clave=str(usuario.id) * 8,
+        )
+
+    def test_fila_justa_intercala_usuarios(self):
+        ana, beto = User.objects.create_user('ana'), User.objects.create_user('beto')
+        de_ana = [self.crear_trabajo(ana) for _ in range(3)]
+        de_beto = self.crear_trabajo(beto)
+        self.assertEqual(inferencia.fila_justa(), [de_ana[0].id, de_beto.id, de_ana[1].id, de_ana[2].id])
+
+    def test_sin_turno_se_pospone(self):
+        ana, beto = User.objects.create_user('ana'), User.objects.create_user('beto')
+        primero, segundo = self.crear_trabajo(ana), self.crear_trabajo(beto)
+        with self.assertRaises(tareas.Posponer):
+            with inferencia.turno(segundo):
+                pass
+        with inferencia.turno(primero):
+            self.assertEqual(inferencia.cupos_libres(), 0)
+        self.assertEqual(inferencia.cupos_libres(), 1)
+
+    def test_circuito_compartido_abre_y_cierra(self):
+        for _ in range(2):
+            inferencia._registrar_fallo()
+        self.assertTrue(inferencia.circuito_abierto())
+        self.assertEqual(inferencia.estadisticas()['circuito'], 'abierto')
+
+        # Vencido el enfriamiento pasa una sola llamada de prueba
+        CircuitoInferencia.objects.update(abierto_hasta=timezone.now() - timedelta(seconds=1))
+        self.assertFalse(inferencia.circuito_abierto())
+        self.assertTrue(inferencia.circuito_abierto())
+
+        inferencia._registrar_exito(1200)
+        self.assertFalse(inferencia.circuito_abierto())
+        stats = inferencia.estadisticas()
+        self.assertEqual((stats['circuito'], stats['ejecuciones'], stats['fallos']), ('cerrado', 1, 2))
+
+
+# ==========================================
+# --- 5. BUFFER DE EVENTOS ---
+# ==========================================
+
+@override_settings(EVENTOS_LOTE=1000, EVENTOS_MAX_BUFFER=3)
+class BufferEventosTests(TestCase):
+
+    def setUp(self):
+        self.producto = Producto.objects.create(nombre='Polera', precio=15000, descripcion='Algodón')
+        # Sin hilo de fondo: el test vacía el buffer a mano
+        iniciar = mock.patch.object(eventos, '_iniciar')
+        iniciar.start()
+        self.addCleanup(iniciar.stop)
+        eventos.vaciar()
+
+    def test_registrar_respeta_el_tope(self):
+        for _ in range(5):
+            eventos.registrar('vista', self.producto.id)
+        self.assertEqual(eventos.pendientes(), 3)
+        self.assertEqual(eventos.vaciar(), 3)
+
+    def test_error_del_refresco_no_pierde_eventos(self):
+        cliente = User.objects.create_user('ana')
+        eventos.registrar('tryon', self.producto.id, cliente.id)
+        with mock.patch.object(segmentacion, 'refrescar_segmentos', side_effect=RuntimeError('base caída')):
+            self.assertEqual(eventos.vaciar(), 1)
+        self.assertEqual(RegistroTryOn.objects.filter(usuario=cliente).count(), 1)
+        self.assertEqual(eventos.pendientes(), 0)
+
+
+# ==========================================
+# --- 6. CAMBIO DE ESTADO DE UNA ORDEN (Estación de Despacho) ---
+# ==========================================
+
+class CambioEstadoOrdenTests(TestCase):
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('admin', is_staff=True))
+        producto = Producto.objects.create(nombre='Polera', precio=15000, descripcion='Algodón')
+        self.variante = Variante.objects.create(producto=producto, talla='M', color='Negro', stock=5)
+
+    def cambiar(self, orden, estado, tracking=''):
+        self.client.post(reverse('cambiar_estado_orden', args=[orden.id]), {'nuevo_estado': estado, 'tracking_id': tracking})
+        orden.refresh_from_db()
+
+    def test_transicion_no_permitida_se_rechaza(self):
+        orden = crear_orden(None, estado='ENTREGADO')
+        self.cambiar(orden, 'PENDIENTE')
+        self.assertEqual(orden.estado, 'ENTREGADO')
+
+    def test_cancelar_devuelve_stock_y_guarda_tracking(self):
+        orden = crear_orden(None, estado='CONFIRMADO')
+        ItemOrden.objects.create(
+            orden=orden, variante=self.variante, nombre_producto='Polera', talla_color='M / Negro',
+            cantidad=2, precio_unitario=15000,
+        )
+        self.cambiar(orden, 'DESPACHO', tracking='TRK-1')
+        self.assertEqual((orden.estado, orden.codigo_seguimiento), ('DESPACHO', 'TRK-1'))
+
+        otra = crear_orden(None, estado='CONFIRMADO')
+        ItemOrden.objects.create(
+            orden=otra, variante=self.variante, nombre_producto='Polera', talla_color='M / Negro',
+            cantidad=2, precio_unitario=15000,
+        )
+        self.cambiar(otra, 'CANCELADO')
+        self.variante.refresh_from_db()
+        self.assertEqual((otra.estado, self.variante.stock), ('CANCELADO', 7))
+
+    def test_cambio_masivo_refresca_segmentos_una_vez(self):
+        clientes = [User.objects.create_user(f'cliente{i}') for i in range(3)]
+        ordenes = [crear_orden(c, estado='CONFIRMADO') for c in clientes]
+        with mock.patch.object(transiciones, 'refrescar_segmentos') as refrescar:
+            with self.captureOnCommitCallbacks(execute=True):
+                transiciones.cambiar_estados('DESPACHO', ids=[o.id for o in ordenes])
+        refrescar.assert_called_once_with({c.id for c in clientes})
+
+
+# ==========================================
+# --- 7. CATÁLOGO ---
+# ==========================================
+
+class CatalogoTests(TestCase):
+
+    def setUp(self):
+        self.productos = [
+            Producto.objects.create(nombre=f'Polera {i}', precio=10000 + i, descripcion='Algodón') for i in range(3)
+        ]
+
+    def test_busqueda_mantiene_orden_por_relevancia(self):
+        # El más antiguo es el más relevante: el orden por fecha lo dejaría último
+        ranking = [p.id for p in self.productos]
+        with mock.patch.object(busqueda, 'buscar', return_value=ranking):
+            respuesta = self.client.get(reverse('home'), {'q': 'polera'})
+        html = respuesta.content.decode()
+        posiciones = [html.index(f'Polera {i}') for i in range(3)]
+        self.assertEqual(posiciones, sorted(posiciones))
+
+    def test_presupuesto_de_consultas_no_depende_del_tamano_de_pagina(self):
+        for producto in Producto.objects.all():
+            for talla in ('S', 'M', 'L'):
+                Variante.objects.create(producto=producto, talla=talla, color='Negro', stock=1)
+        for por_pagina in (1, 3, 50):
+            with presupuesto_consultas(2):
+                pagina = ConsultaCatalogo().pagina(1, por_pagina=por_pagina)
+                self.assertTrue(all(p.hay_stock for p in pagina))
+            with presupuesto_consultas(2):
+                ConsultaCatalogo(categoria='hombre').pagina_cursor(None, por_pagina=por_pagina)
+
+    def test_presupuesto_con_busqueda(self):
+        with mock.patch.object(busqueda, 'buscar', return_value=[p.id for p in self.productos]):
+            with presupuesto_consultas():
+                list(ConsultaCatalogo(q='polera').pagina(1))
+
+    def test_version_cambia_recien_al_confirmar(self):
+        antes = version_catalogo()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.productos[0].save()
+            self.assertEqual(version_catalogo(), antes)
+        self.assertGreater(version_catalogo(), antes)
+
+    def test_presupuesto_falla_si_se_excede(self):
+        with self.assertRaises(AssertionError):
+            with presupuesto_consultas(1):
+                list(Producto.objects.all())
+                list(Variante.objects.all())
+
+
+# ==========================================
+# --- 8. RESERVA DE STOCK ---
+# ==========================================
+
+def crear_variantes(*stocks):
+    producto = Producto.objects.create(nombre='Polera', precio=15000, descripcion='Algodón')
+    return [Variante.objects.create(producto=producto, talla=f'T{i}', color='Negro', stock=s) for i, s in enumerate(stocks)]
+
+
+class ReservaStockTests(TestCase):
+
+    def test_una_linea_sin_stock_revierte_toda_la_orden(self):
+        cliente = User.objects.create_user('ana')
+        direccion = Direccion.objects.create(
+            usuario=cliente, rut='11111111-1', calle='Calle', numero='123', comuna='Santiago', telefono='912345678',
+        )
+        alcanza, falta = crear_variantes(5, 1)
+        carrito = Carrito.objects.create(usuario=cliente)
+        ItemCarrito.objects.create(carrito=carrito, variante=alcanza, cantidad=2, precio_unitario=15000)
+        ItemCarrito.objects.create(carrito=carrito, variante=falta, cantidad=3, precio_unitario=15000)
+
+        with self.assertRaises(StockInsuficiente):
+            materializar_orden(cliente, direccion, '1', 'ana@modaone.cl')
+
+        alcanza.refresh_from_db()
+        falta.refresh_from_db()
+        self.assertEqual((alcanza.stock, falta.stock), (5, 1))
+        self.assertFalse(Orden.objects.exists())
+        self.assertEqual(ItemCarrito.objects.filter(carrito=carrito).count(), 2)
+
+    def test_lineas_de_la_misma_variante_se_suman(self):
+        (variante,) = crear_variantes(3)
+        with self.assertRaises(StockInsuficiente):
+            with transaction.atomic():
+                reservar_stock([(variante.id, 2), (variante.id, 2)])
+        variante.refresh_from_db()
+        self.assertEqual(variante.stock, 3)
+
+
+@skipUnlessDBFeature('test_db_allows_multiple_connections')
+class ReservaStockConcurrenteTests(TransactionTestCase):
+    CHECKOUTS = 24
+
+    def test_checkouts_paralelos_no_venden_de_mas(self):
+        variantes = crear_variantes(10, 10)
+        ids = [v.id for v in variantes]
+        barrera = threading.Barrier(self.CHECKOUTS)
+
+        def checkout(n):
+            # Cada hilo nombra las variantes en distinto orden: los locks se toman igual por id
+            lineas = [(vid, 1) for vid in (ids if n % 2 else reversed(ids))]
+            barrera.wait()
+            try:
+                with transaction.atomic():
+                    reservar_stock(lineas)
+                return True
+            except StockInsuficiente:
+                return False
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=self.CHECKOUTS) as pool:
+            resultados = list(pool.map(checkout, range(self.CHECKOUTS)))
+
+        self.assertEqual(resultados.count(True), 10)
+        self.assertEqual(list(Variante.objects.filter(id__in=ids).values_list('stock', flat=True)), [0, 0])
+
+
+# ==========================================
+# --- 9. NUMERACIÓN DE ÓRDENES ---
+# ==========================================
+
+class NumeracionTests(TransactionTestCase):
+
+    def test_bloques_de_dos_asignadores_no_se_cruzan(self):
+        a = numeracion.AsignadorNumeros('prueba', bloque=5)
+        b = numeracion.AsignadorNumeros('prueba', bloque=5)
+        numeros = [a.siguiente() for _ in range(7)] + [b.siguiente() for _ in range(7)] + [a.siguiente()]
+        self.assertEqual(len(set(numeros)), len(numeros))
+        self.assertEqual(numeros[:5], list(range(numeros[0], numeros[0] + 5)))
+        # Un UPDATE por bloque: dos bloques cada uno
+        self.assertEqual(SecuenciaNumeracion.objects.get(nombre='prueba').siguiente, numeros[0] + 20)
+
+    def test_rollback_externo_no_deja_numeros_en_memoria(self):
+        asignador = numeracion.AsignadorNumeros('orden', bloque=5)
+        with mock.patch.object(numeracion, '_asignador_ordenes', asignador):
+            with self.assertRaises(RuntimeError):
+                with transaction.atomic():
+                    revertida = crear_orden(None)
+                    raise RuntimeError('falla el checkout')
+            # Otro worker reserva después del rollback: no puede recibir un número ya entregado
+            otro = numeracion.AsignadorNumeros('orden', bloque=5)
+            numeros = [otro.siguiente() for _ in range(3)]
+            propios = [crear_orden(None).numero_orden for _ in range(3)]
+        ajenos = [numeracion.formatear_numero_orden(n) for n in numeros]
+        self.assertEqual(len(set(propios + ajenos)), 6)
+        self.assertIn(revertida.numero_orden, ajenos)
+
+    def test_formato(self):
+        self.assertEqual(numeracion.formatear_numero_orden(123, date(2025, 10, 17)), 'MODA-251017-000123')
+
+
+@skipUnlessDBFeature('test_db_allows_multiple_connections')
+class NumeracionConcurrenteTests(TransactionTestCase):
+    WORKERS = 4      # un AsignadorNumeros por "proceso"
+    HILOS = 4        # hilos por worker
+    POR_HILO = 250
+
+    def test_numeros_unicos_entre_workers_e_hilos(self):
+        asignadores = [numeracion.AsignadorNumeros('prueba', bloque=20) for _ in range(self.WORKERS)]
+
+        def pedir(asignador):
+            try:
+                return [asignador.siguiente() for _ in range(self.POR_HILO)]
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=self.WORKERS * self.HILOS) as pool:
+            lotes = list(pool.map(pedir, [a for a in asignadores for _ in range(self.HILOS)]))
+
+        numeros = [n for lote in lotes for n in lote]
+        self.assertEqual(len(numeros), self.WORKERS * self.HILOS * self.POR_HILO)
+        self.assertEqual(len(set(numeros)), len(numeros))
+
+
+# ==========================================
+# --- 10. CACHÉ DEL PROBADOR ---
+# ==========================================
+
+@override_settings(INFERENCIA_ESPERA_MAXIMA=600, TRYON_CACHE_DIAS=30, TRYON_CACHE_MAX=100)
+class CacheTryOnTests(TestCase):
+
+    def setUp(self):
+        self.raiz = almacenes_temporales(self)
+
+    def resultado(self, letra, dias, estado='LISTO'):
+        """Fila LISTO con su archivo en el almacén, usada por última vez hace `dias` días."""
+        clave = letra * 64
+        archivo = cache_tryon.almacen().save(f'{letra * 2}/{clave}.png', ContentFile(b'png')) if estado == 'LISTO' else ''
+        ResultadoTryOn.objects.create(
+            clave=clave, estado=estado, archivo=archivo, tamano=3, ultimo_uso=timezone.now() - timedelta(days=dias),
+        )
+        return clave, archivo
+
+    def test_purga_por_ttl(self):
+        vencida, archivo_vencido = self.resultado('a', 31)
+        vigente, archivo_vigente = self.resultado('b', 29)
+        self.resultado('c', 60, estado='PENDIENTE')
+
+        self.assertEqual(cache_tryon.purgar(), 1)
+        self.assertEqual(set(ResultadoTryOn.objects.values_list('clave', flat=True)), {vigente, 'c' * 64})
+        self.assertFalse(cache_tryon.almacen().exists(archivo_vencido))
+        self.assertTrue(cache_tryon.almacen().exists(archivo_vigente))
+
+    @override_settings(TRYON_CACHE_MAX=2)
+    def test_purga_los_menos_usados_sobre_el_tope(self):
+        antigua, archivo = self.resultado('a', 3)
+        self.resultado('b', 2)
+        self.resultado('c', 1)
+
+        self.assertEqual(cache_tryon.purgar(), 1)
+        self.assertFalse(ResultadoTryOn.objects.filter(clave=antigua).exists())
+        self.assertFalse(cache_tryon.almacen().exists(archivo))
+        self.assertEqual(cache_tryon.purgar(), 0)
+
+    def test_resultado_vencido_lo_vuelve_a_generar_el_siguiente(self):
+        clave, archivo = self.resultado('a', 31)
+        with transaction.atomic():
+            self.assertEqual(cache_tryon.reservar(clave), cache_tryon.LIDER)
+        resultado = ResultadoTryOn.objects.get(clave=clave)
+        self.assertEqual((resultado.estado, resultado.archivo), ('PENDIENTE', ''))
+        self.assertFalse(cache_tryon.almacen().exists(archivo))
+
+    @override_settings(TRYON_CLIENTE_FALSO=True)
+    def test_cliente_falso_guarda_en_la_carpeta_temporal(self):
+        inferencia._fila = (0.0, [])
+        foto = 'data:image/png;base64,' + base64.b64encode(b'png').decode()
+        trabajo = tryon.crear_trabajo(None, foto, 'https://x/p.jpg')
+        with mock.patch.object(tryon, 'INTERVALO_SONDEO', 0):
+            tryon.procesar_trabajo(str(trabajo.id))
+
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, 'COMPLETADO')
+        resultado = ResultadoTryOn.objects.get(clave=trabajo.clave)
+        self.assertTrue(os.path.isfile(os.path.join(self.raiz, resultado.archivo)))
+
+    def test_reserva_de_un_trabajo_que_espera_en_la_fila_no_se_pisa(self):
+        # 15 minutos: más que la espera en la fila, pero el trabajo puede seguir vivo
+        ResultadoTryOn.objects.create(clave='a' * 64, ultimo_uso=timezone.now() - timedelta(minutes=15))
+        with transaction.atomic():
+            self.assertEqual(cache_tryon.reservar('a' * 64), cache_tryon.EN_CURSO)
+
+        ResultadoTryOn.objects.filter(clave='a' * 64).update(
+            ultimo_uso=timezone.now() - cache_tryon.pendiente_maximo() - timedelta(seconds=1)
+        )
+        with transaction.atomic():
+            self.assertEqual(cache_tryon.reservar('a' * 64), cache_tryon.LIDER)
+
+    def test_acierto_revertido_no_registra_la_prueba(self):
+        producto = Producto.objects.create(nombre='Polera', precio=15000, descripcion='Algodón')
+        clave = cache_tryon.clave_resultado('data:,', 'https://x/p.jpg', 'upper_body', tryon.MODELO_TRYON)
+        ResultadoTryOn.objects.create(clave=clave, estado='LISTO', archivo='x.png', ultimo_uso=timezone.now())
+
+        with mock.patch.object(eventos, 'registrar') as registrar:
+            with self.captureOnCommitCallbacks(execute=True):
+                try:
+                    with transaction.atomic():
+                        tryon.crear_trabajo(None, 'data:,', 'https://x/p.jpg', producto_id=producto.id)
+                        raise RuntimeError('falla el request')
+                except RuntimeError:
+                    pass
+            registrar.assert_not_called()
+
+            with self.captureOnCommitCallbacks(execute=True):
+                tryon.crear_trabajo(None, 'data:,', 'https://x/p.jpg', producto_id=producto.id)
+            registrar.assert_called_once_with('tryon', producto.id, None)
+
+
+# ==========================================
+# --- 11. BÚSQUEDA ---
+# ==========================================
+
+class NormalizacionBusquedaTests(SimpleTestCase):
+
+    def test_tildes_plurales_y_stopwords(self):
+        self.assertEqual(busqueda.tokenizar('Camisones de Algodón'), ['camison', 'algodon'])
+        self.assertEqual(busqueda.tokenizar('Poleras y PANTALONES'), ['polera', 'pantalon'])
+        self.assertEqual(busqueda.tokenizar(''), [])
+
+    def test_memoria_solo_con_debug(self):
+        with mock.patch.object(busqueda, '_backend', None), override_settings(BUSQUEDA_BACKEND='memoria'):
+            with self.assertRaises(ImproperlyConfigured):
+                busqueda.obtener_backend()
+            with override_settings(DEBUG=True):
+                self.assertIsInstance(busqueda.obtener_backend(), busqueda.BackendMemoria)
+
+
+class BackendBusquedaMixin:
+    """Mismos casos para cada backend: ranking, prefijos, señales y reindexado."""
+    backend = None
+
+    def setUp(self):
+        backend = mock.patch.object(busqueda, '_backend', self.backend())
+        backend.start()
+        self.addCleanup(backend.stop)
+        self.polera = Producto.objects.create(nombre='Polera Básica', precio=10000, descripcion='Algodón')
+        self.vestido = Producto.objects.create(nombre='Vestido', precio=20000, descripcion='Vestido de algodón con detalle de polera')
+
+    def test_ranking_por_prefijo_con_todos_los_terminos(self):
+        self.assertEqual(busqueda.buscar('Poleras'), [self.polera.id, self.vestido.id])
+        self.assertEqual(busqueda.buscar('pol algodón'), [self.polera.id, self.vestido.id])
+        self.assertEqual(busqueda.buscar('vestido polera'), [self.vestido.id])
+        self.assertEqual(busqueda.buscar('de y'), [])
+
+    def test_editar_y_borrar_actualizan_el_indice(self):
+        self.vestido.nombre, self.vestido.descripcion = 'Falda', 'Lino'
+        self.vestido.save()
+        self.assertEqual(busqueda.buscar('vestido'), [])
+        self.assertEqual(busqueda.buscar('falda'), [self.vestido.id])
+        self.polera.delete()
+        self.assertEqual(busqueda.buscar('polera'), [])
+
+    def test_reindexar_todo(self):
+        DocumentoBusqueda.objects.all().delete()
+        self.assertEqual(busqueda.reindexar_todo(lote=1), 2)
+        self.assertEqual(busqueda.buscar('polera'), [self.polera.id, self.vestido.id])
+
+
+class BackendDocumentosTests(BackendBusquedaMixin, TestCase):
+    backend = busqueda.BackendDocumentos
+
+
+class BackendMemoriaTests(BackendBusquedaMixin, TestCase):
+    backend = busqueda.BackendMemoria
+
+
+class BackendFTS5Tests(BackendBusquedaMixin, TestCase):
+    backend = busqueda.BackendFTS5
+
+    def setUp(self):
+        if not busqueda._fts5_disponible():
+            self.skipTest('Sin tabla FTS5 (solo SQLite con FTS5)')
+        super().setUp()
+
+
+class PaginaBusquedaTests(TestCase):
+
+    def test_total_y_orden_sin_tope_de_resultados(self):
+        productos = [
+            Producto.objects.create(nombre=f'Polera {i}', categoria='hombre', precio=10000, descripcion='Algodón')
+            for i in range(7)
+        ]
+        Producto.objects.create(nombre='Polera mujer', categoria='mujer', precio=10000, descripcion='Algodón')
+        ranking = [p.id for p in reversed(productos)] + [Producto.objects.latest('id').id]
+        with mock.patch.object(busqueda, 'buscar', return_value=ranking):
+            consulta = ConsultaCatalogo(q='polera', categoria='hombre')
+            with presupuesto_consultas():
+                pagina = consulta.pagina(2, por_pagina=3)
+            self.assertEqual(pagina.paginator.count, 7)
+            self.assertEqual([p.id for p in pagina], ranking[3:6])
+            # Fuera de rango: la última página
+            self.assertEqual([p.id for p in consulta.pagina(9, por_pagina=3)], ranking[6:7])
+
+
+# ==========================================
+# --- 12. MATERIALIZACIÓN DE ÓRDENES ---
+# ==========================================
+
+class MaterializacionOrdenTests(TestCase):
+
+    def setUp(self):
+        self.cliente = User.objects.create_user('ana')
+        self.direccion = Direccion.objects.create(
+            usuario=self.cliente, rut='11111111-1', calle='Calle', numero='123', comuna='Santiago', telefono='912345678',
+        )
+        self.carrito = Carrito.objects.create(usuario=self.cliente)
+
+    def llenar_carrito(self, lineas):
+        variantes = crear_variantes(*[5] * lineas)
+        for v in variantes:
+            ItemCarrito.objects.create(carrito=self.carrito, variante=v, cantidad=2, precio_unitario=15000)
+        return variantes
+
+    def test_orden_con_snapshots_y_carrito_conservado(self):
+        variantes = self.llenar_carrito(3)
+        orden = materializar_orden(self.cliente, self.direccion, '1', 'ana@modaone.cl')
+
+        self.assertEqual((orden.subtotal, orden.costo_envio, orden.total_final), (90000, 5990, 95990))
+        self.assertEqual((orden.estado, orden.direccion_envio), ('PENDIENTE', 'Calle #123, Santiago'))
+        self.assertEqual(
+            list(orden.items_orden.order_by('id').values_list('nombre_producto', 'talla_color', 'cantidad')),
+            [('Polera', f'T{i}/Negro', 2) for i in range(3)],
+        )
+        self.assertEqual([Variante.objects.get(id=v.id).stock for v in variantes], [3, 3, 3])
+        self.assertFalse(ItemCarrito.objects.filter(carrito=self.carrito).exists())
+        self.assertTrue(Carrito.objects.filter(id=self.carrito.id, usuario=self.cliente).exists())
+
+    def test_consultas_no_dependen_de_las_lineas(self):
+        consultas = []
+        numeros = [f'MODA-000001-00000{i}' for i in range(3)]
+        with mock.patch('core.ordenes.siguiente_numero_orden', side_effect=numeros):
+            # La primera orden del día crea la fila del rollup por estado
+            for lineas in (1, 1, 8):
+                self.llenar_carrito(lineas)
+                with CaptureQueriesContext(connection) as capturadas:
+                    materializar_orden(self.cliente, self.direccion, '2', 'ana@modaone.cl')
+                consultas.append(len(capturadas))
+        self.assertEqual(consultas[1], consultas[2])
+        self.assertEqual(ItemOrden.objects.count(), 10)
+
+    def test_carrito_vacio_no_crea_orden(self):
+        with self.assertRaises(CarritoVacio):
+            materializar_orden(self.cliente, self.direccion, '1', 'ana@modaone.cl')
+        self.assertFalse(Orden.objects.exists())
+
+
+# ==========================================
+# --- 13. BOLETAS PDF (almacén por contenido) ---
+# ==========================================
+
+class BoletasTests(TestCase):
+
+    def setUp(self):
+        ajustes = override_settings(BOLETAS_ROOT=directorio_temporal(self), BOLETAS_STORAGE=None)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        boletas.almacen.cache_clear()
+        self.addCleanup(boletas.almacen.cache_clear)
+        self.cliente = User.objects.create_user('ana', password='x', first_name='Ana')
+        self.orden = crear_orden(self.cliente, estado='CONFIRMADO')
+
+    def cargar(self):
+        return Orden.objects.select_related('usuario').prefetch_related('items_orden').get(id=self.orden.id)
+
+    def test_se_renderiza_una_vez_por_version_y_purga_las_anteriores(self):
+        with mock.patch.object(boletas, 'renderizar_pdf', wraps=boletas.renderizar_pdf) as renderizar:
+            nombre, huella = boletas.obtener_boleta(self.cargar())
+            self.assertEqual(boletas.obtener_boleta(self.cargar()), (nombre, huella))
+            self.assertEqual(renderizar.call_count, 1)
+
+            Orden.objects.filter(id=self.orden.id).update(estado='DESPACHO')
+            nuevo, otra_huella = boletas.obtener_boleta(self.cargar())
+            self.assertEqual(renderizar.call_count, 2)
+        self.assertNotEqual(otra_huella, huella)
+        self.assertEqual(boletas.almacen().listdir(str(self.orden.id))[1], [f'{otra_huella}.pdf'])
+
+    def test_descarga_con_etag_y_304(self):
+        self.client.force_login(self.cliente)
+        url = reverse('descargar_boleta', args=[self.orden.id])
+        respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertTrue(b''.join(respuesta.streaming_content).startswith(b'%PDF'))
+        self.assertEqual(respuesta['ETag'], f'"{boletas.huella(self.cargar())}"')
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=respuesta['ETag']).status_code, 304)
+        Orden.objects.filter(id=self.orden.id).update(estado='DESPACHO')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=respuesta['ETag']).status_code, 200)
+
+    def test_solo_el_dueno_descarga(self):
+        self.client.force_login(User.objects.create_user('beto', password='x'))
+        self.assertEqual(self.client.get(reverse('descargar_boleta', args=[self.orden.id])).status_code, 404)
+
+
+# ==========================================
+# --- 14. ROLLUPS DE VENTAS ---
+# ==========================================
+
+class RollupsVentasTests(TestCase):
+
+    def setUp(self):
+        self.cliente = User.objects.create_user('ana')
+        self.direccion = Direccion.objects.create(
+            usuario=self.cliente, rut='11111111-1', calle='Calle', numero='123', comuna='Santiago', telefono='912345678',
+        )
+        self.carrito = Carrito.objects.create(usuario=self.cliente)
+        # Dos productos distintos con el mismo nombre
+        (self.negra,) = crear_variantes(10)
+        (self.blanca,) = crear_variantes(10)
+
+    def comprar(self, *lineas):
+        for variante, cantidad in lineas:
+            ItemCarrito.objects.create(carrito=self.carrito, variante=variante, cantidad=cantidad, precio_unitario=15000)
+        return materializar_orden(self.cliente, self.direccion, '2', 'ana@modaone.cl')
+
+    def filas(self):
+        return sorted(
+            VentaDiariaProducto.objects.exclude(unidades=0, lineas=0, monto=0)
+            .values_list('estado', 'producto_id', 'nombre_producto', 'unidades', 'lineas', 'monto'),
+            key=lambda f: (f[0], f[1] or 0),
+        )
+
+    def test_orden_suma_por_producto_aunque_compartan_nombre(self):
+        self.comprar((self.negra, 2), (self.blanca, 1))
+        self.assertEqual(self.filas(), [
+            ('PENDIENTE', self.negra.producto_id, 'Polera', 2, 1, 30000),
+            ('PENDIENTE', self.blanca.producto_id, 'Polera', 1, 1, 15000),
+        ])
+        self.assertEqual(rollups.resumen_ventas(), {'ordenes': 1, 'monto': 48990})
+
+    def test_cambios_de_estado_mueven_y_cancelar_descuenta(self):
+        orden = self.comprar((self.negra, 2), (self.blanca, 1))
+        transiciones.cambiar_estados('CONFIRMADO', ids=[orden.id])
+        self.assertEqual([f[0] for f in self.filas()], ['CONFIRMADO', 'CONFIRMADO'])
+        self.assertEqual(rollups.ranking_productos(estados=rollups.ESTADOS_VENTA), [
+            {'producto_id': self.negra.producto_id, 'nombre_producto': 'Polera', 'total_vendido': 2},
+            {'producto_id': self.blanca.producto_id, 'nombre_producto': 'Polera', 'total_vendido': 1},
+        ])
+
+        transiciones.cambiar_estados('CANCELADO', ids=[orden.id])
+        self.assertEqual({f[0] for f in self.filas()}, {'CANCELADO'})
+        self.assertEqual(rollups.resumen_ventas(excluir=['PENDIENTE', 'CANCELADO']), {'ordenes': 0, 'monto': 0})
+        self.assertEqual(rollups.ranking_productos(estados=rollups.ESTADOS_VENTA), [])
+
+    def test_producto_renombrado_sigue_en_una_fila(self):
+        self.comprar((self.negra, 1))
+        Producto.objects.filter(id=self.negra.producto_id).update(nombre='Polera Negra')
+        self.comprar((self.negra, 2))
+        self.assertEqual(VentaDiariaProducto.objects.filter(producto_id=self.negra.producto_id).count(), 1)
+        self.assertEqual(rollups.ranking_productos(), [
+            {'producto_id': self.negra.producto_id, 'nombre_producto': 'Polera Negra', 'total_vendido': 3},
+        ])
+
+    def test_producto_borrado_se_sigue_moviendo_por_nombre(self):
+        orden = self.comprar((self.negra, 2), (self.blanca, 1))
+        Producto.objects.filter(id=self.negra.producto_id).delete()
+        transiciones.cambiar_estados('CONFIRMADO', ids=[orden.id])
+        self.assertEqual(self.filas(), [
+            ('CONFIRMADO', None, 'Polera', 2, 1, 30000),
+            ('CONFIRMADO', self.blanca.producto_id, 'Polera', 1, 1, 15000),
+        ])
+
+    def test_reconstruir_coincide_con_lo_incremental(self):
+        primera = self.comprar((self.negra, 2), (self.blanca, 1))
+        segunda = self.comprar((self.negra, 1))
+        transiciones.cambiar_estados('CONFIRMADO', ids=[primera.id, segunda.id])
+        transiciones.cambiar_estados('CANCELADO', ids=[segunda.id])
+        incremental = self.filas()
+        estados = sorted(VentaDiariaEstado.objects.exclude(ordenes=0).values_list('estado', 'ordenes', 'monto'))
+
+        self.assertEqual(rollups.reconstruir(), (2, 3))
+        self.assertEqual(self.filas(), incremental)
+        self.assertEqual(sorted(VentaDiariaEstado.objects.values_list('estado', 'ordenes', 'monto')), estados)
+
+
+# ==========================================
+# --- 15. CONVERSIÓN DEL PROBADOR ---
+# ==========================================
+
+class ConversionTryOnTests(TestCase):
+
+    def test_productos_con_el_mismo_nombre_no_comparten_ventas(self):
+        negra, blanca = crear_variantes(10)[0], crear_variantes(10)[0]
+        for variante, pruebas in ((negra, 4), (blanca, 1)):
+            RegistroTryOn.objects.bulk_create([RegistroTryOn(producto_id=variante.producto_id) for _ in range(pruebas)])
+        orden = crear_orden(None, estado='CONFIRMADO')
+        items = ItemOrden.objects.bulk_create([
+            ItemOrden(orden=orden, variante=v, nombre_producto='Polera', talla_color='T0/Negro', cantidad=c, precio_unitario=15000)
+            for v, c in ((negra, 1), (blanca, 3))
+        ])
+        rollups.registrar_orden(orden, items)
+
+        filas = {f['producto_id']: f for f in conversion_tryon()}
+        self.assertEqual(
+            [(filas[v.producto_id]['veces_probado'], filas[v.producto_id]['ventas_reales']) for v in (negra, blanca)],
+            [(4, 1), (1, 3)],
+        )
+        self.assertEqual(filas[blanca.producto_id]['tasa_conversion'], 300.0)
+        self.assertEqual([f['producto_id'] for f in conversion_tryon(ordenar='ventas')], [blanca.producto_id, negra.producto_id])
+
+
+# ==========================================
+# --- 16. ALERTAS DE STOCK POR VELOCIDAD ---
+# ==========================================
+
+class AlertasStockTests(TestCase):
+
+    def setUp(self):
+        correo.cerrar()
+        self.addCleanup(correo.cerrar)
+
+    def vender(self, variante, cantidad, dias=1, estado='CONFIRMADO'):
+        orden = crear_orden(None, estado=estado)
+        Orden.objects.filter(id=orden.id).update(fecha_creacion=timezone.now() - timedelta(days=dias))
+        ItemOrden.objects.create(
+            orden=orden, variante=variante, nombre_producto='Polera', talla_color='-', cantidad=cantidad, precio_unitario=15000,
+        )
+
+    def test_alerta_por_cobertura_o_stock_critico(self):
+        rapida, critica, holgada, quieta, agotada, cancelada, antigua = crear_variantes(20, 3, 100, 2, 0, 10, 10)
+        self.vender(rapida, 60)      # 2/día, 10 días de cobertura
+        self.vender(critica, 1)      # 90 días, pero quedan 3
+        self.vender(holgada, 30)     # 100 días
+        self.vender(agotada, 10)
+        self.vender(cancelada, 30, estado='CANCELADO')
+        self.vender(antigua, 30, dias=40)
+
+        with self.assertNumQueries(1):
+            alertas = alertas_stock()
+        self.assertEqual(alertas, [rapida, critica])
+        self.assertEqual(resumen_alerta(alertas[0]), {
+            'variante_id': rapida.id, 'producto_id': rapida.producto_id, 'producto': 'Polera', 'talla': 'T0',
+            'color': 'Negro', 'stock': 20, 'vendidas': 60, 'velocidad_diaria': 2.0, 'dias_cobertura': 10.0,
+        })
+        self.assertEqual(alertas_stock(limite=1), [rapida])
+
+    def test_digest_solo_si_hay_alertas(self):
+        (variante,) = crear_variantes(4)
+        self.assertEqual(enviar_digest_stock(['bodega@modaone.cl']), 0)
+        self.assertEqual(mail.outbox, [])
+
+        self.vender(variante, 3)
+        self.assertEqual(enviar_digest_stock(['bodega@modaone.cl']), 1)
+        (enviado,) = mail.outbox
+        self.assertEqual(enviado.subject, 'ModaOne | 1 alertas de stock')
+        self.assertIn('Polera (T0/Negro): quedan 4', enviado.body)
+
+
+# ==========================================
+# --- 17. REPORTES POR PERÍODO ---
+# ==========================================
+
+class ReportesPeriodoTests(TestCase):
+    HOY = date(2026, 10, 17)
+
+    def setUp(self):
+        self.polera = Producto.objects.create(nombre='Polera', precio=15000, descripcion='Algodón')
+        self.parka = Producto.objects.create(nombre='Parka', precio=90000, descripcion='Pluma')
+
+    def venta(self, producto, fecha, unidades, estado='CONFIRMADO'):
+        VentaDiariaProducto.objects.create(
+            fecha=fecha, mes=fecha.month, estado=estado, producto=producto, nombre_producto=producto.nombre,
+            unidades=unidades, lineas=unidades, monto=unidades * producto.precio,
+        )
+
+    def test_ranking_del_periodo(self):
+        self.venta(self.polera, date(2026, 10, 12), 3)
+        self.venta(self.parka, date(2026, 10, 17), 1)
+        self.venta(self.parka, date(2026, 10, 16), 5, estado='PENDIENTE')
+        self.venta(self.parka, date(2026, 9, 1), 9)   # fuera del último mes
+
+        with self.assertNumQueries(2):
+            reporte = reporte_periodo('mes', hoy=self.HOY)
+        self.assertEqual(reporte['titulo'], 'Último Mes')
+        self.assertEqual([(f['nombre_producto'], f['total_vendido']) for f in reporte['ranking']], [('Polera', 3), ('Parka', 1)])
+
+        general = reporte_periodo('general', hoy=self.HOY)
+        self.assertEqual([(f['nombre_producto'], f['total_vendido']) for f in general['ranking']], [('Parka', 10), ('Polera', 3)])
+
+    def test_estacionalidad_de_los_ultimos_doce_meses(self):
+        self.venta(self.polera, date(2026, 1, 20), 4)    # verano
+        self.venta(self.polera, date(2025, 12, 5), 1)    # verano
+        self.venta(self.parka, date(2026, 7, 3), 2)      # invierno
+        self.venta(self.parka, date(2025, 7, 3), 8)      # hace más de 12 meses
+        self.venta(self.polera, date(2024, 1, 3), 6)     # hace más de 12 meses
+
+        reporte = reporte_periodo('semana', hoy=self.HOY)
+        self.assertEqual(reporte['clima'], {'verano': 5, 'invierno': 2})
+        self.assertEqual(reporte['ranking'], [])
+
+
+# ==========================================
+# --- 18. EXPORTACIONES EN STREAMING ---
+# ==========================================
+
+class ExportacionesTests(TestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create_user('admin', is_staff=True)
+        self.cliente = User.objects.create_user('ana')
+        self.client.force_login(self.admin)
+
+    def leer_csv(self, response):
+        self.assertTrue(response.streaming)
+        return list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+
+    def test_keyset_recorre_todo_en_lotes(self):
+        ordenes = [crear_orden(self.cliente) for _ in range(5)]
+        queryset, campo_id, columnas = exportaciones.DATASETS['ordenes']()
+        with self.assertNumQueries(3):
+            filas = list(exportaciones.filas_por_lotes(queryset, campo_id, columnas, lote=2))
+        self.assertEqual([f[0] for f in filas], [o.id for o in ordenes])
+
+    def test_csv_de_ordenes_filtrado_por_estado_y_fecha(self):
+        vieja = crear_orden(self.cliente, estado='CONFIRMADO')
+        Orden.objects.filter(id=vieja.id).update(fecha_creacion=timezone.now() - timedelta(days=10))
+        confirmada = crear_orden(self.cliente, estado='CONFIRMADO', total=25000)
+        crear_orden(self.cliente, estado='PENDIENTE')
+        desde = (timezone.localdate() - timedelta(days=1)).isoformat()
+
+        response = self.client.get(reverse('exportar', args=['ordenes']), {'estado': 'CONFIRMADO', 'desde': desde})
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="ordenes.csv"')
+        encabezado, *filas = self.leer_csv(response)
+        self.assertEqual(encabezado[:4], ['id', 'numero_orden', 'fecha_creacion', 'estado'])
+        self.assertEqual([(f[0], f[3], f[8]) for f in filas], [(str(confirmada.id), 'CONFIRMADO', '25000')])
+
+    def test_csv_de_items_filtrado_por_marca(self):
+        (variante,) = crear_variantes(5)
+        otra = Variante.objects.create(
+            producto=Producto.objects.create(nombre='Parka', precio=90000, descripcion='Pluma', marca='northface'),
+            talla='M', color='Azul', stock=5,
+        )
+        orden = crear_orden(self.cliente)
+        for v in (variante, otra):
+            ItemOrden.objects.create(
+                orden=orden, variante=v, nombre_producto=v.producto.nombre, talla_color='M / Azul',
+                cantidad=1, precio_unitario=v.producto.precio,
+            )
+
+        response = self.client.get(reverse('exportar', args=['items']), {'marca': 'northface'})
+        encabezado, *filas = self.leer_csv(response)
+        self.assertIn('variante_producto_marca', encabezado)
+        self.assertEqual([f[encabezado.index('nombre_producto')] for f in filas], ['Parka'])
+
+    def test_parametros_invalidos(self):
+        url = reverse('exportar', args=['ordenes'])
+        self.assertEqual(self.client.get(reverse('exportar', args=['nada'])).status_code, 400)
+        self.assertEqual(self.client.get(url, {'formato': 'xls'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'desde': '17-10-2026'}).status_code, 400)
+
+        self.client.force_login(self.cliente)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+
+# ==========================================
+# --- 19. CONSOLA DE ÓRDENES (keyset y filtros) ---
+# ==========================================
+
+class ConsolaOrdenesTests(TestCase):
+
+    def setUp(self):
+        self.cliente = User.objects.create_user('ana', first_name='Ana', last_name='Rojas')
+
+    def test_keyset_recorre_sin_repetir_con_fechas_empatadas(self):
+        ordenes = [crear_orden(self.cliente) for _ in range(5)]
+        Orden.objects.update(fecha_creacion=timezone.now())
+        esperado = [o.id for o in reversed(ordenes)]
+
+        vistos, cursor, paginas = [], None, []
+        while True:
+            pagina = paginar_keyset(Orden.objects.all(), cursor, 2)
+            paginas.append(pagina)
+            vistos += [o.id for o in pagina]
+            if not pagina.has_next:
+                break
+            cursor = pagina.cursor_siguiente
+        self.assertEqual(vistos, esperado)
+        self.assertEqual(len(paginas), 3)
+
+        # Volver atrás desde la última página entrega la del medio
+        anterior = paginar_keyset(Orden.objects.all(), paginas[-1].cursor_anterior, 2)
+        self.assertEqual([o.id for o in anterior], esperado[2:4])
+        self.assertTrue(anterior.has_previous and anterior.has_next)
+
+    def test_cursor_invalido_es_la_primera_pagina(self):
+        ordenes = [crear_orden(self.cliente) for _ in range(3)]
+        pagina = paginar_keyset(Orden.objects.all(), 'no-es-un-cursor', 2)
+        self.assertEqual([o.id for o in pagina], [ordenes[2].id, ordenes[1].id])
+        self.assertFalse(pagina.has_previous)
+
+    def test_filtros_del_querystring(self):
+        filtros = consola_ordenes.filtros_desde_request({
+            'estado': 'INVENTADO', 'desde': '2026-13-01', 'hasta': '2026-10-17', 'email': ' ana@ ', 'numero': ' mo-1',
+        })
+        self.assertEqual(filtros, {
+            'estado': '', 'desde': None, 'hasta': date(2026, 10, 17), 'email': 'ana@', 'numero': 'MO-1',
+        })
+
+    def test_consulta_filtra_por_estado_fecha_email_y_numero(self):
+        vieja = crear_orden(self.cliente, estado='CONFIRMADO')
+        Orden.objects.filter(id=vieja.id).update(fecha_creacion=timezone.now() - timedelta(days=10))
+        buscada = crear_orden(self.cliente, estado='CONFIRMADO', email='ana@modaone.cl')
+        crear_orden(self.cliente, estado='CONFIRMADO', email='otra@modaone.cl')
+        crear_orden(self.cliente, estado='PENDIENTE', email='ana@modaone.cl')
+
+        ayer = timezone.localdate() - timedelta(days=1)
+        encontradas = consola_ordenes.consulta_ordenes(estado='CONFIRMADO', desde=ayer, email='ANA@')
+        self.assertEqual(list(encontradas), [buscada])
+        por_numero = consola_ordenes.consulta_ordenes(numero=buscada.numero_orden)
+        self.assertEqual(list(por_numero), [buscada])
+
+    def test_filas_json_con_items_y_telefono_precargados(self):
+        Direccion.objects.create(
+            usuario=self.cliente, rut='11111111-1', calle='Calle', numero='1', comuna='Santiago', telefono='911111111',
+        )
+        Direccion.objects.create(
+            usuario=self.cliente, rut='11111111-1', calle='Calle', numero='2', comuna='Santiago', telefono='922222222',
+        )
+        ordenes = [crear_orden(self.cliente, estado='CONFIRMADO') for _ in range(3)]
+        for orden in ordenes:
+            ItemOrden.objects.create(
+                orden=orden, nombre_producto='Polera', talla_color='M / Negro', cantidad=2, precio_unitario=15000,
+            )
+        primera = consola_ordenes.pagina_ordenes(consola_ordenes.filtros_desde_request({}), por_pagina=2)
+
+        self.client.force_login(User.objects.create_user('admin', is_staff=True))
+        response = self.client.get(reverse('admin_ordenes_filas'), {
+            'formato': 'json', 'estado': 'CONFIRMADO', 'cursor': primera.cursor_siguiente,
+        })
+        datos = response.json()
+        self.assertEqual([o['id'] for o in datos['results']], [ordenes[0].id])
+        self.assertEqual(datos['results'][0]['telefono'], '922222222')
+        self.assertEqual(datos['results'][0]['cliente'], 'Ana Rojas')
+        self.assertEqual(datos['results'][0]['items'], [{'nombre_producto': 'Polera', 'talla_color': 'M / Negro', 'cantidad': 2}])
+        self.assertIsNone(datos['next'])
+        self.assertIsNotNone(datos['previous'])
+
+
+# ==========================================
+# --- 20. FOTOS DEL PROBADOR ---
+# ==========================================
+
+def foto_jpeg(ancho, alto, exif=None):
+    salida = io.BytesIO()
+    Image.new('RGB', (ancho, alto), 'red').save(salida, 'JPEG', **({'exif': exif.tobytes()} if exif else {}))
+    return salida.getvalue()
+
+
+def leer_data_url(data_url):
+    cabecera, datos = data_url.split(',', 1)
+    return cabecera, Image.open(io.BytesIO(base64.b64decode(datos)))
+
+
+class FotosTryOnTests(TestCase):
+
+    def test_foto_grande_baja_a_la_resolucion_del_modelo(self):
+        original = foto_jpeg(3000, 4000)
+        foto = preparar_foto(io.BytesIO(original))
+        self.assertEqual((foto.ancho, foto.alto), (768, 1024))
+        self.assertEqual(foto.bytes_originales, len(original))
+        self.assertLess(foto.bytes_finales, foto.bytes_originales)
+        self.assertEqual(leer_data_url(foto.data_url)[1].size, (768, 1024))
+
+    def test_foto_chica_no_se_agranda(self):
+        foto = preparar_foto('data:image/jpeg;base64,' + base64.b64encode(foto_jpeg(300, 400)).decode())
+        self.assertEqual((foto.ancho, foto.alto), (300, 400))
+
+    def test_aplica_la_orientacion_exif_y_no_copia_metadatos(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6            # rotada 90°: el celular la guardó acostada
+        exif[0x010F] = 'Camara'     # Make
+        foto = preparar_foto(io.BytesIO(foto_jpeg(1600, 1200, exif)))
+        self.assertEqual((foto.ancho, foto.alto), (768, 1024))   # sin la rotación sería 768x576
+        cabecera, imagen = leer_data_url(foto.data_url)
+        self.assertEqual(cabecera, 'data:image/jpeg;base64')
+        self.assertEqual(dict(imagen.getexif()), {})
+
+    @override_settings(TRYON_FORMATO_FOTO='WEBP')
+    def test_png_con_transparencia_se_recodifica(self):
+        salida = io.BytesIO()
+        Image.new('RGBA', (200, 100), (0, 0, 255, 128)).save(salida, 'PNG')
+        foto = preparar_foto(io.BytesIO(salida.getvalue()))
+        cabecera, imagen = leer_data_url(foto.data_url)
+        self.assertEqual(cabecera, 'data:image/webp;base64')
+        self.assertEqual((imagen.format, imagen.mode), ('WEBP', 'RGB'))
+
+    def test_fotos_invalidas(self):
+        for origen in ('data:image/jpeg;base64,%%%', io.BytesIO(b''), io.BytesIO(b'no es una imagen')):
+            with self.assertRaises(FotoInvalida):
+                preparar_foto(origen)
+
+
+class ProcesarTryOnVistaTests(TestCase):
+
+    def setUp(self):
+        almacenes_temporales(self)
+        self.url = reverse('procesar_ia_tryon')
+
+    def test_multipart_encola_la_foto_preparada(self):
+        subida = SimpleUploadedFile('foto.jpg', foto_jpeg(1500, 2000), content_type='image/jpeg')
+        response = self.client.post(self.url, {
+            'imagen_usuario': subida, 'imagen_prenda': 'https://x/p.jpg', 'categoria': 'upper_body',
+        })
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['foto']['resolucion'], '768x1024')
+        trabajo = TrabajoTryOn.objects.get(id=response.json()['trabajo_id'])
+        self.assertEqual(leer_data_url(trabajo.imagen_usuario)[1].size, (768, 1024))
+
+    def test_json_que_no_es_objeto_es_400(self):
+        for cuerpo in ([1, 2], 'texto', 3, None, {'imagen_usuario': ['x'], 'imagen_prenda': 'https://x/p.jpg'}):
+            response = self.client.post(self.url, json.dumps(cuerpo), content_type='application/json')
+            self.assertEqual(response.status_code, 400, cuerpo)
+            self.assertEqual(response.json()['status'], 'error')
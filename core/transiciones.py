@@ -0,0 +1,135 @@
+# core/transiciones.py
+
+"""
+Cambios de estado masivos para la Estación de Despacho.
+
+- Las transiciones permitidas están en TRANSICIONES (estados de ESTADOS_PEDIDO).
+- Todas las órdenes válidas se actualizan en UNA transacción: lock ordenado
+  por id, bulk_update, rollups en lote y stock devuelto si se cancela.
+- Las inválidas (no existen, transición no permitida) se informan sin
+  bloquear al resto.
+- Los correos se encolan en lotes (tarea 'notificar_estados_lote'); el worker
+  envía cada lote por una sola conexión SMTP (core/correo.py).
+"""
+
+import csv
+import io
+from dataclasses import dataclass, field
+
+from django.db import transaction
+from django.db.models import Q
+
+from .models import ESTADOS_PEDIDO, ItemOrden, Orden
+from .notificaciones import encolar_notificaciones_lote
+from .rollups import registrar_cambios_estado
+from .segmentacion import refrescar_segmentos
+from .stock import liberar_stock
+
+ESTADOS_VALIDOS = {codigo for codigo, _ in ESTADOS_PEDIDO}
+
+TRANSICIONES = {
+    'PENDIENTE': {'CONFIRMADO', 'CANCELADO'},
+    'CONFIRMADO': {'PICKING', 'EMBALAJE', 'DESPACHO', 'CANCELADO'},
+    'PICKING': {'EMBALAJE', 'DESPACHO', 'CANCELADO'},
+    'EMBALAJE': {'DESPACHO', 'CANCELADO'},
+    'DESPACHO': {'ENTREGADO'},
+    'ENTREGADO': set(),
+    'CANCELADO': set(),
+}
+
+MAX_ORDENES = 2000
+
+
+class CambioMasivoInvalido(Exception):
+    pass
+
+
+@dataclass
+class ResultadoCambioMasivo:
+    actualizadas: list = field(default_factory=list)   # numero_orden
+    rechazadas: list = field(default_factory=list)     # (referencia, motivo)
+
+
+def transicion_permitida(actual, nuevo):
+    return nuevo in TRANSICIONES.get(actual, ())
+
+
+def leer_csv_tracking(texto):
+    """'numero_orden,tracking' por línea (encabezado opcional) -> {numero_orden: tracking}."""
+    filas = {}
+    for fila in csv.reader(io.StringIO(texto.strip())):
+        if not fila or not fila[0].strip():
+            continue
+        numero = fila[0].strip().upper()
+        if numero == 'NUMERO_ORDEN':
+            continue
+        filas[numero] = fila[1].strip() if len(fila) > 1 else ''
+    return filas
+
+
+def cambiar_estados(nuevo_estado, ids=(), tracking_por_numero=None):
+    """
+    Aplica `nuevo_estado` a las órdenes `ids` y/o a las de `tracking_por_numero`
+    ({numero_orden: tracking}). Devuelve un ResultadoCambioMasivo.
+    """
+    if nuevo_estado not in ESTADOS_VALIDOS:
+        raise CambioMasivoInvalido(f"Estado desconocido: {nuevo_estado}")
+    tracking_por_numero = tracking_por_numero or {}
+    ids = {int(i) for i in ids}
+    if not ids and not tracking_por_numero:
+        raise CambioMasivoInvalido("No se indicaron órdenes.")
+    if len(ids) + len(tracking_por_numero) > MAX_ORDENES:
+        raise CambioMasivoInvalido(f"Máximo {MAX_ORDENES} órdenes por operación.")
+
+    resultado = ResultadoCambioMasivo()
+    with transaction.atomic():
+        # Locks en orden de id: dos operaciones masivas simultáneas no se bloquean mutuamente
+        ordenes = list(
+            Orden.objects.select_for_update()
+            .filter(Q(id__in=ids) | Q(numero_orden__in=list(tracking_por_numero)))
+            .order_by('id')
+        )
+
+        encontradas = {o.id for o in ordenes} | {o.numero_orden for o in ordenes}
+        resultado.rechazadas += [(i, 'no existe') for i in sorted(ids - encontradas)]
+        resultado.rechazadas += [(n, 'no existe') for n in sorted(set(tracking_por_numero) - encontradas)]
+
+        cambios = []
+        for orden in ordenes:
+            anterior = orden.estado
+            if anterior != nuevo_estado and not transicion_permitida(anterior, nuevo_estado):
+                resultado.rechazadas.append((orden.numero_orden, f'{anterior} → {nuevo_estado} no permitido'))
+                continue
+            tracking = tracking_por_numero.get(orden.numero_orden)
+            if anterior == nuevo_estado and not tracking:
+                continue  # nada que hacer
+            orden.estado = nuevo_estado
+            if tracking:
+                orden.codigo_seguimiento = tracking
+            cambios.append((orden, anterior))
+
+        if cambios:
+            Orden.objects.bulk_update([o for o, _ in cambios], ['estado', 'codigo_seguimiento'], batch_size=500)
+            movidas = [(o, a) for o, a in cambios if a != nuevo_estado]
+            _efectos_en_lote(movidas, nuevo_estado)
+            resultado.actualizadas = [o.numero_orden for o, _ in cambios]
+    return resultado
+
+
+def _efectos_en_lote(movidas, nuevo_estado):
+    """Rollups, stock, segmentos y correos de todas las órdenes que cambiaron de estado."""
+    if not movidas:
+        return
+    items = {}
+    for item in ItemOrden.objects.filter(orden_id__in=[o.id for o, _ in movidas]).select_related('variante'):
+        items.setdefault(item.orden_id, []).append(item)
+
+    registrar_cambios_estado(movidas, items)
+    if nuevo_estado == 'CANCELADO':
+        liberar_stock((i.variante_id, i.cantidad) for lista in items.values() for i in lista)
+    usuarios = {o.usuario_id for o, _ in movidas if o.usuario_id}
+    if usuarios:
+        # Un solo refresco (un SELECT + un upsert) para todos los clientes del lote
+        transaction.on_commit(lambda: refrescar_segmentos(usuarios))
+    encolar_notificaciones_lote([o for o, _ in movidas])
+
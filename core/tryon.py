@@ -0,0 +1,237 @@
+# core/tryon.py
+
+"""
+Probador virtual asíncrono (IDM-VTON en Replicate).
+
+- crear_trabajo() guarda un TrabajoTryOn y encola la tarea 'tryon' en la cola
+  de core/tareas.py: el request responde al instante con el id del trabajo.
+- El worker (python manage.py procesar_tareas --tipo tryon, uno o varios
+  procesos) crea la predicción, la consulta cada INTERVALO_SONDEO segundos y
+  va guardando el progreso que Replicate informa en los logs.
+- El navegador sigue el trabajo por polling (estado_trabajo). Bajo ASGI
+  además hay Server-Sent Events (eventos_trabajo, generador async que no ocupa
+  un worker mientras espera). Bajo WSGI (gunicorn, ver build.sh) Django
+  consumiría un generador async completo antes de enviar nada, así que ahí
+  el probador usa polling y el endpoint SSE entrega un stream sync corto
+  (eventos_trabajo_wsgi, DURACION_EVENTOS_WSGI).
+
+Antes de encolar se consulta la caché de resultados (core/cache_tryon.py):
+un acierto deja el trabajo COMPLETADO sin llamar al modelo y una prueba
+idéntica que ya se está generando se suma a ese trabajo (mismo `clave`), que
+actualiza el progreso y el resultado de todos.
+
+Las llamadas a Replicate pasan por el gateway de core/inferencia.py: cliente
+único por proceso, cupos compartidos entre workers, fila justa por usuario y
+circuit breaker. Con settings.TRYON_CLIENTE_FALSO se usa un cliente falso.
+"""
+
+import asyncio
+import json
+import time
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.utils import timezone
+
+from . import cache_tryon, eventos, inferencia
+from .models import TrabajoTryOn
+from .tareas import Posponer, encolar, tarea
+
+MODELO_TRYON = "cuuupid/idm-vton:c871bb9b046607b680449ecbae55fd8c6d945e0a1948644bf2361b3d021d3ff4"
+CATEGORIAS_TRYON = ('upper_body', 'lower_body', 'dresses')
+PASOS = 30
+
+INTERVALO_SONDEO = 1.0     # segundos entre consultas a Replicate
+TIEMPO_MAXIMO = 180        # segundos antes de cancelar la predicción
+INTERVALO_EVENTOS = 1.0    # segundos entre lecturas del trabajo en el stream SSE
+DURACION_EVENTOS = 240     # el stream se corta solo; EventSource se reconecta
+DURACION_EVENTOS_WSGI = 20 # bajo WSGI cada stream ocupa un worker sync mientras dura
+
+ESTADOS_FINALES = ('COMPLETADO', 'FALLIDO')
+
+
+class ErrorTryOn(Exception):
+    # Errores de datos o del modelo: no abren el circuito de core/inferencia.py
+    falla_servicio = False
+
+
+class TiempoAgotado(ErrorTryOn):
+    falla_servicio = True
+
+
+# ==========================================
+# --- 1. TRABAJOS ---
+# ==========================================
+
+def crear_trabajo(usuario, imagen_usuario, imagen_prenda, categoria='upper_body', producto_id=None):
+    """Registra el trabajo y lo resuelve desde la caché o lo encola. Lanza ErrorTryOn si faltan datos."""
+    if not imagen_usuario or not imagen_prenda:
+        raise ErrorTryOn('Faltan la foto o la prenda.')
+    if categoria not in CATEGORIAS_TRYON:
+        raise ErrorTryOn(f'Categoría desconocida: {categoria}')
+    clave = cache_tryon.clave_resultado(imagen_usuario, imagen_prenda, categoria, MODELO_TRYON)
+    datos = {
+        'usuario': usuario if usuario and usuario.is_authenticated else None,
+        'producto_id': producto_id or None,
+        'categoria': categoria,
+        'imagen_prenda': imagen_prenda,
+        'clave': clave,
+    }
+
+    # Reserva y alta en la misma transacción: el worker no puede cerrar el grupo entre medio
+    with transaction.atomic():
+        reserva = cache_tryon.reservar(clave)
+        if reserva == cache_tryon.ACIERTO:
+            trabajo = TrabajoTryOn.objects.create(
+                estado='COMPLETADO', progreso=100, imagen_resultado=cache_tryon.url_resultado(clave), **datos
+            )
+            # Si la transacción (o la del request) se revierte, la prueba no existió
+            transaction.on_commit(lambda: _registrar_bi([trabajo]))
+        elif reserva == cache_tryon.EN_CURSO:
+            trabajo = TrabajoTryOn.objects.create(**datos)
+        else:
+            trabajo = TrabajoTryOn.objects.create(imagen_usuario=imagen_usuario, **datos)
+            # Un solo intento: una predicción fallida se informa, no se vuelve a cobrar
+            encolar('tryon', {'trabajo_id': str(trabajo.id)}, clave=f'tryon:{trabajo.id}', max_intentos=1)
+    return trabajo
+
+
+def estado_trabajo(trabajo, posicion=None):
+    """Lo que ve el navegador en cada consulta / evento (`posicion` en la fila si está esperando)."""
+    return {
+        'trabajo_id': str(trabajo.id),
+        'estado': trabajo.estado,
+        'posicion': posicion,
+        'progreso': trabajo.progreso,
+        'imagen_generada': trabajo.imagen_resultado or None,
+        'error': trabajo.error or None,
+    }
+
+
+def _grupo(trabajo):
+    """El trabajo y los idénticos que esperan su resultado."""
+    return TrabajoTryOn.objects.filter(clave=trabajo.clave).exclude(estado__in=ESTADOS_FINALES)
+
+
+def _actualizar(trabajo, **campos):
+    for campo, valor in campos.items():
+        setattr(trabajo, campo, valor)
+    _grupo(trabajo).update(fecha_actualizacion=timezone.now(), **campos)
+
+
+# ==========================================
+# --- 2. EJECUCIÓN EN EL WORKER ---
+# ==========================================
+
+def entrada_modelo(trabajo):
+    return {
+        "human_img": trabajo.imagen_usuario,
+        "garm_img": trabajo.imagen_prenda,
+        "garment_des": "clothing",
+        "category": trabajo.categoria,
+        "crop": False,
+        "seed": 42,
+        "steps": PASOS,
+    }
+
+
+def ejecutar_prediccion(trabajo, cliente, renovar_cupo=lambda: None):
+    """Crea la predicción y espera el resultado guardando el progreso. Devuelve la URL de la imagen."""
+    version = MODELO_TRYON.split(':', 1)[1]
+    prediccion = cliente.predictions.create(version=version, input=entrada_modelo(trabajo))
+    limite = time.monotonic() + TIEMPO_MAXIMO
+    while prediccion.status not in ('succeeded', 'failed', 'canceled'):
+        if time.monotonic() > limite:
+            prediccion.cancel()
+            raise TiempoAgotado('La IA tardó demasiado, intenta de nuevo.')
+        time.sleep(INTERVALO_SONDEO)
+        renovar_cupo()
+        prediccion.reload()
+        avance = prediccion.progress
+        if avance:
+            # 10% al arrancar, el resto según los pasos de difusión
+            progreso = 10 + int(avance.percentage * 85)
+            if progreso != trabajo.progreso:
+                _actualizar(trabajo, progreso=progreso)
+
+    if prediccion.status != 'succeeded':
+        raise ErrorTryOn(prediccion.error or f'Predicción {prediccion.status}')
+    salida = prediccion.output
+    return str(salida[0] if isinstance(salida, list) else salida)
+
+
+def _registrar_bi(trabajos):
+    # Cada cliente que se probó la prenda cuenta, aunque compartan la generación (buffer en core/eventos.py)
+    for t in trabajos:
+        if t.producto_id:
+            eventos.registrar('tryon', t.producto_id, t.usuario_id)
+
+
+@tarea('tryon', de_a_una=True)
+def procesar_trabajo(trabajo_id):
+    trabajo = TrabajoTryOn.objects.get(id=trabajo_id)
+    if trabajo.estado in ESTADOS_FINALES:
+        return
+    if trabajo.estado == 'PROCESANDO':
+        # Nunca se crea (ni se cobra) una segunda predicción para el mismo trabajo
+        if inferencia.abandonado(trabajo):
+            cache_tryon.liberar(trabajo.clave)
+            _actualizar(trabajo, estado='FALLIDO', error='La prueba se interrumpió, intenta de nuevo.', imagen_usuario='')
+        return
+    try:
+        # Sin turno o sin cupo la tarea se pospone y el trabajo sigue EN_COLA
+        with inferencia.turno(trabajo) as renovar_cupo:
+            _actualizar(trabajo, estado='PROCESANDO', progreso=5)
+            salida = ejecutar_prediccion(trabajo, inferencia.cliente(), renovar_cupo)
+        url = cache_tryon.guardar(trabajo.clave, *cache_tryon.descargar(salida))
+    except Posponer:
+        raise
+    except Exception as e:
+        cache_tryon.liberar(trabajo.clave)
+        # La foto del cliente no se guarda más de lo necesario
+        _actualizar(trabajo, estado='FALLIDO', error=str(e)[:1000], imagen_usuario='')
+        raise
+
+    with transaction.atomic():
+        grupo = list(_grupo(trabajo).select_for_update())
+        _actualizar(trabajo, estado='COMPLETADO', progreso=100, imagen_resultado=url, imagen_usuario='')
+    _registrar_bi(grupo)
+    cache_tryon.purgar()
+
+
+# ==========================================
+# --- 3. SERVER-SENT EVENTS ---
+# ==========================================
+
+def _evento(trabajo, posicion, ultimo):
+    """(linea SSE o None si no cambió nada, datos)."""
+    datos = estado_trabajo(trabajo, posicion)
+    return (f"data: {json.dumps(datos)}\n\n" if datos != ultimo else None), datos
+
+
+async def eventos_trabajo(trabajo_id):
+    """Genera 'data: {...}' cada vez que el trabajo cambia, hasta que termina (ASGI)."""
+    ultimo = None
+    limite = time.monotonic() + DURACION_EVENTOS
+    while time.monotonic() < limite:
+        trabajo = await TrabajoTryOn.objects.aget(id=trabajo_id)
+        linea, ultimo = _evento(trabajo, await sync_to_async(inferencia.posicion_en_cola)(trabajo), ultimo)
+        if linea:
+            yield linea
+        if trabajo.estado in ESTADOS_FINALES:
+            return
+        await asyncio.sleep(INTERVALO_EVENTOS)
+
+
+def eventos_trabajo_wsgi(trabajo_id):
+    """Igual que eventos_trabajo pero sync y acotado a DURACION_EVENTOS_WSGI segundos."""
+    ultimo = None
+    limite = time.monotonic() + DURACION_EVENTOS_WSGI
+    while time.monotonic() < limite:
+        trabajo = TrabajoTryOn.objects.get(id=trabajo_id)
+        linea, ultimo = _evento(trabajo, inferencia.posicion_en_cola(trabajo), ultimo)
+        if linea:
+            yield linea
+        if trabajo.estado in ESTADOS_FINALES:
+            return
+        time.sleep(INTERVALO_EVENTOS)
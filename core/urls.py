@@ -43,11 +43,16 @@ urlpatterns = [
     # La seguridad @user_passes_test ya está en views.py, no es necesario repetirla aquí
     path('admin-panel/', views.panel_admin_productos, name='panel_admin'),
     path('admin-panel/ordenes/', views.admin_ordenes, name='admin_ordenes'),
+    path('admin-panel/ordenes/filas/', views.admin_ordenes_filas, name='admin_ordenes_filas'),
     path('admin-panel/ordenes/cambiar-estado/<int:orden_id>/', views.cambiar_estado_orden, name='cambiar_estado_orden'),
+    path('admin-panel/ordenes/cambio-masivo/', views.admin_ordenes_masivo, name='admin_ordenes_masivo'),
 
     # --- 5. MÓDULO TRY-ON (IA) ---
     path('try-on/<int:producto_id>/', views.try_on_view, name='try_on'),
     path('api/procesar-tryon/', views.procesar_ia_tryon, name='procesar_ia_tryon'),
+    path('api/tryon/<uuid:trabajo_id>/', views.estado_tryon, name='estado_tryon'),
+    path('api/tryon/<uuid:trabajo_id>/eventos/', views.eventos_tryon, name='eventos_tryon'),
+    path('api/tryon/resultado/<str:clave>/', views.resultado_tryon, name='resultado_tryon'),
 
     # --- 6. API REST (CRUD Y DASHBOARD) ---
     # Delega todo lo que sea 'api/v1/' al archivo core/api/urls.py
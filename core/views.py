@@ -13,28 +13,39 @@ from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import authenticate, login
 from django.contrib.auth.decorators import login_required, user_passes_test
-from django.contrib.auth.models import User
+from django.core.handlers.asgi import ASGIRequest
 from django.core.files.base import ContentFile
-from django.core.mail import EmailMessage
-from django.core.paginator import Paginator
 from django.db import transaction
-from django.db.models import Sum, Q, Count
-from django.http import HttpResponse, JsonResponse
+from django.core.paginator import Paginator
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.template.loader import render_to_string
+from django.urls import reverse
 from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
 from django.views.decorators.csrf import csrf_exempt
 
 # Librerías externas
 from xhtml2pdf import pisa
-import replicate
 
 # Modelos y Formularios Locales
 from .models import (
     Producto, Variante, Carrito, ItemCarrito, Direccion, 
-    Orden, ItemOrden, ESTADOS_PEDIDO, RegistroTryOn
+    Orden, ItemOrden, ESTADOS_PEDIDO, TrabajoTryOn, ResultadoTryOn
 )
 from .forms import ClienteRegistrationForm, DireccionForm
+from .catalogo import ConsultaCatalogo
+from .facetas import contar_facetas
+from . import cache_catalogo, cache_tryon, boletas, eventos, inferencia, segmentacion, consola_ordenes, transiciones, tryon
+from .stock import liberar_stock, StockInsuficiente
+from .ordenes import materializar_orden, CarritoVacio
+from .notificaciones import encolar_boleta
+from .rollups import registrar_cambio_estado, resumen_ventas, ranking_productos
+from .reportes import reporte_periodo
+from .conversion import conversion_tryon
+from .inventario import alertas_stock
+from .fotos_tryon import preparar_foto, FotoInvalida
 
 
 # ==========================================
@@ -84,40 +95,46 @@ def staff_login_view(request):
 # ==========================================
 
 def catalogo_digital(request):
-    productos_list = Producto.objects.filter(activo=True).order_by('-fecha_creacion')
-   
-    query = request.GET.get('q')
-    if query:
-        productos_list = productos_list.filter(Q(nombre__icontains=query) | Q(descripcion__icontains=query))
-
-    cat_filter = request.GET.get('categoria')
-    if cat_filter:
-        productos_list = productos_list.filter(categoria=cat_filter)
-       
-    marca_filter = request.GET.get('marca')
-    if marca_filter:
-        productos_list = productos_list.filter(marca=marca_filter)
-
-    min_price = request.GET.get('min_price')
-    max_price = request.GET.get('max_price')
-    if min_price: productos_list = productos_list.filter(precio__gte=min_price)
-    if max_price: productos_list = productos_list.filter(precio__lte=max_price)
+    consulta = ConsultaCatalogo.desde_request(request.GET)
 
-    paginator = Paginator(productos_list, 9)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    cat_filter = consulta.categoria
+    marca_filter = consulta.marca
 
     titulo = "Catálogo Completo"
     if cat_filter: titulo = f"Colección {cat_filter.capitalize()}"
     if marca_filter: titulo = f"Marca: {marca_filter.capitalize()}"
 
-    contexto = {
-        'productos': page_obj,
-        'titulo': titulo,
-        'cat_actual': cat_filter,
-        'marca_actual': marca_filter
-    }
-    return render(request, 'core/catalogo.html', contexto)
+    def construir_contexto():
+        # Solo se ejecuta si la grilla no está en caché (ver core/cache_catalogo.py)
+        # Filtros + página con variantes precargadas (máx. 4 consultas, ver core/catalogo.py)
+        # Modo de paginación: cursor (keyset) por defecto; ?page=N mantiene la numerada.
+        # Con búsqueda siempre numerada: el orden es la relevancia del índice
+        modo = request.GET.get('modo') or ('numerada' if request.GET.get('page') else settings.CATALOGO_PAGINACION)
+        if modo == 'numerada' or consulta.q:
+            modo = 'numerada'
+            page_obj = consulta.pagina(request.GET.get('page'))
+        else:
+            modo = 'cursor'
+            page_obj = consulta.pagina_cursor(request.GET.get('cursor'))
+
+        # Filtros actuales para armar los links de paginación
+        filtros = request.GET.copy()
+        for param in ('page', 'cursor', 'modo'):
+            filtros.pop(param, None)
+
+        return {
+            'productos': page_obj,
+            'titulo': titulo,
+            'cat_actual': cat_filter,
+            'marca_actual': marca_filter,
+            'q_actual': consulta.q,
+            'modo_paginacion': modo,
+            'filtros_url': filtros.urlencode(),
+            'facetas': contar_facetas(consulta),
+        }
+
+    grilla = cache_catalogo.fragmento(request, 'core/includes/catalogo_grilla.html', construir_contexto)
+    return render(request, 'core/catalogo.html', {'titulo': titulo, 'grilla': grilla})
 
 
 # ==========================================
@@ -244,7 +261,6 @@ def checkout(request):
     })
 
 @login_required
-@transaction.atomic
 def generar_orden(request):
     if request.method != 'POST': return redirect('checkout')
 
@@ -252,39 +268,23 @@ def generar_orden(request):
     metodo_envio = request.POST.get('metodo_envio')
     email_contacto = request.POST.get('email_contacto')
 
-    try:
-        direccion = get_object_or_404(Direccion, id=direccion_id, usuario=request.user)
-        carrito = Carrito.objects.get(usuario=request.user)
-        items = list(carrito.items.all())
-        if not items: return redirect('checkout')
-    except:
+    direccion = Direccion.objects.filter(id=direccion_id, usuario=request.user).first() if direccion_id else None
+    if not direccion:
         messages.error(request, 'Error en los datos.')
         return redirect('checkout')
 
-    costos = {'1': 5990, '2': 3990}
-    envio_val = costos.get(metodo_envio, 0)
-    subtotal = sum(i.subtotal for i in items)
-    total = subtotal + envio_val
-
-    orden = Orden.objects.create(
-        usuario=request.user,
-        email=email_contacto,
-        subtotal=subtotal,
-        costo_envio=envio_val,
-        total_final=total,
-        estado='PENDIENTE',
-        direccion_envio=f"{direccion.calle} #{direccion.numero}, {direccion.comuna}",
-    )
-   
-    for i in items:
-        ItemOrden.objects.create(
-            orden=orden, variante=i.variante, nombre_producto=i.variante.producto.nombre,
-            talla_color=f"{i.variante.talla}/{i.variante.color}", cantidad=i.cantidad, precio_unitario=i.precio_unitario
-        )
-        i.variante.stock -= i.cantidad
-        i.variante.save()
-       
-    carrito.delete()
+    try:
+        # Reserva de stock + Orden + ItemOrden en bloque (consultas constantes, ver core/ordenes.py)
+        orden = materializar_orden(request.user, direccion, metodo_envio, email_contacto)
+    except CarritoVacio:
+        return redirect('checkout')
+    except StockInsuficiente as e:
+        for variante, pedido, disponible in e.faltantes:
+            messages.error(request, f'Stock insuficiente para {variante}. Disponible: {disponible}')
+        if not e.faltantes:
+            messages.error(request, 'Uno de los productos ya no está disponible.')
+        return redirect('ver_carrito')
+
     return redirect('pasarela_pago', orden_id=orden.id)
 
 @login_required
@@ -300,31 +300,18 @@ def procesar_pago_real(request, orden_id):
     """
     Se ejecuta automáticamente cuando PayPal confirma el pago.
     """
-    orden = get_object_or_404(Orden, id=orden_id, usuario=request.user)
-    
-    # Validamos para no procesar la misma orden dos veces
-    if orden.estado == 'PENDIENTE':
-        orden.estado = 'CONFIRMADO'
-        orden.save()
-        
-        # 1. Generar PDF (Boleta)
-        html = render_to_string('core/invoice.html', {'orden': orden})
-        pdf = BytesIO()
-        pisa.CreatePDF(html, dest=pdf)
-        
-        # 2. Enviar Email
-        if orden.email:
-            try:
-                email = EmailMessage(
-                    f'¡Compra Exitosa! Boleta Orden #{orden.numero_orden}',
-                    f'Hola {orden.usuario.first_name}, tu pago con PayPal fue exitoso. Adjuntamos tu boleta.',
-                    settings.EMAIL_HOST_USER, 
-                    [orden.email]
-                )
-                email.attach(f'boleta_{orden.numero_orden}.pdf', pdf.getvalue(), 'application/pdf')
-                email.send()
-            except Exception as e:
-                print(f"Error enviando correo: {e}")
+    with transaction.atomic():
+        orden = get_object_or_404(Orden.objects.select_for_update(), id=orden_id, usuario=request.user)
+
+        # Validamos para no procesar la misma orden dos veces
+        if orden.estado == 'PENDIENTE':
+            orden.estado = 'CONFIRMADO'
+            orden.save()
+            registrar_cambio_estado(orden, 'PENDIENTE')
+
+            # Boleta PDF + correo van a la cola (core/tareas.py); se encolan en la
+            # misma transacción que la confirmación y los procesa el worker.
+            encolar_boleta(orden)
 
     return render(request, 'core/orden_confirmada.html', {'orden': orden})
 
@@ -335,11 +322,31 @@ def pago_simulado(request, orden_id):
 
 @login_required
 def descargar_boleta(request, orden_id):
-    orden = get_object_or_404(Orden, id=orden_id, usuario=request.user)
-    html = render_to_string('core/invoice.html', {'orden': orden})
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="Boleta_{orden.numero_orden}.pdf"'
-    pisa.CreatePDF(html, dest=response)
+    orden = get_object_or_404(
+        Orden.objects.select_related('usuario').prefetch_related('items_orden'),
+        id=orden_id, usuario=request.user
+    )
+    # El PDF se renderiza una vez por versión de la orden (ver core/boletas.py)
+    nombre, hash_contenido = boletas.obtener_boleta(orden)
+    storage = boletas.almacen()
+    etag = quote_etag(hash_contenido)
+    try:
+        modificado = int(storage.get_modified_time(nombre).timestamp())
+    except NotImplementedError:
+        modificado = None
+
+    no_modificado = get_conditional_response(request, etag=etag, last_modified=modificado)
+    if no_modificado is not None:
+        return no_modificado
+
+    response = FileResponse(
+        storage.open(nombre, 'rb'), as_attachment=True,
+        filename=f'Boleta_{orden.numero_orden}.pdf', content_type='application/pdf'
+    )
+    response['ETag'] = etag
+    if modificado:
+        response['Last-Modified'] = http_date(modificado)
+    response['Cache-Control'] = 'private, no-cache'
     return response
 
 @login_required
@@ -359,62 +366,88 @@ def panel_admin_productos(request):
 @login_required
 @user_passes_test(is_staff_or_superuser, login_url='staff_login')
 def admin_ordenes(request):
-    # Traemos las órdenes optimizando consulta para traer usuario y direcciones
-    ordenes = Orden.objects.select_related('usuario').prefetch_related('usuario__direcciones').all().order_by('-fecha_creacion')
+    # Primera página filtrada (usuario, ítems y teléfono precargados, ver core/consola_ordenes.py);
+    # las siguientes se piden a admin_ordenes_filas con "Cargar más".
+    filtros = consola_ordenes.filtros_desde_request(request.GET)
+    pagina = consola_ordenes.pagina_ordenes(filtros)
     return render(request, 'core/panel_ordenes.html', {
-        'ordenes': ordenes,
-        'estados': ESTADOS_PEDIDO
+        'ordenes': pagina,
+        'pagina': pagina,
+        'filtros': filtros,
+        'estados': ESTADOS_PEDIDO,
+        'por_despachar': Orden.objects.filter(estado__in=consola_ordenes.ESTADOS_POR_DESPACHAR).count(),
     })
 
+@login_required
+@user_passes_test(is_staff_or_superuser, login_url='staff_login')
+def admin_ordenes_filas(request):
+    """Página siguiente de la consola: fragmento HTML de filas, o JSON con ?formato=json."""
+    filtros = consola_ordenes.filtros_desde_request(request.GET)
+    cursor = request.GET.get('cursor')
+    pagina = consola_ordenes.pagina_ordenes(filtros, cursor)
+
+    if request.GET.get('formato') == 'json':
+        return JsonResponse({
+            'results': [consola_ordenes.orden_a_dict(o) for o in pagina],
+            'next': pagina.cursor_siguiente,
+            'previous': pagina.cursor_anterior,
+        })
+
+    response = render(request, 'core/includes/ordenes_filas.html', {
+        'ordenes': pagina, 'estados': ESTADOS_PEDIDO, 'cursor_actual': cursor,
+    })
+    response['X-Cursor-Siguiente'] = pagina.cursor_siguiente or ''
+    return response
+
 @login_required
 @user_passes_test(is_staff_or_superuser, login_url='staff_login')
 def cambiar_estado_orden(request, orden_id):
+    """Cambio de estado de una orden: mismas reglas y efectos que el cambio masivo (core/transiciones.py)."""
     if request.method == 'POST':
         orden = get_object_or_404(Orden, id=orden_id)
         nuevo_estado = request.POST.get('nuevo_estado')
         tracking = request.POST.get('tracking_id')
-       
-        # Guardamos estado anterior
-        estado_anterior = orden.estado
-       
+
         if nuevo_estado:
-            orden.estado = nuevo_estado
-            if tracking:
-                orden.codigo_seguimiento = tracking
-            orden.save()
-           
-            # --- LÓGICA DE NOTIFICACIÓN POR CORREO ---
-            if nuevo_estado != estado_anterior and orden.email:
-                asunto = f"Actualización de tu Orden #{orden.numero_orden}"
-                mensaje = ""
-               
-                # Detectar tipo de envío (Flash vs Courier)
-                es_courier = int(orden.costo_envio) == 5990
-               
-                if nuevo_estado == 'CONFIRMADO':
-                    mensaje = f"Hola {orden.usuario.first_name}, tu pago está confirmado. Estamos preparando tu pedido."
-               
-                elif nuevo_estado == 'DESPACHO':
-                    if es_courier:
-                        track_msg = f"Tu código de seguimiento es: {orden.codigo_seguimiento}" if orden.codigo_seguimiento else "Pronto recibirás tu código."
-                        mensaje = f"¡Tu pedido va en camino! Lo hemos entregado al Courier. {track_msg}"
-                    else:
-                        # Mensaje Flash
-                        mensaje = f"¡Tu pedido va en camino! Nuestro repartidor Flash ha salido a ruta hacia {orden.direccion_envio}."
-               
-                elif nuevo_estado == 'ENTREGADO':
-                    mensaje = f"¡Pedido Entregado! Gracias por comprar en ModaOne. Esperamos que lo disfrutes."
-
-                # Enviar correo
-                if mensaje:
-                    try:
-                        email = EmailMessage(asunto, mensaje, settings.EMAIL_HOST_USER, [orden.email])
-                        email.send()
-                    except:
-                        pass 
-           
-            messages.success(request, f'Orden #{orden.numero_orden} actualizada a {orden.get_estado_display()}.')
-           
+            try:
+                resultado = transiciones.cambiar_estados(
+                    nuevo_estado,
+                    ids=[orden.id],
+                    tracking_por_numero={orden.numero_orden: tracking} if tracking else None,
+                )
+            except transiciones.CambioMasivoInvalido as e:
+                messages.error(request, str(e))
+                return redirect('admin_ordenes')
+
+            if resultado.rechazadas:
+                messages.error(request, f'Orden #{orden.numero_orden}: {resultado.rechazadas[0][1]}.')
+            else:
+                orden.estado = nuevo_estado
+                messages.success(request, f'Orden #{orden.numero_orden} actualizada a {orden.get_estado_display()}.')
+
+    return redirect('admin_ordenes')
+
+@login_required
+@user_passes_test(is_staff_or_superuser, login_url='staff_login')
+def admin_ordenes_masivo(request):
+    """Cambio de estado de varias órdenes (marcadas y/o CSV numero_orden,tracking) en una transacción."""
+    if request.method == 'POST':
+        try:
+            resultado = transiciones.cambiar_estados(
+                request.POST.get('nuevo_estado', ''),
+                ids=request.POST.getlist('ordenes'),
+                tracking_por_numero=transiciones.leer_csv_tracking(request.POST.get('csv', '')),
+            )
+        except (transiciones.CambioMasivoInvalido, ValueError) as e:
+            messages.error(request, str(e))
+            return redirect('admin_ordenes')
+
+        if resultado.actualizadas:
+            messages.success(request, f'{len(resultado.actualizadas)} órdenes actualizadas.')
+        if resultado.rechazadas:
+            detalle = ', '.join(f'{ref} ({motivo})' for ref, motivo in resultado.rechazadas[:10])
+            extra = f' y {len(resultado.rechazadas) - 10} más' if len(resultado.rechazadas) > 10 else ''
+            messages.warning(request, f'{len(resultado.rechazadas)} sin cambios: {detalle}{extra}.')
     return redirect('admin_ordenes')
 
 @login_required
@@ -429,20 +462,16 @@ def generar_reporte_gestion(request):
     fecha_fin = timezone.now()
     fecha_inicio = fecha_fin - timedelta(days=30)
 
-    ordenes = Orden.objects.filter(fecha_creacion__range=(fecha_inicio, fecha_fin)).exclude(estado='CANCELADO')
-    total_ventas = ordenes.aggregate(Sum('total_final'))['total_final__sum'] or 0
-    total_pedidos = ordenes.count()
+    # Ventas y ranking desde los rollups diarios (core/rollups.py)
+    rango = {'desde': timezone.localdate(fecha_inicio), 'hasta': timezone.localdate(fecha_fin)}
+    ventas = resumen_ventas(excluir=['CANCELADO'], **rango)
+    total_ventas = ventas['monto']
+    total_pedidos = ventas['ordenes']
     ticket_promedio = total_ventas / total_pedidos if total_pedidos > 0 else 0
 
-    top_productos = ItemOrden.objects.filter(orden__fecha_creacion__range=(fecha_inicio, fecha_fin)) \
-        .values('nombre_producto') \
-        .annotate(total_vendido=Sum('cantidad')) \
-        .order_by('-total_vendido')[:5]
+    top_productos = ranking_productos(limite=5, **rango)
 
-    top_tryon = RegistroTryOn.objects.filter(fecha__range=(fecha_inicio, fecha_fin)) \
-        .values('producto__nombre') \
-        .annotate(veces_probado=Count('id')) \
-        .order_by('-veces_probado')[:5]
+    top_tryon = conversion_tryon(limite=5, **rango)
 
     contexto = {
         'fecha_inicio': fecha_inicio, 'fecha_fin': fecha_fin,
@@ -463,70 +492,36 @@ def generar_reporte_gestion(request):
 def panel_clientes(request):
     """
     CRM de Clientes: Segmentación por comportamiento de compra y uso de IA.
+    Lee el snapshot SegmentoCliente (core/segmentacion.py): paginado y
+    filtrable por ?segmento=vip|curioso|inactivo|cliente|nuevo.
     """
-    # 1. Obtener métricas base de la base de datos
-    clientes = User.objects.filter(is_staff=False).annotate(
-        total_gastado=Sum('orden__total_final', filter=Q(orden__estado__in=['CONFIRMADO', 'DESPACHO', 'ENTREGADO'])),
-        total_ordenes=Count('orden', filter=Q(orden__estado__in=['CONFIRMADO', 'DESPACHO', 'ENTREGADO'])),
-        veces_ia=Count('registrotryon')
-    ).order_by('-total_gastado')
-
-    lista_clientes = []
-    today = timezone.now().date()
-
-    for c in clientes:
-        # 2. Calcular días de inactividad
-        ultima_orden = Orden.objects.filter(usuario=c).order_by('-fecha_creacion').first()
-        dias_sin_compra = (today - ultima_orden.fecha_creacion.date()).days if ultima_orden else None
-       
-        # 3. Definir Perfil (Scoring)
-        perfil = "Nuevo"
-        color = "secondary"
-       
-        gasto = c.total_gastado or 0
-        ordenes = c.total_ordenes or 0
-        uso_ia = c.veces_ia or 0
-       
-        # Lógica de Segmentación
-        if gasto > 50000 or ordenes >= 3:
-            perfil = "💎 VIP"
-            color = "info"
-        elif uso_ia > 3 and ordenes < 1:
-            perfil = "👀 Curioso (IA)"
-            color = "warning"
-        elif ordenes > 0 and dias_sin_compra and dias_sin_compra > 60:
-            perfil = "👻 Inactivo"
-            color = "danger"
-        elif ordenes > 0:
-            perfil = "✅ Cliente"
-            color = "success"
-
-        # 4. CÁLCULO SEGURO DE LA BARRA DE PROGRESO (0 a 100)
-        # Cada uso de IA suma 10%. Máximo 100%.
-        porcentaje_calc = uso_ia * 10
-        if porcentaje_calc > 100:
-            porcentaje_calc = 100
-       
-        # Guardamos todo en un diccionario limpio
-        lista_clientes.append({
-            'usuario': c,
-            'gasto': gasto,
-            'ordenes': ordenes,
-            'uso_ia': uso_ia,
-            'porcentaje_ia': porcentaje_calc, 
-            'dias_inactivo': dias_sin_compra,
-            'perfil': perfil,
-            'color': color,
-            'telefono': c.direcciones.last().telefono if c.direcciones.exists() else None
-        })
-
-    return render(request, 'core/panel_clientes.html', {'clientes': lista_clientes})
+    hoy = timezone.localdate()
+    segmento = request.GET.get('segmento', '')
+    if segmento not in segmentacion.SEGMENTOS:
+        segmento = ''
+
+    pagina = Paginator(segmentacion.miembros(segmento), segmentacion.CLIENTES_POR_PAGINA).get_page(request.GET.get('page'))
+    lista_clientes = [segmentacion.ficha_cliente(c, hoy) for c in pagina]
+
+    return render(request, 'core/panel_clientes.html', {
+        'clientes': lista_clientes,
+        'pagina': pagina,
+        'segmento_actual': segmento,
+        'segmentos': [
+            (clave, segmentacion.SEGMENTOS[clave][0], total)
+            for clave, total in segmentacion.conteo_segmentos().items()
+        ],
+    })
 
 
 # ==========================================
 # --- 6. IA TRY-ON (Replicate) ---
 # ==========================================
 
+# Eventos que acepta el beacon del navegador y máximo por envío
+EVENTOS_NAVEGADOR = ('vista',)
+MAX_EVENTOS_BEACON = 50
+
 @login_required
 def try_on_view(request, producto_id):
     producto = get_object_or_404(Producto, id=producto_id)
@@ -537,71 +532,112 @@ def try_on_view(request, producto_id):
 
 @csrf_exempt
 def registrar_evento_tryon(request):
-    return JsonResponse({'status': 'ok'}) 
+    """
+    Beacon del navegador (navigator.sendBeacon): {"eventos": [{"tipo": "vista", "producto_id": 3}, ...]}.
+    Solo encola en el buffer de core/eventos.py; responde 204 sin tocar la base.
+    Las pruebas del probador las registra el worker al terminar cada trabajo.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Método no permitido'}, status=405)
+    try:
+        data = json.loads(request.body or b'{}')
+        lote = data.get('eventos', [data])[:MAX_EVENTOS_BEACON]
+        usuario_id = request.user.id if request.user.is_authenticated else None
+        for evento in lote:
+            if evento.get('tipo', 'vista') in EVENTOS_NAVEGADOR:
+                eventos.registrar(evento.get('tipo', 'vista'), evento['producto_id'], usuario_id)
+    except (ValueError, TypeError, KeyError, AttributeError):
+        return JsonResponse({'status': 'error', 'message': 'Eventos inválidos'}, status=400)
+    return HttpResponse(status=204)
 
 @csrf_exempt
 def procesar_ia_tryon(request):
     """
-    Procesa la IA (Replicate) de forma segura y REGISTRA EL EVENTO PARA BI.
+    Prepara la foto (core/fotos_tryon.py), encola la prueba en el worker
+    (core/tryon.py) y responde al instante con el id del trabajo; el
+    resultado se consulta por polling o SSE.
+
+    Acepta multipart (campo de archivo `imagen_usuario`, lo que envía el
+    probador) o el JSON anterior con la foto en base64.
     """
     if request.method == 'POST':
         try:
-            data = json.loads(request.body)
-           
-            # Datos para la IA
-            imagen_usuario = data.get('imagen_usuario')
-            imagen_prenda = data.get('imagen_prenda')
-            categoria = data.get('categoria', 'upper_body')
-           
-            # 1. SEGURIDAD: Obtener Token
-            api_token = os.environ.get('REPLICATE_API_TOKEN')
-           
-            if not api_token:
-                return JsonResponse({'status': 'error', 'message': 'Falta configurar el Token en el servidor'}, status=500)
-
-            # Inicializamos el cliente
-            client = replicate.Client(api_token=api_token)
-
-            # 2. EJECUTAR IA (Modelo IDM-VTON)
-            output = client.run(
-                "cuuupid/idm-vton:c871bb9b046607b680449ecbae55fd8c6d945e0a1948644bf2361b3d021d3ff4",
-                input={
-                    "human_img": imagen_usuario,
-                    "garm_img": imagen_prenda,
-                    "garment_des": "clothing",
-                    "category": categoria,
-                    "crop": False,
-                    "seed": 42,
-                    "steps": 30
-                }
+            if request.content_type == 'multipart/form-data':
+                data = request.POST
+                origen = request.FILES.get('imagen_usuario')
+            else:
+                data = json.loads(request.body)
+                if not isinstance(data, dict):
+                    raise tryon.ErrorTryOn('El cuerpo debe ser un objeto JSON.')
+                origen = data.get('imagen_usuario')
+                if origen and not isinstance(origen, str):
+                    raise FotoInvalida('La foto no es un data URL válido.')
+            if not origen:
+                raise tryon.ErrorTryOn('Falta la foto.')
+
+            foto = preparar_foto(origen)
+            trabajo = tryon.crear_trabajo(
+                request.user,
+                foto.data_url,
+                data.get('imagen_prenda'),
+                data.get('categoria', 'upper_body'),
+                data.get('producto_id'),
             )
-           
-            final_image_url = str(output[0] if isinstance(output, list) else output)
-
-            # 3. GUARDAR EL REGISTRO BI
-            try:
-                prod_id = data.get('producto_id')
-                if prod_id:
-                    producto_obj = Producto.objects.get(id=prod_id)
-                    usuario_log = request.user if request.user.is_authenticated else None
-                   
-                    RegistroTryOn.objects.create(
-                        producto=producto_obj,
-                        usuario=usuario_log
-                    )
-                    print(f"✅ BI Registrado: Se probó {producto_obj.nombre}")
-            except Exception as e:
-                print(f"⚠️ Error guardando BI: {e}")
-
-            return JsonResponse({'status': 'success', 'imagen_generada': final_image_url})
-
-        except Exception as e:
-            print(f"❌ Error CRÍTICO en IA: {str(e)}")
-            return JsonResponse({'status': 'error', 'message': f'Error interno: {str(e)}'}, status=500)
+        except (ValueError, FotoInvalida, tryon.ErrorTryOn) as e:
+            return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+        return JsonResponse({
+            'status': 'queued',
+            'trabajo_id': str(trabajo.id),
+            'estado_url': reverse('estado_tryon', args=[trabajo.id]),
+            # Solo bajo ASGI: con WSGI el probador sigue el trabajo por polling
+            'eventos_url': reverse('eventos_tryon', args=[trabajo.id]) if isinstance(request, ASGIRequest) else None,
+            'foto': foto.resumen(),
+        }, status=202)
 
     return JsonResponse({'status': 'error', 'message': 'Método no permitido'}, status=405)
 
 
+def _es_duenio(trabajo, usuario):
+    # Los trabajos anónimos solo se identifican por el UUID
+    return trabajo.usuario_id is None or trabajo.usuario_id == usuario.id
+
+def estado_tryon(request, trabajo_id):
+    """Polling del trabajo: estado, progreso e imagen cuando termina."""
+    trabajo = get_object_or_404(TrabajoTryOn, id=trabajo_id)
+    if not _es_duenio(trabajo, request.user):
+        raise Http404
+    return JsonResponse(tryon.estado_trabajo(trabajo, inferencia.posicion_en_cola(trabajo)))
+
+async def eventos_tryon(request, trabajo_id):
+    """
+    Server-Sent Events del trabajo. Bajo ASGI el stream es async y no bloquea
+    un worker; bajo WSGI es un stream sync corto (el probador usa polling).
+    """
+    trabajo = await TrabajoTryOn.objects.filter(id=trabajo_id).afirst()
+    if trabajo is None or not _es_duenio(trabajo, await request.auser()):
+        raise Http404
+    if isinstance(request, ASGIRequest):
+        flujo = tryon.eventos_trabajo(trabajo.id)
+    else:
+        flujo = tryon.eventos_trabajo_wsgi(trabajo.id)
+    response = StreamingHttpResponse(flujo, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+def resultado_tryon(request, clave):
+    """Imagen generada desde la caché de resultados (la clave es un hash de contenido: nunca cambia)."""
+    try:
+        archivo, nombre = cache_tryon.abrir(clave)
+    except ResultadoTryOn.DoesNotExist:
+        raise Http404
+    response = FileResponse(archivo, filename=os.path.basename(nombre))
+    response['ETag'] = quote_etag(clave)
+    response['Cache-Control'] = 'private, max-age=31536000, immutable'
+    return response
+
+
 @login_required
 @user_passes_test(is_staff_or_superuser, login_url='staff_login')
 def dashboard_expansion(request):
@@ -609,62 +645,18 @@ def dashboard_expansion(request):
     PÁGINA 2: Expansión de Negocio.
     """
     filtro = request.GET.get('filtro', 'mes')
-    
-    hoy = timezone.now()
-    inicio = None
-    fin = hoy
-    titulo_periodo = "Análisis General"
-
-    if filtro == 'semana':
-        inicio = hoy - timedelta(days=7)
-        titulo_periodo = "Última Semana"
-    elif filtro == 'mes':
-        inicio = hoy - timedelta(days=30)
-        titulo_periodo = "Último Mes"
-    elif filtro == 'trimestre':
-        inicio = hoy - timedelta(days=90)
-        titulo_periodo = "Último Trimestre"
-    elif filtro == 'semestre1':
-        inicio = hoy.replace(month=1, day=1, hour=0, minute=0)
-        fin = hoy.replace(month=6, day=30, hour=23, minute=59)
-        titulo_periodo = f"Primer Semestre {hoy.year}"
-    elif filtro == 'semestre2':
-        inicio = hoy.replace(month=7, day=1, hour=0, minute=0)
-        fin = hoy.replace(month=12, day=31, hour=23, minute=59)
-        titulo_periodo = f"Segundo Semestre {hoy.year}"
-    elif filtro == 'anio':
-        inicio = hoy.replace(month=1, day=1, hour=0, minute=0)
-        titulo_periodo = f"Año {hoy.year}"
-
-    # Ranking
-    items_vendidos = ItemOrden.objects.filter(
-        orden__estado__in=['CONFIRMADO', 'DESPACHO', 'ENTREGADO']
-    )
-    if inicio:
-        items_vendidos = items_vendidos.filter(orden__fecha_creacion__range=(inicio, fin))
 
-    ranking = items_vendidos.values('variante__producto__nombre')\
-        .annotate(total=Sum('cantidad'))\
-        .order_by('-total')
+    # Ranking del período y estacionalidad desde los rollups, acotados por fecha (core/reportes.py)
+    reporte = reporte_periodo(filtro)
 
-    # Estacionalidad
-    todas = ItemOrden.objects.filter(orden__estado__in=['CONFIRMADO', 'DESPACHO', 'ENTREGADO'])
-    ventas_verano = todas.filter(orden__fecha_creacion__month__in=[12, 1, 2, 3]).count()
-    ventas_invierno = todas.filter(orden__fecha_creacion__month__in=[6, 7, 8, 9]).count()
-    
-    # Alertas
-    alertas = []
-    bajos = Variante.objects.filter(stock__lte=5, stock__gt=0)
-    for b in bajos:
-        v = ItemOrden.objects.filter(variante=b, orden__fecha_creacion__gte=hoy-timedelta(days=30)).count()
-        if v > 0:
-            alertas.append(b)
+    # Alertas (stock bajo o poca cobertura según la velocidad de venta, ver core/inventario.py)
+    alertas = alertas_stock()
 
     contexto = {
-        'ranking': ranking,
+        'ranking': reporte['ranking'],
         'filtro_actual': filtro,
-        'titulo': titulo_periodo,
-        'clima': {'verano': ventas_verano, 'invierno': ventas_invierno},
+        'titulo': reporte['titulo'],
+        'clima': reporte['clima'],
         'alertas': alertas
     }
     
@@ -678,17 +670,19 @@ def cancelar_orden(request, orden_id):
     orden = get_object_or_404(Orden, id=orden_id, usuario=request.user)
     
     # Solo permitimos cancelar si no se ha pagado aún
-    if orden.estado == 'PENDIENTE':
-        # 1. Devolver el stock a cada producto
-        items = ItemOrden.objects.filter(orden=orden)
-        for item in items:
-            variante = item.variante
-            variante.stock += item.cantidad
-            variante.save()
-        
-        # 2. Marcar como cancelado
-        orden.estado = 'CANCELADO'
-        orden.save()
+    with transaction.atomic():
+        # El UPDATE condicional evita devolver el stock dos veces si llegan dos cancelaciones
+        cancelada = Orden.objects.filter(id=orden.id, estado='PENDIENTE').update(estado='CANCELADO')
+        if cancelada:
+            items = list(ItemOrden.objects.filter(orden=orden).select_related('variante'))
+            # Devolver el stock de todas las líneas en un solo UPDATE
+            liberar_stock((i.variante_id, i.cantidad) for i in items)
+            # El UPDATE no pasa por save(): el rollup se mueve explícitamente
+            orden.estado = 'CANCELADO'
+            registrar_cambio_estado(orden, 'PENDIENTE', {orden.id: items})
+            segmentacion.programar_refresco(orden.usuario_id)
+
+    if cancelada:
         messages.success(request, f"Orden #{orden.numero_orden} cancelada. Stock restaurado.")
     else:
         messages.error(request, "No se puede cancelar una orden ya procesada.")
@@ -157,10 +157,59 @@ EMAIL_HOST_PASSWORD = 'jexp momo xhgf fwbv'
 
 # Configuración de IA Replicate
 api_token = os.environ.get('REPLICATE_API_TOKEN')
+# La foto del probador llega como archivo multipart (no cuenta para DATA_UPLOAD_MAX_MEMORY_SIZE);
+# este límite solo cubre a clientes que aún la envían en base64 dentro del JSON
 DATA_UPLOAD_MAX_MEMORY_SIZE = 10485760
+# Probador virtual (core/tryon.py): con TRYON_CLIENTE_FALSO=1 no se llama a Replicate (desarrollo / pruebas offline)
+TRYON_CLIENTE_FALSO = os.environ.get('TRYON_CLIENTE_FALSO') == '1'
+# Gateway de inferencia (core/inferencia.py): llamadas simultáneas a Replicate entre TODOS los workers,
+# circuit breaker (fallos seguidos / segundos abierto) y espera máxima en la fila
+INFERENCIA_CONCURRENCIA = int(os.environ.get('INFERENCIA_CONCURRENCIA', 4))
+INFERENCIA_UMBRAL_FALLOS = int(os.environ.get('INFERENCIA_UMBRAL_FALLOS', 5))
+INFERENCIA_ENFRIAMIENTO = int(os.environ.get('INFERENCIA_ENFRIAMIENTO', 60))
+INFERENCIA_ESPERA_MAXIMA = int(os.environ.get('INFERENCIA_ESPERA_MAXIMA', 600))
+# Formato de la foto re-codificada antes de la inferencia (core/fotos_tryon.py): 'JPEG' o 'WEBP'
+TRYON_FORMATO_FOTO = os.environ.get('TRYON_FORMATO_FOTO', 'JPEG')
+# Caché de resultados del probador (core/cache_tryon.py): TTL desde el último uso y tope LRU
+TRYON_CACHE_DIAS = int(os.environ.get('TRYON_CACHE_DIAS', 30))
+TRYON_CACHE_MAX = int(os.environ.get('TRYON_CACHE_MAX', 5000))
+TRYON_RESULTADOS_ROOT = os.environ.get('TRYON_RESULTADOS_ROOT', os.path.join(BASE_DIR, 'tryon_resultados'))
+TRYON_RESULTADOS_STORAGE = os.environ.get('TRYON_RESULTADOS_STORAGE') or None
 # settings.py
 
 # ... al final del archivo ...
 
 # IMPORTANTE: Cambia esto por TU link real de Render
-CSRF_TRUSTED_ORIGINS = ['https://modaone-proyecto.onrender.com']
\ No newline at end of file
+CSRF_TRUSTED_ORIGINS = ['https://modaone-proyecto.onrender.com']
+# Búsqueda del catálogo: 'auto' elige FULLTEXT (MySQL), FTS5 (SQLite) o 'documentos' (LIKE, cualquier motor).
+# 'memoria' (índice en el proceso) solo con DEBUG.
+BUSQUEDA_BACKEND = os.environ.get('BUSQUEDA_BACKEND', 'auto')
+
+# Boletas PDF generadas (core/boletas.py). Privadas: no van bajo MEDIA/STATIC.
+# Con BOLETAS_STORAGE = '<alias de STORAGES>' se usa ese backend en vez del disco local.
+BOLETAS_ROOT = os.environ.get('BOLETAS_ROOT', os.path.join(BASE_DIR, 'boletas'))
+BOLETAS_STORAGE = os.environ.get('BOLETAS_STORAGE') or None
+
+# Ingesta de eventos (core/eventos.py): se guardan cada EVENTOS_LOTE eventos o EVENTOS_INTERVALO segundos
+EVENTOS_LOTE = int(os.environ.get('EVENTOS_LOTE', 200))
+EVENTOS_INTERVALO = float(os.environ.get('EVENTOS_INTERVALO', 5))
+EVENTOS_MAX_BUFFER = 50000
+
+# Destinatarios del resumen diario de alertas de stock (python manage.py digest_stock)
+STOCK_DIGEST_DESTINATARIOS = [d for d in os.environ.get('STOCK_DIGEST_DESTINATARIOS', '').split(',') if d]
+
+# Paginación del catálogo: 'cursor' (keyset, costo constante) o 'numerada' (?page=N)
+CATALOGO_PAGINACION = 'cursor'
+
+# Caché: LocMem por worker; con REDIS_URL se comparte entre workers (requiere el paquete redis)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'modaone',
+    }
+}
+if os.environ.get('REDIS_URL'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['REDIS_URL'],
+    }